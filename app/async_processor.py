@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+
+import redis
+
+from app.batch_control import LAG_CHECK_INTERVAL
+from app.driver_position import aggregator_consumer as driver_consumer
+from app.event_encoding import (DRIVER_POSITION_EVENT, ORDER_EVENT,
+                                decode_entries)
+from app.orders import aggregator_consumer as order_consumer
+from app.redis_aggregator import CONSUMER_NAME, StreamAggregator
+from app.redis_client import async_redis_client
+from app.redis_processor import STREAM_READ_TIMEOUT
+from app.sliding_window import SLIDING_WINDOWS
+
+# Reads kept in flight per processor. Each reader owns one batch at a time,
+# so network waits of one reader overlap with the processing of the others.
+READ_CONCURRENCY = int(os.getenv("READ_CONCURRENCY", 4))
+BATCH_SIZE = 100
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger()
+
+
+class AsyncStreamProcessorMixin:
+    """
+    asyncio runtime for StreamProcessor subclasses. Mix it in before the
+    processor class and pass a `redis.asyncio` client; message parsing and
+    command building are shared with the sync processor, only the I/O is
+    awaited. Entries are read through the processor's asyncio bytes client.
+    """
+
+    async def create_consumer_group_async(self, stream_name):
+        try:
+            await self.client.xgroup_create(
+                stream_name, self.consumer_group_name, id="0", mkstream=True
+            )
+            logger.info("Consumer group created successfully.")
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" in str(e):
+                logger.info("Consumer group already exists.")
+            else:
+                logger.error(f"Unexpected error creating consumer group: {e}")
+
+    async def read_messages_async(self):
+        response = await self.stream_client.xreadgroup(
+            self.consumer_group_name,
+            self.consumer_name,
+            {name: ">" for name in self.stream_names},
+            count=self.batch_size,
+            block=STREAM_READ_TIMEOUT,
+        )
+        return self.decode_response(response)
+
+    async def process_messages_async(self, stream_name, messages):
+        raise NotImplementedError(
+            "process_messages_async method must be implemented by subclasses."
+        )
+
+    async def recover_pending_messages_async(self, stream_name):
+        """Async counterpart of StreamProcessor.recover_pending_messages."""
+        start_id = "0-0"
+        recovered = 0
+        while True:
+            start_id, messages, _ = (
+                await self.stream_client.xautoclaim(
+                    stream_name,
+                    self.consumer_group_name,
+                    self.consumer_name,
+                    self.claim_min_idle_time,
+                    start_id=start_id,
+                    count=self.claim_batch_size,
+                )
+            )[:3]
+            start_id = start_id.decode()
+            messages = decode_entries(messages)
+
+            if messages:
+                async with self.client.pipeline(transaction=False) as pipe:
+                    self.queue_pending_lookups(pipe, stream_name, messages)
+                    pending = await pipe.execute()
+                retry, poison, deliveries = self.split_by_deliveries(
+                    messages, pending
+                )
+                if poison:
+                    async with self.client.pipeline() as pipe:
+                        self.queue_dead_letter(pipe, stream_name, poison, deliveries)
+                        await pipe.execute()
+                if retry:
+                    await self.process_messages_async(stream_name, retry)
+                recovered += len(messages)
+
+            if start_id == "0-0":
+                break
+
+        if recovered:
+            logger.info(f"Recovered {recovered} pending messages from {stream_name}")
+        return recovered
+
+    async def delete_idle_consumers_async(self, stream_name, max_idle_time=None):
+        """Async counterpart of StreamProcessor.delete_idle_consumers."""
+        try:
+            consumers = await self.client.xinfo_consumers(
+                stream_name, self.consumer_group_name
+            )
+        except redis.exceptions.ResponseError as e:
+            logger.error(f"Error listing consumers: {e}")
+            return []
+
+        deleted = self.select_idle_consumers(consumers, max_idle_time)
+        for name in deleted:
+            await self.client.xgroup_delconsumer(
+                stream_name, self.consumer_group_name, name
+            )
+
+        if deleted:
+            logger.info(f"Deleted idle consumers of {stream_name}: {deleted}")
+        return deleted
+
+    async def get_consumer_lag_async(self):
+        lag = 0
+        for stream_name in self.stream_names:
+            for group in await self.client.xinfo_groups(stream_name):
+                if group["name"] == self.consumer_group_name:
+                    lag += group.get("lag") or 0
+        return lag
+
+    async def reader(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                response = await self.read_messages_async()
+                if not response:
+                    continue
+                started = time.monotonic()
+                num_messages = 0
+                for stream_name, messages in response:
+                    await self.process_messages_async(stream_name, messages)
+                    num_messages += len(messages)
+                self.record_batch(num_messages, time.monotonic() - started)
+            except redis.exceptions.ConnectionError as e:
+                logger.error(f"Redis connection error: {e}")
+                await asyncio.sleep(1)
+            except Exception as e:
+                logger.exception(f"Unexpected error: {e}")
+
+    async def recovery_loop(self, stop_event):
+        while not stop_event.is_set():
+            for stream_name in self.stream_names:
+                try:
+                    await self.recover_pending_messages_async(stream_name)
+                    await self.delete_idle_consumers_async(stream_name)
+                except Exception as e:
+                    logger.error(
+                        f"Error recovering pending messages of {stream_name}: {e}"
+                    )
+            try:
+                await asyncio.wait_for(stop_event.wait(), self.claim_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def lag_loop(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                self.batch_controller.record_lag(await self.get_consumer_lag_async())
+            except Exception as e:
+                logger.error(f"Error reading consumer lag: {e}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), LAG_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_async(self, stop_event, concurrency=READ_CONCURRENCY):
+        for stream_name in self.stream_names:
+            await self.create_consumer_group_async(stream_name)
+        logger.info(
+            f"Consuming {self.stream_names} as {self.consumer_name} "
+            f"with {concurrency} concurrent reads"
+        )
+        loops = [self.recovery_loop(stop_event)]
+        if self.batch_controller:
+            loops.append(self.lag_loop(stop_event))
+        try:
+            await asyncio.gather(
+                *loops, *[self.reader(stop_event) for _ in range(concurrency)]
+            )
+        finally:
+            # The bytes client owns its pool; closing the client leaves it open.
+            await self.stream_client.aclose()
+            await self.stream_client.connection_pool.aclose()
+
+
+class AsyncStreamAggregator(AsyncStreamProcessorMixin, StreamAggregator):
+    async def process_messages_async(self, stream_name, messages):
+        try:
+            if self.distinct_field:
+                members, processed_ids = self.aggregate_distinct(messages)
+                if processed_ids:
+                    async with self.client.pipeline() as pipe:
+                        self.queue_distinct(pipe, stream_name, members, processed_ids)
+                        await pipe.execute()
+            elif self.atomic_mode:
+                processed_ids, time_keys, h3_cells, _ = self.index_batch(messages)
+                if processed_ids:
+                    keys, args = self.build_atomic_call(
+                        stream_name, processed_ids, time_keys, h3_cells
+                    )
+                    await self.count_and_ack_script(keys=keys, args=args)
+            else:
+                # Always batched: the per-message path only exists to keep the
+                # sync processor's original behaviour.
+                counts, processed_ids = self.aggregate_batch(messages)
+                if processed_ids:
+                    async with self.client.pipeline() as pipe:
+                        self.queue_counts(pipe, stream_name, counts, processed_ids)
+                        await pipe.execute()
+        except redis.exceptions.ConnectionError:
+            raise
+        except Exception as e:
+            logger.error(f"Error flushing batch of {len(messages)} messages: {e}")
+
+
+async def run_processors(processors, concurrency=READ_CONCURRENCY):
+    """Run several async processors in one event loop until SIGINT/SIGTERM."""
+    stop_event = asyncio.Event()
+
+    def stop():
+        logger.info("Shutdown signal received. Stopping processors...")
+        stop_event.set()
+
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGINT, stop)
+    loop.add_signal_handler(signal.SIGTERM, stop)
+
+    await asyncio.gather(
+        *[processor.run_async(stop_event, concurrency) for processor in processors]
+    )
+    logger.info("Shutting down.")
+
+
+async def main_async(consumer_name=CONSUMER_NAME, partitions=None):
+    async with async_redis_client() as client:
+        processors = [
+            AsyncStreamAggregator(
+                client,
+                stream_name=driver_consumer.DRIVER_POSITION_STREAM,
+                consumer_group_name=driver_consumer.CONSUMER_GROUP_NAME,
+                consumer_name=consumer_name,
+                partitions=partitions,
+                resolutions=driver_consumer.RESOLUTIONS,
+                key_prefix=driver_consumer.DRIVER_COUNT_KEY,
+                batch_size=BATCH_SIZE,
+                distinct_field=(
+                    "driver_id" if driver_consumer.DISTINCT_DRIVER_COUNT else None
+                ),
+                window_sizes=SLIDING_WINDOWS,
+                event_codec=DRIVER_POSITION_EVENT,
+            ),
+            AsyncStreamAggregator(
+                client,
+                stream_name=order_consumer.ORDER_STREAM,
+                consumer_group_name=order_consumer.CONSUMER_GROUP_NAME,
+                consumer_name=consumer_name,
+                partitions=partitions,
+                resolutions=order_consumer.RESOLUTIONS,
+                key_prefix=order_consumer.ORDER_COUNT_KEY,
+                batch_size=BATCH_SIZE,
+                window_sizes=SLIDING_WINDOWS,
+                event_codec=ORDER_EVENT,
+            ),
+        ]
+        await run_processors(processors)
+
+
+def main(consumer_name=CONSUMER_NAME, partitions=None):
+    asyncio.run(main_async(consumer_name=consumer_name, partitions=partitions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import logging
+import os
+
+MIN_BATCH_SIZE = int(os.getenv("MIN_BATCH_SIZE", 10))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 2000))
+# Seconds a batch may take from read to flush before the batch shrinks.
+TARGET_BATCH_LATENCY = float(os.getenv("TARGET_BATCH_LATENCY", 0.25))
+ADAPTIVE_BATCHING = os.getenv("ADAPTIVE_BATCHING", "false").lower() in ("1", "true")
+LAG_CHECK_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveBatchController:
+    def __init__(
+        self,
+        initial_batch_size,
+        min_batch_size=MIN_BATCH_SIZE,
+        max_batch_size=MAX_BATCH_SIZE,
+        target_latency=TARGET_BATCH_LATENCY,
+    ):
+        """
+        Sizes XREADGROUP batches from consumer lag and per-batch latency.
+
+        The batch doubles while there is a backlog (the group lag exceeds the
+        batch, or reads come back full) and the last batch finished well under
+        `target_latency`. It halves as soon as a batch overshoots the target,
+        so a slow flush pushes back on how much is read next.
+        """
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.batch_size = min(max(initial_batch_size, min_batch_size), max_batch_size)
+        self.lag = 0
+
+    def record_lag(self, lag):
+        self.lag = lag
+
+    def record_batch(self, num_messages, latency):
+        previous = self.batch_size
+        backlog = self.lag > self.batch_size or num_messages >= self.batch_size
+
+        if latency > self.target_latency:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        elif backlog and latency < self.target_latency / 2:
+            self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+
+        if self.batch_size != previous:
+            logger.info(
+                f"Batch size {previous} -> {self.batch_size} "
+                f"(lag {self.lag}, last batch {num_messages} in {latency:.3f}s)"
+            )
+        return self.batch_size
@@ -10,7 +10,7 @@ from dash import dcc, html
 from app.data_aggregator_service import REDIS_CLIENT
 from app.driver_position.service import DriverPositionAggregator
 from app.orders.service import OrderAggregator
-from app.surge_pricing.service import SurgePricingCalculator
+from app.surge_pricing.service import SurgePricingCalculator, SurgeTable
 
 
 class GeoJSONUpdater:
@@ -93,6 +93,14 @@ class DataProvider:
 
     @staticmethod
     def get_surge_price_dict(cell_resolution: int = 7) -> Dict[str, float]:
+        # Read the table kept by app.surge_pricing.materializer, and only
+        # compute the surge here when it is not running.
+        surge_prices = SurgeTable(REDIS_CLIENT, base_price=1).get_surge_prices(
+            cell_resolution
+        )
+        if surge_prices.version is not None:
+            return surge_prices.surge_prices
+
         driver_position_aggregator = DriverPositionAggregator(
             redis_client=REDIS_CLIENT, time_window_minutes=1
         )
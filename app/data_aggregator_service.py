@@ -1,12 +1,22 @@
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 
 import h3
+import numpy as np
 import redis
 
 from app.driver_position.aggregator_consumer import DRIVER_COUNT_KEY
-from app.driver_position.schemas import (DriverPositionsCount,
+from app.driver_position.schemas import (CountHistoryResponse,
+                                         DriverPositionsCount,
                                          DriverPositionsCountResponse)
+from app.event_encoding import to_epoch_ms
+from app.h3_indexing import PARENT_CACHE, cells_to_str, rollup_counts
+from app.retention import get_retention, rollup_key, rollup_watermark_key
+from app.sliding_window import (SLIDING_WINDOWS, window_key,
+                                window_start_watermark, window_watermark_key)
 
 # Redis connection configuration
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
@@ -15,14 +25,131 @@ REDIS_CLIENT = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=Tr
 
 TIME_WINDOW_MINUTES = 5
 
+# Most minute buckets kept in memory per process; least recently used first out.
+CACHE_MAX_BUCKETS = int(os.getenv("CACHE_MAX_BUCKETS", 4096))
+# Seconds a merged window result may be served before it is read again.
+CACHE_MAX_STALENESS = float(os.getenv("CACHE_MAX_STALENESS", 1.0))
+# Seconds after a minute ends before its bucket is treated as complete and
+# cached; covers events still in flight through the aggregators.
+CACHE_SETTLE_SECONDS = int(os.getenv("CACHE_SETTLE_SECONDS", 10))
+
+# Stored cells a cell query may expand to when coarse cells are rolled up
+# from a finer stored resolution (each level down is 7 times the cells).
+MAX_EXPANDED_CELLS = int(os.getenv("MAX_EXPANDED_CELLS", 100_000))
+# Stored cell-minutes a distinct-mode history may read, one HyperLogLog key
+# each.
+MAX_HISTORY_CELL_MINUTES = int(os.getenv("MAX_HISTORY_CELL_MINUTES", 1_000_000))
+
+# Rollup buckets a history may read instead of minute buckets, coarsest first
+# (see app.retention).
+HISTORY_GRANULARITIES = [("1h", 60), ("15m", 15)]
+
+
+class BucketCache:
+    def __init__(
+        self,
+        max_buckets=CACHE_MAX_BUCKETS,
+        max_staleness=CACHE_MAX_STALENESS,
+        settle_seconds=CACHE_SETTLE_SECONDS,
+    ):
+        """
+        Process-wide cache of minute bucket reads, shared by every
+        DataAggregator (endpoints build a new one per request).
+
+        Completed minute buckets never change, so they are kept until their
+        Redis TTL would have expired them or the LRU bound evicts them. Only
+        the current, still filling minutes are read again, and merged window
+        results are reused for up to `max_staleness` seconds, which bounds
+        how stale a response can be.
+        """
+        self.max_buckets = max_buckets
+        self.max_staleness = max_staleness
+        self.settle_seconds = settle_seconds
+        self.buckets = OrderedDict()
+        self.results = OrderedDict()
+        # Sync endpoints run in a thread pool.
+        self.lock = threading.Lock()
+
+    def is_complete(self, time_key, now):
+        minute_end = datetime.strptime(time_key, "%Y-%m-%dT%H:%M") + timedelta(
+            minutes=1
+        )
+        return now >= minute_end + timedelta(seconds=self.settle_seconds)
+
+    def _get(self, entries, key):
+        with self.lock:
+            entry = entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return value
+
+    def _put(self, entries, key, value, ttl):
+        with self.lock:
+            entries[key] = (time.monotonic() + ttl, value)
+            entries.move_to_end(key)
+            while len(entries) > self.max_buckets:
+                entries.popitem(last=False)
+
+    def get_bucket(self, bucket_key):
+        return self._get(self.buckets, bucket_key)
+
+    def put_bucket(self, bucket_key, counts, ttl):
+        self._put(self.buckets, bucket_key, counts, ttl)
+
+    def get_result(self, result_key):
+        return self._get(self.results, result_key)
+
+    def put_result(self, result_key, counts):
+        if self.max_staleness > 0:
+            self._put(self.results, result_key, counts, self.max_staleness)
+
+
+BUCKET_CACHE = BucketCache()
+
+
+class TooManyCellsError(ValueError):
+    """
+    A cell query would read more than MAX_EXPANDED_CELLS stored cells, or a
+    distinct-mode history more than MAX_HISTORY_CELL_MINUTES cell-minutes.
+    """
+
 
 class DataAggregator:
     def __init__(
-        self, redis_client, key_prefix, time_window_minutes=TIME_WINDOW_MINUTES
+        self,
+        redis_client,
+        key_prefix,
+        time_window_minutes=TIME_WINDOW_MINUTES,
+        distinct=False,
+        cache=BUCKET_CACHE,
+        stored_resolution=None,
     ):
         self.client = redis_client
         self.key_prefix = key_prefix
         self.time_window_minutes = time_window_minutes
+        self.distinct = distinct
+        # None reads every bucket from Redis on every call.
+        self.cache = cache
+        # When the aggregators only store their finest resolution, coarser
+        # resolutions are rolled up from it on read.
+        self.stored_resolution = stored_resolution
+
+    def _read_resolution(self, cell_resolution):
+        """Resolution whose keys hold the data of `cell_resolution`."""
+        stored_resolution = self.stored_resolution
+        if stored_resolution is not None and cell_resolution < stored_resolution:
+            return stored_resolution
+        return cell_resolution
+
+    def _rollup(self, total_count, cell_resolution):
+        if self._read_resolution(cell_resolution) == cell_resolution:
+            return total_count
+        return rollup_counts(total_count, cell_resolution)
 
     def _generate_time_keys(self):
         """Generate time keys for the last `time_window_minutes`."""
@@ -32,30 +159,184 @@ class DataAggregator:
             for i in range(self.time_window_minutes)
         ]
 
-    def _aggregate_counts(self, time_keys, cell_resolution):
-        """Aggregate the counts for the given time keys and cell resolution."""
-        total_count = {}
+    def _distinct_index_keys(self, time_keys, cell_resolution):
+        return [
+            f"{self.key_prefix}:distinct:{time_key}:{cell_resolution}"
+            for time_key in time_keys
+        ]
+
+    def _group_hll_keys(self, index_keys, cells_per_minute, cell_resolution):
+        """
+        Map each cell to its HyperLogLog keys in every minute it appears in.
+        When rolling up, the keys of all children go to their parent, and the
+        PFCOUNT of their union counts each member once.
+        """
+        rollup = self._read_resolution(cell_resolution) != cell_resolution
+        hll_keys = {}
+        for index_key, cells in zip(index_keys, cells_per_minute):
+            cells = list(cells)
+            groups = cells
+            if rollup and cells:
+                groups = cells_to_str(
+                    PARENT_CACHE.get_parents(cells, cell_resolution)
+                )
+            for cell, group in zip(cells, groups):
+                hll_keys.setdefault(group, []).append(f"{index_key}:{cell}")
+        return hll_keys
 
+    def _aggregate_distinct_counts(self, time_keys, cell_resolution):
+        """
+        Count distinct members per cell over the given time keys, reading the
+        per cell-minute HyperLogLogs written by the aggregator's distinct mode.
+        PFCOUNT over several keys returns the cardinality of their union.
+        """
+        index_keys = self._distinct_index_keys(
+            time_keys, self._read_resolution(cell_resolution)
+        )
         with self.client.pipeline() as pipe:
-            for time_key in time_keys:
-                resolution_key = f"{self.key_prefix}:{time_key}:{cell_resolution}"
-                pipe.hgetall(resolution_key)
+            for index_key in index_keys:
+                pipe.smembers(index_key)
+            cells_per_minute = pipe.execute()
 
-            results = pipe.execute()
+        hll_keys = self._group_hll_keys(index_keys, cells_per_minute, cell_resolution)
 
+        with self.client.pipeline() as pipe:
+            for keys in hll_keys.values():
+                pipe.pfcount(*keys)
+            counts = pipe.execute()
+
+        return dict(zip(hll_keys, counts))
+
+    def _resolution_keys(self, time_keys, cell_resolution):
+        return [
+            f"{self.key_prefix}:{time_key}:{cell_resolution}" for time_key in time_keys
+        ]
+
+    def _cached_buckets(self, resolution_keys):
+        """Cached bucket counts (None where missing) and the missing indexes."""
+        if self.cache is None:
+            return [None] * len(resolution_keys), list(range(len(resolution_keys)))
+        results = [self.cache.get_bucket(key) for key in resolution_keys]
+        return results, [i for i, result in enumerate(results) if result is None]
+
+    def _store_buckets(self, time_keys, cell_resolution, results, missing, fetched):
+        """Fill in the fetched buckets and cache the completed ones among them."""
+        now = datetime.utcnow()
+        retention = get_retention(self.key_prefix, cell_resolution)["1m"]
+        resolution_keys = self._resolution_keys(time_keys, cell_resolution)
+        for i, data in zip(missing, fetched):
+            results[i] = data
+            if self.cache is not None and self.cache.is_complete(time_keys[i], now):
+                # Roughly when Redis expires the bucket.
+                age = now - datetime.strptime(time_keys[i], "%Y-%m-%dT%H:%M")
+                ttl = retention - age.total_seconds()
+                if ttl > 0:
+                    self.cache.put_bucket(resolution_keys[i], data, ttl)
+        return results
+
+    def _read_buckets(self, time_keys, cell_resolution):
+        """
+        Counts of each minute bucket, in `time_keys` order. Completed buckets
+        come from the cache when it has them; the rest are read in a single
+        pipeline, and the completed ones among them are cached.
+        """
+        resolution_keys = self._resolution_keys(time_keys, cell_resolution)
+        results, missing = self._cached_buckets(resolution_keys)
+        if not missing:
+            return results
+
+        with self.client.pipeline() as pipe:
+            for i in missing:
+                pipe.hgetall(resolution_keys[i])
+            fetched = pipe.execute()
+
+        return self._store_buckets(
+            time_keys, cell_resolution, results, missing, fetched
+        )
+
+    def _sum_buckets(self, results):
+        total_count = {}
         for data in results:
             if not data:
                 continue
             for region, count in data.items():
                 total_count[region] = total_count.get(region, 0) + int(count)
+        return total_count
 
+    def _aggregate_counts(self, time_keys, cell_resolution):
+        """Aggregate the counts for the given time keys and cell resolution."""
+        if self.distinct:
+            return self._aggregate_distinct_counts(time_keys, cell_resolution)
+
+        read_resolution = self._read_resolution(cell_resolution)
+        total_count = self._sum_buckets(self._read_buckets(time_keys, read_resolution))
+        return self._rollup(total_count, cell_resolution)
+
+    def _uses_sliding_window(self):
+        return self.time_window_minutes in SLIDING_WINDOWS and not self.distinct
+
+    def _queue_sliding_window(self, pipe, cell_resolution):
+        cell_resolution = self._read_resolution(cell_resolution)
+        pipe.get(
+            window_watermark_key(
+                self.key_prefix, self.time_window_minutes, cell_resolution
+            )
+        )
+        pipe.hgetall(
+            window_key(self.key_prefix, self.time_window_minutes, cell_resolution)
+        )
+
+    def _parse_sliding_window(self, watermark, totals, cell_resolution):
+        oldest = window_start_watermark(
+            datetime.utcnow() - timedelta(minutes=1), self.time_window_minutes
+        )
+        if not watermark or watermark < oldest:
+            return None
+        total_count = {region: int(count) for region, count in totals.items()}
+        return self._rollup(total_count, cell_resolution)
+
+    def _read_sliding_window(self, cell_resolution):
+        """
+        Read the incrementally maintained totals of this window, or None when
+        the window maintainer has fallen more than a minute behind.
+        """
+        with self.client.pipeline(transaction=False) as pipe:
+            self._queue_sliding_window(pipe, cell_resolution)
+            watermark, totals = pipe.execute()
+        return self._parse_sliding_window(watermark, totals, cell_resolution)
+
+    def _result_key(self, cell_resolution):
+        return (
+            self.key_prefix,
+            cell_resolution,
+            self.time_window_minutes,
+            self.distinct,
+        )
+
+    def _cached_result(self, cell_resolution):
+        if self.cache is None:
+            return None
+        return self.cache.get_result(self._result_key(cell_resolution))
+
+    def _store_result(self, cell_resolution, total_count):
+        if self.cache is not None:
+            self.cache.put_result(self._result_key(cell_resolution), total_count)
         return total_count
 
-    def get_aggregated_data(self, cell_resolution: int):
-        """Fetch and aggregate data for the specified H3 resolution."""
-        time_keys = self._generate_time_keys()
-        total_count = self._aggregate_counts(time_keys, cell_resolution)
+    def _get_window_counts(self, cell_resolution):
+        total_count = self._cached_result(cell_resolution)
+        if total_count is not None:
+            return total_count
+
+        if self._uses_sliding_window():
+            total_count = self._read_sliding_window(cell_resolution)
+        if total_count is None:
+            time_keys = self._generate_time_keys()
+            total_count = self._aggregate_counts(time_keys, cell_resolution)
+
+        return self._store_result(cell_resolution, total_count)
 
+    def _build_response(self, total_count):
         aggregated_data = [
             DriverPositionsCount(region=region, count=count)
             for region, count in total_count.items()
@@ -63,11 +344,502 @@ class DataAggregator:
 
         return DriverPositionsCountResponse(driver_position_counts=aggregated_data)
 
+    def get_aggregated_data(self, cell_resolution: int):
+        """Fetch and aggregate data for the specified H3 resolution."""
+        return self._build_response(self._get_window_counts(cell_resolution))
+
+    def get_window_counts(self, cell_resolution: int):
+        """{region: count} over the window, without building response models."""
+        return self._get_window_counts(cell_resolution)
+
+    def get_window_time_keys(self):
+        """Minute keys of the current window, e.g. to tag a response with."""
+        return self._generate_time_keys()
+
+    def _expand_cells(self, cell_ids):
+        """
+        The stored cells making up each requested cell (itself, or its
+        children when rolling up), and the fields to read per stored
+        resolution. Raises TooManyCellsError past MAX_EXPANDED_CELLS.
+        """
+        cell_ids = list(dict.fromkeys(cell_ids))
+        resolutions = [h3.get_resolution(cell_id) for cell_id in cell_ids]
+        # Upper bound: pentagons have 6 children, not 7.
+        expanded = sum(
+            7 ** (self._read_resolution(res) - res) for res in resolutions
+        )
+        if expanded > MAX_EXPANDED_CELLS:
+            raise TooManyCellsError(
+                f"Query expands to {expanded} stored cells, more than "
+                f"{MAX_EXPANDED_CELLS}"
+            )
+
+        members = {}
+        fields = {}
+        for cell_id, cell_resolution in zip(cell_ids, resolutions):
+            read_resolution = self._read_resolution(cell_resolution)
+            stored_cells = (
+                [cell_id]
+                if read_resolution == cell_resolution
+                else list(h3.cell_to_children(cell_id, read_resolution))
+            )
+            members[cell_id] = (read_resolution, stored_cells)
+            fields.setdefault(read_resolution, {}).update(dict.fromkeys(stored_cells))
+        return members, {res: list(cells) for res, cells in fields.items()}
+
+    def _plan_cell_reads(self, cell_ids, time_keys):
+        """
+        Reads needed to count `cell_ids` over `time_keys`: one PFCOUNT per
+        cell in distinct mode, otherwise one HMGET per minute bucket and
+        stored resolution, skipping buckets already in the cache.
+        """
+        members, fields = self._expand_cells(cell_ids)
+        reads = []
+        if self.distinct:
+            for cell_id, (read_resolution, stored_cells) in members.items():
+                keys = [
+                    f"{index_key}:{stored_cell}"
+                    for index_key in self._distinct_index_keys(
+                        time_keys, read_resolution
+                    )
+                    for stored_cell in stored_cells
+                ]
+                reads.append((cell_id, keys, None))
+        else:
+            for res in fields:
+                for resolution_key in self._resolution_keys(time_keys, res):
+                    bucket = (
+                        self.cache.get_bucket(resolution_key) if self.cache else None
+                    )
+                    reads.append((res, resolution_key, bucket))
+        return members, fields, reads
+
+    def _queue_cell_reads(self, pipe, plan):
+        _, fields, reads = plan
+        for target, keys, bucket in reads:
+            if self.distinct:
+                pipe.pfcount(*keys)
+            elif bucket is None:
+                pipe.hmget(keys, fields[target])
+
+    def _combine_cell_reads(self, plan, results):
+        """Counts of the requested cells, 0 for cells without data."""
+        members, fields, reads = plan
+        if self.distinct:
+            return {cell_id: count for (cell_id, _, _), count in zip(reads, results)}
+
+        totals = {
+            res: np.zeros(len(res_fields), dtype=np.int64)
+            for res, res_fields in fields.items()
+        }
+        results = iter(results)
+        for res, _, bucket in reads:
+            if bucket is None:
+                values = next(results)
+            else:
+                values = [bucket.get(cell) for cell in fields[res]]
+            totals[res] += np.array(
+                [int(value) if value else 0 for value in values], dtype=np.int64
+            )
+
+        stored_counts = {
+            res: dict(zip(res_fields, totals[res].tolist()))
+            for res, res_fields in fields.items()
+        }
+        return {
+            cell_id: sum(stored_counts[read_resolution][cell] for cell in stored_cells)
+            for cell_id, (read_resolution, stored_cells) in members.items()
+        }
+
+    def _build_cells_response(self, cell_ids, counts):
+        return DriverPositionsCountResponse(
+            driver_position_counts=[
+                DriverPositionsCount(region=cell_id, count=counts[cell_id])
+                for cell_id in dict.fromkeys(cell_ids)
+            ]
+        )
+
+    def get_cell_counts(self, cell_ids, time_keys=None):
+        """
+        {cell: count} of a list of cells, at any mix of resolutions, over the
+        window (or `time_keys`). Only the requested fields are read, with
+        HMGETs in a single pipeline, so the cost follows the number of cells
+        rather than the size of the resolution hashes. Cells without data
+        count 0.
+        """
+        time_keys = time_keys or self._generate_time_keys()
+        plan = self._plan_cell_reads(cell_ids, time_keys)
+        with self.client.pipeline(transaction=False) as pipe:
+            self._queue_cell_reads(pipe, plan)
+            results = pipe.execute()
+        return self._combine_cell_reads(plan, results)
+
+    def get_counts_for_cells(self, cell_ids, time_keys=None):
+        return self._build_cells_response(
+            cell_ids, self.get_cell_counts(cell_ids, time_keys)
+        )
+
     def get_count_in_last_minute(self, cell_id: str):
         time_keys = [datetime.utcnow().strftime("%Y-%m-%dT%H:%M")]
-        cell_resolution = h3.get_resolution(cell_id)
+        response = self.get_counts_for_cells([cell_id], time_keys)
+        return response.driver_position_counts[0]
+
+    def _minute_time(self, minute):
+        return datetime.fromtimestamp(minute * 60, timezone.utc)
+
+    def _history_steps(self, start, end, step_minutes):
+        """
+        First epoch minute of a [start, end) history, aligned down to the
+        step, and the number of steps up to `end`, aligned up from the
+        millisecond so that a partial last step (the current minute, when
+        `end` is now) is included. Empty ranges raise ValueError.
+        """
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+        if end_ms <= start_ms:
+            raise ValueError("end must be after start")
+        first = start_ms // 60000 // step_minutes * step_minutes
+        last = -(-end_ms // (60000 * step_minutes)) * step_minutes
+        return first, (last - first) // step_minutes
+
+    def _stored_minutes(self, resolution):
+        """
+        [first, end) epoch minutes that may have a minute bucket: the oldest
+        one not expired yet up to the current minute.
+        """
+        retention = get_retention(self.key_prefix, resolution)["1m"]
+        now = to_epoch_ms(datetime.utcnow()) // 1000
+        return (now - retention) // 60, now // 60 + 1
+
+    def _check_history_size(self, members, first, num_steps, step_minutes):
+        """
+        Raise TooManyCellsError if a distinct-mode history would read more
+        than MAX_HISTORY_CELL_MINUTES HyperLogLogs, counting only the minutes
+        that may still have one.
+        """
+        end = first + num_steps * step_minutes
+        cell_minutes = 0
+        for read_resolution, stored_cells in members.values():
+            oldest, newest = self._stored_minutes(read_resolution)
+            minutes = min(end, newest) - max(first, oldest)
+            cell_minutes += len(stored_cells) * max(0, minutes)
+        if cell_minutes > MAX_HISTORY_CELL_MINUTES:
+            raise TooManyCellsError(
+                f"History reads {cell_minutes} cell-minutes, more than "
+                f"{MAX_HISTORY_CELL_MINUTES}"
+            )
+
+    def _queue_history_watermarks(self, pipe, resolutions):
+        for res in resolutions:
+            for granularity, _ in HISTORY_GRANULARITIES:
+                pipe.get(rollup_watermark_key(self.key_prefix, granularity, res))
+
+    def _parse_history_watermarks(self, resolutions, values):
+        """Epoch minute of the last compacted period, per resolution and granularity."""
+        values = iter(values)
+        watermarks = {}
+        for res in resolutions:
+            watermarks[res] = {}
+            for granularity, _ in HISTORY_GRANULARITIES:
+                value = next(values)
+                if value:
+                    period_start = datetime.strptime(value, "%Y-%m-%dT%H:%M")
+                    watermarks[res][granularity] = to_epoch_ms(period_start) // 60000
+        return watermarks
+
+    def _history_sources(self, first, num_steps, step_minutes, resolution, watermarks):
+        """
+        (step, key) of the buckets covering the steps, in order. A compacted
+        rollup bucket is read wherever one fits inside a step, so long
+        ranges at coarse steps read hourly or 15-minute buckets; everything
+        else, including periods not compacted yet, reads minute buckets.
+        Minute buckets past their retention or in the future are skipped
+        and count 0.
+        """
+        sources = []
+        minute = first
+        oldest, newest = self._stored_minutes(resolution)
+        end = min(first + num_steps * step_minutes, newest)
+        while minute < end:
+            for granularity, length in HISTORY_GRANULARITIES:
+                compacted = watermarks.get(granularity)
+                if (
+                    step_minutes % length == 0
+                    and minute % length == 0
+                    and compacted is not None
+                    and minute <= compacted
+                ):
+                    key = rollup_key(
+                        self.key_prefix,
+                        granularity,
+                        self._minute_time(minute),
+                        resolution,
+                    )
+                    break
+            else:
+                if minute < oldest:
+                    # Skip to the next compacted period that fits a step, or
+                    # to the first minute bucket still kept.
+                    minute = min(
+                        [oldest]
+                        + [
+                            period_start
+                            for granularity, length in HISTORY_GRANULARITIES
+                            for period_start in [(minute // length + 1) * length]
+                            if step_minutes % length == 0
+                            and period_start <= watermarks.get(granularity, -1)
+                        ]
+                    )
+                    continue
+                length = 1
+                time_key = self._minute_time(minute).strftime("%Y-%m-%dT%H:%M")
+                key = self._resolution_keys([time_key], resolution)[0]
+            sources.append(((minute - first) // step_minutes, key))
+            minute += length
+        return sources
+
+    def _plan_history_reads(
+        self, members, fields, first, num_steps, step_minutes, watermarks
+    ):
+        """
+        Reads needed for a history: one HMGET per source bucket and stored
+        resolution, or in distinct mode one PFCOUNT per cell and step over
+        its minute HyperLogLogs (they are not rolled up). Only minutes that
+        may still have one are read; other steps count 0.
+        """
+        reads = []
+        if self.distinct:
+            for cell_id, (read_resolution, stored_cells) in members.items():
+                oldest, newest = self._stored_minutes(read_resolution)
+                first_step = max(0, (oldest - first) // step_minutes)
+                last_step = min(num_steps, -(-(newest - first) // step_minutes))
+                for step in range(first_step, last_step):
+                    step_start = first + step * step_minutes
+                    time_keys = [
+                        self._minute_time(minute).strftime("%Y-%m-%dT%H:%M")
+                        for minute in range(
+                            max(step_start, oldest),
+                            min(step_start + step_minutes, newest),
+                        )
+                    ]
+                    keys = [
+                        f"{index_key}:{stored_cell}"
+                        for index_key in self._distinct_index_keys(
+                            time_keys, read_resolution
+                        )
+                        for stored_cell in stored_cells
+                    ]
+                    reads.append((cell_id, step, keys, None))
+        else:
+            for res in fields:
+                for step, key in self._history_sources(
+                    first, num_steps, step_minutes, res, watermarks[res]
+                ):
+                    bucket = self.cache.get_bucket(key) if self.cache else None
+                    reads.append((res, step, key, bucket))
+        return reads
+
+    def _queue_history_reads(self, pipe, fields, reads):
+        for target, _, keys, bucket in reads:
+            if self.distinct:
+                pipe.pfcount(*keys)
+            elif bucket is None:
+                pipe.hmget(keys, fields[target])
+
+    def _combine_history_reads(self, members, fields, reads, results, num_steps):
+        """(regions x steps) matrix of counts, summing buckets into their step."""
+        values = np.zeros((len(members), num_steps), dtype=np.int64)
+        if self.distinct:
+            rows = {cell_id: i for i, cell_id in enumerate(members)}
+            for (cell_id, step, _, _), count in zip(reads, results):
+                values[rows[cell_id], step] = count
+            return values
+
+        results = iter(results)
+        bucket_steps = {res: [] for res in fields}
+        bucket_values = {res: [] for res in fields}
+        for res, step, _, bucket in reads:
+            if bucket is None:
+                counts = next(results)
+            else:
+                counts = [bucket.get(cell) for cell in fields[res]]
+            bucket_steps[res].append(step)
+            bucket_values[res].extend(count or 0 for count in counts)
+
+        step_totals = {}
+        for res, res_fields in fields.items():
+            counts = np.array(bucket_values[res], dtype=np.int64).reshape(
+                len(bucket_steps[res]), len(res_fields)
+            )
+            step_totals[res] = np.zeros((num_steps, len(res_fields)), dtype=np.int64)
+            np.add.at(step_totals[res], bucket_steps[res], counts)
+
+        columns = {
+            res: {cell: i for i, cell in enumerate(res_fields)}
+            for res, res_fields in fields.items()
+        }
+        for row, (read_resolution, stored_cells) in enumerate(members.values()):
+            indexes = [columns[read_resolution][cell] for cell in stored_cells]
+            values[row] = step_totals[read_resolution][:, indexes].sum(axis=1)
+        return values
+
+    def _build_history_response(self, members, first, step_minutes, values):
+        return CountHistoryResponse(
+            timestamps=[
+                (first + step * step_minutes) * 60 for step in range(values.shape[1])
+            ],
+            step_minutes=step_minutes,
+            regions=list(members),
+            values=values.tolist(),
+        )
+
+    def get_count_history(self, cell_ids, start, end, step_minutes=1):
+        """
+        Counts of each cell per `step_minutes` step over [start, end), as
+        columns: the step start times and one row of counts per cell.
+
+        The rollup watermarks are read first, then every bucket in one
+        pipeline with HMGETs of just the requested cells. Buckets are summed
+        into their step with NumPy. Minute buckets are only kept for their
+        retention (see app.retention), so steps that are not a multiple of
+        15 minutes, and distinct counts at any step, read 0 further back
+        than that.
+        """
+        first, num_steps = self._history_steps(start, end, step_minutes)
+        members, fields = self._expand_cells(cell_ids)
+        watermarks = {}
+        if self.distinct:
+            self._check_history_size(members, first, num_steps, step_minutes)
+        else:
+            with self.client.pipeline(transaction=False) as pipe:
+                self._queue_history_watermarks(pipe, fields)
+                watermarks = self._parse_history_watermarks(fields, pipe.execute())
+
+        reads = self._plan_history_reads(
+            members, fields, first, num_steps, step_minutes, watermarks
+        )
+        with self.client.pipeline(transaction=False) as pipe:
+            self._queue_history_reads(pipe, fields, reads)
+            results = pipe.execute()
+        values = self._combine_history_reads(
+            members, fields, reads, results, num_steps
+        )
+        return self._build_history_response(members, first, step_minutes, values)
+
+    # Async variants, for a `redis.asyncio` client. They share the key
+    # building, caching and merging above and only await the Redis I/O.
+
+    async def _aggregate_distinct_counts_async(self, time_keys, cell_resolution):
+        index_keys = self._distinct_index_keys(
+            time_keys, self._read_resolution(cell_resolution)
+        )
+        async with self.client.pipeline() as pipe:
+            for index_key in index_keys:
+                pipe.smembers(index_key)
+            cells_per_minute = await pipe.execute()
+
+        hll_keys = self._group_hll_keys(index_keys, cells_per_minute, cell_resolution)
+
+        async with self.client.pipeline() as pipe:
+            for keys in hll_keys.values():
+                pipe.pfcount(*keys)
+            counts = await pipe.execute()
+
+        return dict(zip(hll_keys, counts))
+
+    async def _read_buckets_async(self, time_keys, cell_resolution):
+        resolution_keys = self._resolution_keys(time_keys, cell_resolution)
+        results, missing = self._cached_buckets(resolution_keys)
+        if not missing:
+            return results
+
+        async with self.client.pipeline() as pipe:
+            for i in missing:
+                pipe.hgetall(resolution_keys[i])
+            fetched = await pipe.execute()
+
+        return self._store_buckets(
+            time_keys, cell_resolution, results, missing, fetched
+        )
+
+    async def _aggregate_counts_async(self, time_keys, cell_resolution):
+        if self.distinct:
+            return await self._aggregate_distinct_counts_async(
+                time_keys, cell_resolution
+            )
+
+        read_resolution = self._read_resolution(cell_resolution)
+        total_count = self._sum_buckets(
+            await self._read_buckets_async(time_keys, read_resolution)
+        )
+        return self._rollup(total_count, cell_resolution)
+
+    async def _read_sliding_window_async(self, cell_resolution):
+        async with self.client.pipeline(transaction=False) as pipe:
+            self._queue_sliding_window(pipe, cell_resolution)
+            watermark, totals = await pipe.execute()
+        return self._parse_sliding_window(watermark, totals, cell_resolution)
+
+    async def _get_window_counts_async(self, cell_resolution):
+        total_count = self._cached_result(cell_resolution)
+        if total_count is not None:
+            return total_count
+
+        if self._uses_sliding_window():
+            total_count = await self._read_sliding_window_async(cell_resolution)
+        if total_count is None:
+            time_keys = self._generate_time_keys()
+            total_count = await self._aggregate_counts_async(
+                time_keys, cell_resolution
+            )
+
+        return self._store_result(cell_resolution, total_count)
+
+    async def get_aggregated_data_async(self, cell_resolution: int):
+        return self._build_response(
+            await self._get_window_counts_async(cell_resolution)
+        )
+
+    async def get_window_counts_async(self, cell_resolution: int):
+        return await self._get_window_counts_async(cell_resolution)
+
+    async def get_cell_counts_async(self, cell_ids, time_keys=None):
+        time_keys = time_keys or self._generate_time_keys()
+        plan = self._plan_cell_reads(cell_ids, time_keys)
+        async with self.client.pipeline(transaction=False) as pipe:
+            self._queue_cell_reads(pipe, plan)
+            results = await pipe.execute()
+        return self._combine_cell_reads(plan, results)
+
+    async def get_counts_for_cells_async(self, cell_ids, time_keys=None):
+        return self._build_cells_response(
+            cell_ids, await self.get_cell_counts_async(cell_ids, time_keys)
+        )
+
+    async def get_count_in_last_minute_async(self, cell_id: str):
+        time_keys = [datetime.utcnow().strftime("%Y-%m-%dT%H:%M")]
+        response = await self.get_counts_for_cells_async([cell_id], time_keys)
+        return response.driver_position_counts[0]
 
-        total_count = self._aggregate_counts(time_keys, cell_resolution=cell_resolution)
+    async def get_count_history_async(self, cell_ids, start, end, step_minutes=1):
+        first, num_steps = self._history_steps(start, end, step_minutes)
+        members, fields = self._expand_cells(cell_ids)
+        watermarks = {}
+        if self.distinct:
+            self._check_history_size(members, first, num_steps, step_minutes)
+        else:
+            async with self.client.pipeline(transaction=False) as pipe:
+                self._queue_history_watermarks(pipe, fields)
+                watermarks = self._parse_history_watermarks(
+                    fields, await pipe.execute()
+                )
 
-        count = total_count[cell_id]
-        return DriverPositionsCount(region=cell_id, count=count)
+        reads = self._plan_history_reads(
+            members, fields, first, num_steps, step_minutes, watermarks
+        )
+        async with self.client.pipeline(transaction=False) as pipe:
+            self._queue_history_reads(pipe, fields, reads)
+            results = await pipe.execute()
+        values = self._combine_history_reads(
+            members, fields, reads, results, num_steps
+        )
+        return self._build_history_response(members, first, step_minutes, values)
@@ -0,0 +1,215 @@
+import math
+import os
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional
+
+import h3
+from fastapi import FastAPI, HTTPException, Query, Request
+
+from app.driver_position.schemas import PolygonQuery
+from app.driver_position.service import DriverPositionAggregator
+from app.h3_indexing import bbox_cells, disk_cells, polygon_cells
+from app.orders.service import OrderAggregator
+from app.redis_client import REDIS_MAX_CONNECTIONS, async_redis_client
+from app.responses import (COLUMNAR_FORMAT, COLUMNAR_MEDIA_TYPE,
+                           MSGPACK_FORMAT, MSGPACK_MEDIA_TYPES, OBJECTS_FORMAT,
+                           RESPONSE_FORMATS, msgpack)
+from app.surge_pricing.service import SurgeTable
+
+MAX_CELLS_PER_REQUEST = 1000
+# Cells a k-ring, bounding box or polygon query may cover.
+MAX_AREA_CELLS = int(os.getenv("MAX_AREA_CELLS", 10_000))
+KM_PER_DEGREE = 111.32
+# Steps a history request may return.
+MAX_HISTORY_STEPS = int(os.getenv("MAX_HISTORY_STEPS", 2000))
+STEP_UNITS = {"m": 1, "h": 60, "d": 24 * 60}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open one `redis.asyncio` connection pool per worker, sized by
+    REDIS_MAX_CONNECTIONS, and build the aggregators the endpoints share.
+    Aggregators keep no per-request state, so one instance serves every
+    request.
+    """
+    async with async_redis_client(max_connections=REDIS_MAX_CONNECTIONS) as client:
+        app.state.redis = client
+        app.state.driver_position_aggregator = DriverPositionAggregator(client)
+        app.state.order_aggregator = OrderAggregator(client)
+        app.state.surge_table = SurgeTable(client)
+        yield
+
+
+def get_driver_position_aggregator(request: Request) -> DriverPositionAggregator:
+    return request.app.state.driver_position_aggregator
+
+
+def get_order_aggregator(request: Request) -> OrderAggregator:
+    return request.app.state.order_aggregator
+
+
+def get_surge_table(request: Request) -> SurgeTable:
+    return request.app.state.surge_table
+
+
+def get_response_format(
+    request: Request,
+    response_format: Optional[str] = Query(
+        None, alias="format", description="objects, columnar or msgpack"
+    ),
+) -> str:
+    """
+    Format of a count response: the `format` query flag, else the Accept
+    header (msgpack or the columnar JSON media type), else the original
+    list of objects.
+    """
+    if response_format is None:
+        accept = request.headers.get("accept", "")
+        if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+            response_format = MSGPACK_FORMAT
+        elif COLUMNAR_MEDIA_TYPE in accept:
+            response_format = COLUMNAR_FORMAT
+        else:
+            response_format = OBJECTS_FORMAT
+
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown format: {response_format}"
+        )
+    if response_format == MSGPACK_FORMAT and msgpack is None:
+        raise HTTPException(status_code=406, detail="msgpack is not installed")
+    return response_format
+
+
+def get_cell_id(cell_id: str = Query(..., description="H3 cell id")) -> str:
+    if not h3.is_valid_cell(cell_id):
+        raise HTTPException(status_code=422, detail=f"Invalid H3 cell: {cell_id}")
+    return cell_id
+
+
+def get_cell_ids(
+    cell_ids: List[str] = Query(..., description="H3 cell ids, any resolution")
+) -> List[str]:
+    if len(cell_ids) > MAX_CELLS_PER_REQUEST:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {MAX_CELLS_PER_REQUEST} cells per request",
+        )
+    invalid = [cell_id for cell_id in cell_ids if not h3.is_valid_cell(cell_id)]
+    if invalid:
+        raise HTTPException(status_code=422, detail=f"Invalid H3 cells: {invalid}")
+    return cell_ids
+
+
+def _check_resolution(cell_resolution):
+    if not 0 <= cell_resolution <= 15:
+        raise HTTPException(status_code=422, detail="Resolution must be 0-15")
+
+
+def _check_area(coordinates, cell_resolution):
+    """
+    Reject areas that would cover more than MAX_AREA_CELLS cells, estimated
+    from their bounding box before any cell is computed.
+    """
+    latitudes = [lat for lat, _ in coordinates]
+    longitudes = [lng for _, lng in coordinates]
+    if not all(-90 <= lat <= 90 for lat in latitudes) or not all(
+        -180 <= lng <= 180 for lng in longitudes
+    ):
+        raise HTTPException(status_code=422, detail="Invalid coordinates")
+
+    height = (max(latitudes) - min(latitudes)) * KM_PER_DEGREE
+    width = (
+        (max(longitudes) - min(longitudes))
+        * KM_PER_DEGREE
+        * math.cos(math.radians(sum(latitudes) / len(latitudes)))
+    )
+    estimated_cells = height * width / h3.average_hexagon_area(cell_resolution)
+    if estimated_cells > MAX_AREA_CELLS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Area covers more than {MAX_AREA_CELLS} cells at "
+            f"resolution {cell_resolution}",
+        )
+
+
+def get_disk_cell_ids(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    k: int = Query(..., ge=0, description="Ring distance around the point"),
+    cell_resolution: int = Query(..., description="H3 cell resolution"),
+) -> List[str]:
+    _check_resolution(cell_resolution)
+    if 3 * k * (k + 1) + 1 > MAX_AREA_CELLS:
+        raise HTTPException(
+            status_code=422, detail=f"k-ring covers more than {MAX_AREA_CELLS} cells"
+        )
+    center_cell = h3.latlng_to_cell(latitude, longitude, cell_resolution)
+    return list(disk_cells(center_cell, k))
+
+
+def get_bbox_cell_ids(
+    min_latitude: float = Query(...),
+    min_longitude: float = Query(...),
+    max_latitude: float = Query(...),
+    max_longitude: float = Query(...),
+    cell_resolution: int = Query(..., description="H3 cell resolution"),
+) -> List[str]:
+    _check_resolution(cell_resolution)
+    _check_area(
+        [(min_latitude, min_longitude), (max_latitude, max_longitude)],
+        cell_resolution,
+    )
+    return list(
+        bbox_cells(
+            min_latitude, min_longitude, max_latitude, max_longitude, cell_resolution
+        )
+    )
+
+
+def get_polygon_cell_ids(polygon: PolygonQuery) -> List[str]:
+    _check_resolution(polygon.cell_resolution)
+    if len(polygon.coordinates) < 3:
+        raise HTTPException(status_code=422, detail="A polygon needs 3 vertices")
+    _check_area(polygon.coordinates, polygon.cell_resolution)
+    return list(
+        polygon_cells(
+            tuple(map(tuple, polygon.coordinates)), polygon.cell_resolution
+        )
+    )
+
+
+def _to_naive_utc(moment):
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class HistoryRange(NamedTuple):
+    start: datetime
+    end: datetime
+    step_minutes: int
+
+
+def get_history_range(
+    start: datetime = Query(..., description="Start of the range (UTC if naive)"),
+    end: Optional[datetime] = Query(None, description="End of the range, now if empty"),
+    step: str = Query("1m", description="Step, e.g. 1m, 5m, 1h or 1d"),
+) -> HistoryRange:
+    match = re.fullmatch(r"(\d+)([mhd])", step)
+    if not match or int(match.group(1)) == 0:
+        raise HTTPException(status_code=422, detail=f"Invalid step: {step}")
+    step_minutes = int(match.group(1)) * STEP_UNITS[match.group(2)]
+
+    start = _to_naive_utc(start)
+    end = _to_naive_utc(end) if end else datetime.utcnow()
+    if end <= start:
+        raise HTTPException(status_code=422, detail="end must be after start")
+    if (end - start).total_seconds() / 60 / step_minutes > MAX_HISTORY_STEPS:
+        raise HTTPException(
+            status_code=422, detail=f"At most {MAX_HISTORY_STEPS} steps per request"
+        )
+    return HistoryRange(start, end, step_minutes)
@@ -1,6 +1,9 @@
 import logging
+import os
 
-from app.redis_aggregator import StreamAggregator
+from app.event_encoding import DRIVER_POSITION_EVENT
+from app.redis_aggregator import (CONSUMER_NAME, FINEST_RESOLUTION_ONLY,
+                                  StreamAggregator)
 from app.redis_client import redis_client
 
 DRIVER_POSITION_STREAM = "driver_position_stream"
@@ -8,6 +11,14 @@ DRIVER_COUNT_KEY = "driver_count_by_region"
 
 RESOLUTIONS = [7, 8, 9]
 CONSUMER_GROUP_NAME = "driver_position_consumer_group"
+# Resolution the counts are stored at when only the finest one is written.
+STORED_RESOLUTION = max(RESOLUTIONS) if FINEST_RESOLUTION_ONLY else None
+
+# Count distinct drivers per cell-minute instead of position pings.
+DISTINCT_DRIVER_COUNT = os.getenv("DISTINCT_DRIVER_COUNT", "false").lower() in (
+    "1",
+    "true",
+)
 
 
 logging.basicConfig(
@@ -16,14 +27,18 @@ logging.basicConfig(
 logger = logging.getLogger()
 
 
-def main():
+def main(consumer_name=CONSUMER_NAME, partitions=None):
     with redis_client() as client:
         aggregator = StreamAggregator(
             client,
             stream_name=DRIVER_POSITION_STREAM,
             consumer_group_name=CONSUMER_GROUP_NAME,
+            consumer_name=consumer_name,
+            partitions=partitions,
             resolutions=RESOLUTIONS,
             key_prefix=DRIVER_COUNT_KEY,
+            distinct_field="driver_id" if DISTINCT_DRIVER_COUNT else None,
+            event_codec=DRIVER_POSITION_EVENT,
         )
         aggregator.run()
 
@@ -1,28 +1,163 @@
-from fastapi import APIRouter, Query
+from typing import List
 
-from app.data_aggregator_service import REDIS_CLIENT
-from app.driver_position.schemas import (DriverPositionsCount,
+from fastapi import APIRouter, Depends, Query, Request
+
+from app.dependencies import (HistoryRange, get_bbox_cell_ids, get_cell_id,
+                              get_cell_ids, get_disk_cell_ids,
+                              get_driver_position_aggregator,
+                              get_history_range, get_polygon_cell_ids,
+                              get_response_format)
+from app.driver_position.schemas import (CountHistoryResponse,
+                                         DriverPositionsCount,
                                          DriverPositionsCountResponse)
 from app.driver_position.service import DriverPositionAggregator
+from app.responses import OBJECTS_FORMAT, columnar_response
 
 router = APIRouter()
 
 
 @router.get("/driver_counts", response_model=DriverPositionsCountResponse)
-def driver_count(cell_resolution: int = Query(..., description="H3 cell resolution")):
+async def driver_count(
+    request: Request,
+    cell_resolution: int = Query(..., description="H3 cell resolution"),
+    response_format: str = Depends(get_response_format),
+    driver_position_aggregator: DriverPositionAggregator = Depends(
+        get_driver_position_aggregator
+    ),
+):
     """API endpoint to get the real-time driver count."""
 
-    # For Driver Positions
-    driver_position_aggregator = DriverPositionAggregator(REDIS_CLIENT)
-    return driver_position_aggregator.get_driver_count_for_all_cells(
-        cell_resolution=cell_resolution
+    if response_format == OBJECTS_FORMAT:
+        return await driver_position_aggregator.get_driver_count_for_all_cells_async(
+            cell_resolution=cell_resolution
+        )
+    counts = await driver_position_aggregator.get_window_counts_async(cell_resolution)
+    return columnar_response(
+        request,
+        counts,
+        driver_position_aggregator.get_window_time_keys(),
+        response_format,
     )
 
 
 @router.get("/driver_count_for_cell", response_model=DriverPositionsCount)
-def driver_count_by_cell(cell_id: str = Query(..., description="H3 cell id")):
+async def driver_count_by_cell(
+    cell_id: str = Depends(get_cell_id),
+    driver_position_aggregator: DriverPositionAggregator = Depends(
+        get_driver_position_aggregator
+    ),
+):
     """API endpoint to get the real-time driver count."""
 
-    # For Driver Positions
-    driver_position_aggregator = DriverPositionAggregator(REDIS_CLIENT)
-    return driver_position_aggregator.get_driver_count_in_last_minute(cell_id=cell_id)
+    return await driver_position_aggregator.get_driver_count_in_last_minute_async(
+        cell_id=cell_id
+    )
+
+
+@router.get("/driver_counts_for_cells", response_model=DriverPositionsCountResponse)
+async def driver_counts_for_cells(
+    cell_ids: List[str] = Depends(get_cell_ids),
+    driver_position_aggregator: DriverPositionAggregator = Depends(
+        get_driver_position_aggregator
+    ),
+):
+    """API endpoint to get the driver count of several cells (0 if absent)."""
+
+    return await driver_position_aggregator.get_driver_counts_for_cells_async(
+        cell_ids
+    )
+
+
+@router.get("/driver_counts_near", response_model=DriverPositionsCountResponse)
+async def driver_counts_near(
+    cell_ids: List[str] = Depends(get_disk_cell_ids),
+    driver_position_aggregator: DriverPositionAggregator = Depends(
+        get_driver_position_aggregator
+    ),
+):
+    """API endpoint to get the driver count of the cells k rings around a point."""
+
+    return await driver_position_aggregator.get_driver_counts_for_cells_async(
+        cell_ids
+    )
+
+
+@router.get("/driver_counts_in_bbox", response_model=DriverPositionsCountResponse)
+async def driver_counts_in_bbox(
+    cell_ids: List[str] = Depends(get_bbox_cell_ids),
+    driver_position_aggregator: DriverPositionAggregator = Depends(
+        get_driver_position_aggregator
+    ),
+):
+    """API endpoint to get the driver count of the cells in a bounding box."""
+
+    return await driver_position_aggregator.get_driver_counts_for_cells_async(
+        cell_ids
+    )
+
+
+@router.post("/driver_counts_in_polygon", response_model=DriverPositionsCountResponse)
+async def driver_counts_in_polygon(
+    cell_ids: List[str] = Depends(get_polygon_cell_ids),
+    driver_position_aggregator: DriverPositionAggregator = Depends(
+        get_driver_position_aggregator
+    ),
+):
+    """API endpoint to get the driver count of the cells in a polygon."""
+
+    return await driver_position_aggregator.get_driver_counts_for_cells_async(
+        cell_ids
+    )
+
+
+@router.get("/driver_count_history", response_model=CountHistoryResponse)
+async def driver_count_history(
+    cell_ids: List[str] = Depends(get_cell_ids),
+    history_range: HistoryRange = Depends(get_history_range),
+    driver_position_aggregator: DriverPositionAggregator = Depends(
+        get_driver_position_aggregator
+    ),
+):
+    """API endpoint to get the driver count of several cells per step over a range."""
+
+    return await driver_position_aggregator.get_driver_count_history_async(
+        cell_ids, *history_range
+    )
+
+
+@router.get("/current_driver_counts", response_model=DriverPositionsCountResponse)
+async def current_driver_count(
+    request: Request,
+    cell_resolution: int = Query(..., description="H3 cell resolution"),
+    response_format: str = Depends(get_response_format),
+    driver_position_aggregator: DriverPositionAggregator = Depends(
+        get_driver_position_aggregator
+    ),
+):
+    """API endpoint to get the drivers currently in each cell."""
+
+    if response_format == OBJECTS_FORMAT:
+        return await (
+            driver_position_aggregator.get_current_driver_count_for_all_cells_async(
+                cell_resolution=cell_resolution
+            )
+        )
+    supply = await driver_position_aggregator.get_current_driver_supply_async(
+        cell_resolution
+    )
+    # The live index has no window; the ETag follows the content alone.
+    return columnar_response(request, supply, (), response_format)
+
+
+@router.get("/current_driver_count_for_cell", response_model=DriverPositionsCount)
+async def current_driver_count_by_cell(
+    cell_id: str = Depends(get_cell_id),
+    driver_position_aggregator: DriverPositionAggregator = Depends(
+        get_driver_position_aggregator
+    ),
+):
+    """API endpoint to get the drivers currently in a cell."""
+
+    return await driver_position_aggregator.get_current_driver_count_async(
+        cell_id=cell_id
+    )
@@ -0,0 +1,41 @@
+import logging
+
+from app.event_encoding import DRIVER_POSITION_EVENT
+from app.redis_client import redis_client
+from app.redis_location_index import CONSUMER_NAME, StreamLocationIndex
+
+DRIVER_POSITION_STREAM = "driver_position_stream"
+DRIVER_LOCATION_KEY = "driver_location"
+DRIVER_SUPPLY_KEY = "driver_supply"
+DRIVER_LAST_SEEN_KEY = "driver_last_seen"
+
+RESOLUTIONS = [7, 8, 9]
+CONSUMER_GROUP_NAME = "driver_location_index_consumer_group"
+
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger()
+
+
+def main(consumer_name=CONSUMER_NAME, partitions=None):
+    with redis_client() as client:
+        location_index = StreamLocationIndex(
+            client,
+            stream_name=DRIVER_POSITION_STREAM,
+            consumer_group_name=CONSUMER_GROUP_NAME,
+            consumer_name=consumer_name,
+            partitions=partitions,
+            resolutions=RESOLUTIONS,
+            id_field="driver_id",
+            location_key=DRIVER_LOCATION_KEY,
+            supply_key=DRIVER_SUPPLY_KEY,
+            last_seen_key=DRIVER_LAST_SEEN_KEY,
+            event_codec=DRIVER_POSITION_EVENT,
+        )
+        location_index.run()
+
+
+if __name__ == "__main__":
+    main()
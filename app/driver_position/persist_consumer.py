@@ -1,7 +1,7 @@
 import logging
 
 from app.redis_client import redis_client
-from app.redis_persist import StreamSave
+from app.redis_persist import CONSUMER_NAME, StreamSave
 
 DRIVER_POSITION_STREAM = "driver_position_stream"
 DRIVER_COUNT_KEY = "driver_count_by_region"
@@ -16,12 +16,14 @@ logging.basicConfig(
 logger = logging.getLogger()
 
 
-def main():
+def main(consumer_name=CONSUMER_NAME, partitions=None):
     with redis_client() as client:
         saver = StreamSave(
             client,
             stream_name=DRIVER_POSITION_STREAM,
             consumer_group_name=CONSUMER_GROUP_NAME,
+            consumer_name=consumer_name,
+            partitions=partitions,
         )
         saver.run()
 
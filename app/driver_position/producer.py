@@ -7,6 +7,7 @@ from datetime import datetime
 
 from dotenv import load_dotenv
 
+from app.event_encoding import DRIVER_POSITION_EVENT
 from app.redis_client import redis_client
 from app.redis_producer import RedisProducer, signal_handler
 
@@ -33,10 +34,10 @@ def generate_driver_position():
     driver_id = uuid.uuid4()
     """Generate a driver's position within Belo Horizonte's coordinates."""
     return {
-        "driver_id": str(driver_id),
-        "latitude": f"{random.uniform(BH_LAT_MIN, BH_LAT_MAX):.6f}",
-        "longitude": f"{random.uniform(BH_LON_MIN, BH_LON_MAX):.6f}",
-        "timestamp": datetime.utcnow().isoformat(),
+        "driver_id": driver_id,
+        "latitude": random.uniform(BH_LAT_MIN, BH_LAT_MAX),
+        "longitude": random.uniform(BH_LON_MIN, BH_LON_MAX),
+        "timestamp": datetime.utcnow(),
     }
 
 
@@ -52,6 +53,7 @@ if __name__ == "__main__":
             client=client,
             stream_name=DRIVER_POSITION_STREAM,
             generate_data_callback=generate_driver_position,
+            event_codec=DRIVER_POSITION_EVENT,
         )
 
         driver_position_producer.produce()
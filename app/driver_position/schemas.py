@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from pydantic import BaseModel
 
@@ -10,3 +10,18 @@ class DriverPositionsCount(BaseModel):
 
 class DriverPositionsCountResponse(BaseModel):
     driver_position_counts: Optional[List[DriverPositionsCount]]
+
+
+class CountHistoryResponse(BaseModel):
+    # Start of each step, in epoch seconds.
+    timestamps: List[int]
+    step_minutes: int
+    regions: List[str]
+    # One row per region, one column per timestamp.
+    values: List[List[int]]
+
+
+class PolygonQuery(BaseModel):
+    # (latitude, longitude) vertices of the outer ring.
+    coordinates: List[Tuple[float, float]]
+    cell_resolution: int
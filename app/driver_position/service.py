@@ -3,18 +3,29 @@ from datetime import datetime
 import h3
 
 from app.data_aggregator_service import DataAggregator
-from app.driver_position.aggregator_consumer import DRIVER_COUNT_KEY
-from app.driver_position.schemas import DriverPositionsCount
+from app.driver_position.aggregator_consumer import (DISTINCT_DRIVER_COUNT,
+                                                     DRIVER_COUNT_KEY,
+                                                     STORED_RESOLUTION)
+from app.driver_position.location_index_consumer import DRIVER_SUPPLY_KEY
+from app.driver_position.schemas import (DriverPositionsCount,
+                                         DriverPositionsCountResponse)
 
 TIME_WINDOW_MINUTES = 5
 
 
 class DriverPositionAggregator(DataAggregator):
-    def __init__(self, redis_client, time_window_minutes=TIME_WINDOW_MINUTES):
+    def __init__(
+        self,
+        redis_client,
+        time_window_minutes=TIME_WINDOW_MINUTES,
+        distinct=DISTINCT_DRIVER_COUNT,
+    ):
         super().__init__(
             redis_client,
             key_prefix=DRIVER_COUNT_KEY,
             time_window_minutes=time_window_minutes,
+            distinct=distinct,
+            stored_resolution=STORED_RESOLUTION,
         )
 
     def get_driver_count_for_all_cells(self, cell_resolution: int):
@@ -23,3 +34,57 @@ class DriverPositionAggregator(DataAggregator):
 
     def get_driver_count_in_last_minute(self, cell_id: str):
         return self.get_count_in_last_minute(cell_id=cell_id)
+
+    async def get_driver_count_for_all_cells_async(self, cell_resolution: int):
+        return await self.get_aggregated_data_async(cell_resolution)
+
+    async def get_driver_count_in_last_minute_async(self, cell_id: str):
+        return await self.get_count_in_last_minute_async(cell_id=cell_id)
+
+    def get_driver_counts_for_cells(self, cell_ids):
+        return self.get_counts_for_cells(cell_ids)
+
+    async def get_driver_counts_for_cells_async(self, cell_ids):
+        return await self.get_counts_for_cells_async(cell_ids)
+
+    def get_driver_count_history(self, cell_ids, start, end, step_minutes=1):
+        return self.get_count_history(cell_ids, start, end, step_minutes)
+
+    async def get_driver_count_history_async(
+        self, cell_ids, start, end, step_minutes=1
+    ):
+        return await self.get_count_history_async(cell_ids, start, end, step_minutes)
+
+    def _build_supply_response(self, supply):
+        return DriverPositionsCountResponse(
+            driver_position_counts=[
+                DriverPositionsCount(region=region, count=int(count))
+                for region, count in supply.items()
+            ]
+        )
+
+    def get_current_driver_count_for_all_cells(self, cell_resolution: int):
+        """Drivers currently in each cell, from the live location index."""
+        supply = self.client.hgetall(f"{DRIVER_SUPPLY_KEY}:{cell_resolution}")
+        return self._build_supply_response(supply)
+
+    async def get_current_driver_supply_async(self, cell_resolution: int):
+        """{cell: drivers currently in it}, as stored in the location index."""
+        return await self.client.hgetall(f"{DRIVER_SUPPLY_KEY}:{cell_resolution}")
+
+    async def get_current_driver_count_for_all_cells_async(self, cell_resolution: int):
+        supply = await self.get_current_driver_supply_async(cell_resolution)
+        return self._build_supply_response(supply)
+
+    def get_current_driver_count(self, cell_id: str):
+        """Drivers currently in one cell, from the live location index."""
+        cell_resolution = h3.get_resolution(cell_id)
+        count = self.client.hget(f"{DRIVER_SUPPLY_KEY}:{cell_resolution}", cell_id)
+        return DriverPositionsCount(region=cell_id, count=int(count or 0))
+
+    async def get_current_driver_count_async(self, cell_id: str):
+        cell_resolution = h3.get_resolution(cell_id)
+        count = await self.client.hget(
+            f"{DRIVER_SUPPLY_KEY}:{cell_resolution}", cell_id
+        )
+        return DriverPositionsCount(region=cell_id, count=int(count or 0))
@@ -0,0 +1,278 @@
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+TIME_KEY_FORMAT = "%Y-%m-%dT%H:%M"
+
+# Stream field holding a binary encoded event. Entries without it are read
+# with the legacy layout: one string field per attribute.
+EVENT_FIELD = "e"
+ENCODING_VERSION = 1
+# "binary" or "legacy"; consumers read both, so producers can switch freely.
+STREAM_ENCODING = os.getenv("STREAM_ENCODING", "binary")
+
+# How legacy string fields are parsed; any other field is kept as a string.
+LEGACY_FIELD_TYPES = {
+    "latitude": "float",
+    "longitude": "float",
+    "timestamp": "timestamp",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def to_epoch_ms(timestamp):
+    """Epoch milliseconds of a datetime, or of a naive ISO string in UTC."""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return int(timestamp.timestamp() * 1000)
+    return int(timestamp)
+
+
+def minute_time_keys(timestamps_ms):
+    """`%Y-%m-%dT%H:%M` bucket keys of epoch-ms timestamps, formatted once per minute."""
+    minutes, inverse = np.unique(
+        np.asarray(timestamps_ms, dtype=np.int64) // 60000, return_inverse=True
+    )
+    keys = [
+        datetime.fromtimestamp(int(minute) * 60, timezone.utc).strftime(
+            TIME_KEY_FORMAT
+        )
+        for minute in minutes
+    ]
+    return [keys[i] for i in inverse.ravel()]
+
+
+def decode_entries(messages):
+    """
+    Stream entries read with a bytes client (see
+    app.redis_client.bytes_client), with their ids and field names as
+    strings. Values stay bytes until `decode_events` parses them.
+    """
+    return [
+        (
+            message_id.decode(),
+            {name.decode(): value for name, value in (fields or {}).items()},
+        )
+        for message_id, fields in messages
+    ]
+
+
+def _legacy_string(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _uuid_strings(column):
+    raw = column.tobytes()
+    return [str(uuid.UUID(bytes=raw[i : i + 16])) for i in range(0, len(raw), 16)]
+
+
+class EventCodec:
+    def __init__(self, fields):
+        """
+        Binary layout of one event type.
+
+        Args:
+            fields: (name, type, legacy format) tuples, where type is "uuid"
+                (16 bytes), "float" (float64) or "timestamp" (epoch ms int64),
+                and the format is the one legacy string fields were written
+                with, e.g. ".6f".
+
+        Events are packed little endian after a one byte version header, so
+        every event of a type has the same size and a batch decodes with a
+        single `np.frombuffer`.
+        """
+        self.fields = fields
+        self.field_types = {name: field_type for name, field_type, _ in fields}
+        numpy_types = {"uuid": ("u1", (16,)), "float": ("<f8",), "timestamp": ("<i8",)}
+        self.dtypes = {
+            ENCODING_VERSION: np.dtype(
+                [("version", "u1")]
+                + [
+                    (name, *numpy_types[field_type])
+                    for name, field_type, _ in fields
+                ]
+            )
+        }
+
+    def encode(self, event):
+        """Pack an event (uuids, floats and datetimes) into its stream fields."""
+        record = self.new_records(1)
+        for name, field_type, _ in self.fields:
+            value = event[name]
+            if field_type == "uuid":
+                if not isinstance(value, uuid.UUID):
+                    value = uuid.UUID(value)
+                record[name] = np.frombuffer(value.bytes, dtype=np.uint8)
+            elif field_type == "timestamp":
+                record[name] = to_epoch_ms(value)
+            else:
+                record[name] = float(value)
+        return {EVENT_FIELD: record.tobytes()}
+
+    def new_records(self, size):
+        """Zeroed array of `size` current-version records, to fill column-wise."""
+        records = np.zeros(size, dtype=self.dtypes[ENCODING_VERSION])
+        records["version"] = ENCODING_VERSION
+        return records
+
+    def encode_records(self, records):
+        """Payloads of every record in a `new_records` array."""
+        buffer = records.tobytes()
+        size = records.dtype.itemsize
+        return [buffer[i : i + size] for i in range(0, len(buffer), size)]
+
+    def encode_legacy(self, event):
+        """The original one string per field layout."""
+        fields = {}
+        for name, field_type, legacy_format in self.fields:
+            value = event[name]
+            if field_type == "timestamp" and isinstance(value, datetime):
+                fields[name] = value.isoformat()
+            elif legacy_format:
+                fields[name] = format(float(value), legacy_format)
+            else:
+                fields[name] = str(value)
+        return fields
+
+    def encode_fields(self, event, encoding=STREAM_ENCODING):
+        if encoding == "legacy":
+            return self.encode_legacy(event)
+        return self.encode(event)
+
+    def get_dtype(self, payload):
+        """Record dtype of a payload, or None if its version or size is unknown."""
+        dtype = self.dtypes.get(payload[0]) if payload else None
+        if dtype is None or len(payload) != dtype.itemsize:
+            return None
+        return dtype
+
+    def decode(self, payloads, names, dtype):
+        """Decode same-version binary payloads into columns."""
+        records = np.frombuffer(b"".join(payloads), dtype=dtype)
+        columns = {}
+        for name in names:
+            if self.field_types[name] == "uuid":
+                columns[name] = _uuid_strings(records[name])
+            else:
+                columns[name] = records[name]
+        return columns
+
+
+def _decode_legacy(data, names, field_types):
+    values = {}
+    for name in names:
+        field_type = field_types.get(name)
+        value = _legacy_string(data[name])
+        if field_type == "float":
+            values[name] = float(value)
+        elif field_type == "timestamp":
+            values[name] = to_epoch_ms(value)
+        else:
+            values[name] = value
+    return values
+
+
+def decode_events(messages, names, codec=None):
+    """
+    Decode a batch of stream entries into columns. Field values are bytes
+    (see `decode_entries`); legacy fields may also be strings.
+
+    Binary entries are decoded together (one group per encoding version);
+    legacy entries are parsed field by field. Floats come back as float64
+    arrays, timestamps as epoch-ms int64 arrays and any other field as a list
+    of strings. Entries that fail to decode, or have non finite coordinates,
+    are logged and left out.
+
+    Returns the ids of the decoded entries and the columns, in the same order.
+    """
+    field_types = codec.field_types if codec else LEGACY_FIELD_TYPES
+    binary = {}
+    legacy_ids = []
+    legacy_rows = []
+    for message_id, data in messages:
+        payload = data.get(EVENT_FIELD)
+        if payload is not None and codec is not None:
+            dtype = codec.get_dtype(payload)
+            if dtype is None:
+                logger.error(
+                    f"Error processing message {message_id}: unknown event encoding"
+                )
+            else:
+                binary.setdefault(dtype, ([], []))
+                binary[dtype][0].append(message_id)
+                binary[dtype][1].append(payload)
+            continue
+        try:
+            legacy_rows.append(_decode_legacy(data, names, field_types))
+            legacy_ids.append(message_id)
+        except Exception as e:
+            logger.error(f"Error processing message {message_id}: {e}")
+
+    message_ids = []
+    parts = []
+    for dtype, (ids, payloads) in binary.items():
+        parts.append(codec.decode(payloads, names, dtype))
+        message_ids += ids
+    if legacy_rows:
+        parts.append({name: [row[name] for row in legacy_rows] for name in names})
+        message_ids += legacy_ids
+
+    columns = {}
+    for name in names:
+        field_type = field_types.get(name)
+        values = [part[name] for part in parts]
+        if field_type == "float":
+            columns[name] = np.concatenate(values) if values else np.empty(0)
+        elif field_type == "timestamp":
+            columns[name] = (
+                np.concatenate(values).astype(np.int64)
+                if values
+                else np.empty(0, dtype=np.int64)
+            )
+        else:
+            columns[name] = [value for part in values for value in part]
+
+    if "latitude" in columns and "longitude" in columns:
+        valid = np.isfinite(columns["latitude"]) & np.isfinite(columns["longitude"])
+        if not valid.all():
+            for i in np.flatnonzero(~valid):
+                logger.error(
+                    f"Error processing message {message_ids[i]}: invalid coordinates "
+                    f"{columns['latitude'][i]}, {columns['longitude'][i]}"
+                )
+            message_ids = [mid for mid, ok in zip(message_ids, valid) if ok]
+            for name, column in columns.items():
+                if isinstance(column, np.ndarray):
+                    columns[name] = column[valid]
+                else:
+                    columns[name] = [value for value, ok in zip(column, valid) if ok]
+
+    return message_ids, columns
+
+
+DRIVER_POSITION_EVENT = EventCodec(
+    [
+        ("driver_id", "uuid", None),
+        ("latitude", "float", ".6f"),
+        ("longitude", "float", ".6f"),
+        ("timestamp", "timestamp", None),
+    ]
+)
+
+ORDER_EVENT = EventCodec(
+    [
+        ("order_id", "uuid", None),
+        ("customer_id", "uuid", None),
+        ("order_value", "float", ".2f"),
+        ("latitude", "float", ".6f"),
+        ("longitude", "float", ".6f"),
+        ("timestamp", "timestamp", None),
+    ]
+)
@@ -0,0 +1,145 @@
+import os
+from functools import lru_cache
+
+import h3
+import h3.api.numpy_int as h3_int
+import numpy as np
+
+# Bit layout of an H3 cell index: the resolution lives in bits 52-55 and each
+# resolution digit takes 3 bits, with unused (finer) digits set to 0b111.
+H3_MAX_RES = 15
+H3_RES_OFFSET = 52
+H3_RES_MASK = np.uint64(0xF << H3_RES_OFFSET)
+H3_DIGIT_BITS = 3
+# Child cells whose parents are remembered, per resolution, by ParentCache.
+PARENT_CACHE_SIZE = int(os.getenv("PARENT_CACHE_SIZE", 200_000))
+# Cell sets of k-rings and polygons remembered by disk_cells / polygon_cells.
+AREA_CACHE_SIZE = int(os.getenv("AREA_CACHE_SIZE", 1024))
+
+
+def latlng_to_cells(latitudes, longitudes, resolution):
+    """Index arrays of coordinates into integer H3 cells at one resolution."""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    return np.fromiter(
+        (
+            h3_int.latlng_to_cell(lat, lng, resolution)
+            for lat, lng in zip(latitudes.tolist(), longitudes.tolist())
+        ),
+        dtype=np.uint64,
+        count=len(latitudes),
+    )
+
+
+def cells_to_parent(cells, resolution):
+    """
+    Vectorized equivalent of h3.cell_to_parent for an array of integer cells.
+
+    All cells must be at a resolution greater than or equal to `resolution`.
+    """
+    unused_digits = np.uint64((1 << (H3_DIGIT_BITS * (H3_MAX_RES - resolution))) - 1)
+    cells = np.asarray(cells, dtype=np.uint64)
+    return (
+        (cells & ~H3_RES_MASK)
+        | np.uint64(resolution << H3_RES_OFFSET)
+        | unused_digits
+    )
+
+
+def cells_to_str(cells):
+    # Same output as h3.int_to_str, without the per-call validation overhead.
+    return [format(cell, "x") for cell in np.asarray(cells).tolist()]
+
+
+def get_h3_cells_batch(latitudes, longitudes, resolutions):
+    """
+    Index a batch of coordinates at every resolution in `resolutions`.
+
+    Returns a dict mapping each resolution to the list of cell ids, in input
+    order. Every resolution is indexed from the coordinates, which matches
+    h3.latlng_to_cell exactly; H3 children do not nest exactly inside their
+    parents, so deriving coarse cells from the finest one would move points
+    near a cell edge into a neighbouring coarse cell.
+    """
+    return {
+        res: cells_to_str(latlng_to_cells(latitudes, longitudes, res))
+        for res in resolutions
+    }
+
+
+class ParentCache:
+    def __init__(self, max_size=PARENT_CACHE_SIZE):
+        """
+        Remembers the integer parent of child cell ids, per parent resolution.
+        The set of cells with counts is small and stable, so after warm-up a
+        roll-up does no string parsing at all. The mapping is simply dropped
+        when it outgrows `max_size`.
+        """
+        self.max_size = max_size
+        self.parents = {}
+
+    def get_parents(self, cells, resolution):
+        mapping = self.parents.setdefault(resolution, {})
+        missing = [cell for cell in cells if cell not in mapping]
+        if missing:
+            children = np.array([int(cell, 16) for cell in missing], dtype=np.uint64)
+            if len(mapping) + len(missing) > self.max_size:
+                mapping.clear()
+            mapping.update(
+                zip(missing, cells_to_parent(children, resolution).tolist())
+            )
+        return np.fromiter(
+            (mapping[cell] for cell in cells), dtype=np.uint64, count=len(cells)
+        )
+
+
+PARENT_CACHE = ParentCache()
+
+
+def rollup_counts(counts, resolution, parent_cache=PARENT_CACHE):
+    """
+    Sum a {cell: count} mapping into the parents of its cells at a coarser
+    `resolution`. Parents follow the H3 index hierarchy, which does not nest
+    exactly: a point near a cell edge may count towards a neighbour of the
+    cell it would be indexed into directly.
+    """
+    if not counts:
+        return {}
+    parents = parent_cache.get_parents(list(counts), resolution)
+    values = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    unique_parents, inverse = np.unique(parents, return_inverse=True)
+    totals = np.zeros(len(unique_parents), dtype=np.int64)
+    np.add.at(totals, inverse.ravel(), values)
+    return dict(zip(cells_to_str(unique_parents), totals.tolist()))
+
+
+@lru_cache(maxsize=AREA_CACHE_SIZE)
+def disk_cells(center_cell, k):
+    """
+    Cells within `k` steps of `center_cell`, at its resolution. Keyed by the
+    center cell rather than the coordinates, so every point in the same cell
+    shares one entry.
+    """
+    return tuple(h3.grid_disk(center_cell, k))
+
+
+@lru_cache(maxsize=AREA_CACHE_SIZE)
+def polygon_cells(outer, resolution):
+    """
+    Cells whose centers fall inside a polygon, given as a tuple of (lat, lng)
+    vertices.
+    """
+    return tuple(h3.polygon_to_cells(h3.LatLngPoly(list(outer)), resolution))
+
+
+def bbox_cells(min_lat, min_lng, max_lat, max_lng, resolution):
+    """Cells whose centers fall inside a lat/lng bounding box."""
+    return polygon_cells(
+        (
+            (min_lat, min_lng),
+            (min_lat, max_lng),
+            (max_lat, max_lng),
+            (max_lat, min_lng),
+        ),
+        resolution,
+    )
@@ -0,0 +1,389 @@
+import argparse
+import json
+import logging
+import signal
+import time
+
+import numpy as np
+
+from app.driver_position.producer import (BH_LAT_MAX, BH_LAT_MIN, BH_LON_MAX,
+                                          BH_LON_MIN, DRIVER_POSITION_STREAM)
+from app.event_encoding import (DRIVER_POSITION_EVENT, ENCODING_VERSION,
+                                EVENT_FIELD, ORDER_EVENT)
+from app.orders.producer import (BH_LAT_CENTER, BH_LON_CENTER, LAT_STDDEV,
+                                 ORDER_STREAM)
+from app.redis_client import redis_client
+from app.redis_producer import (STREAM_MAX_AGE, STREAM_MAXLEN,
+                                stream_trim_args)
+from app.stream_partitioning import (STREAM_PARTITIONS, get_partitions,
+                                     partition_stream_name)
+
+# Seconds of events generated (or replayed) per step.
+TICK = 0.1
+PIPELINE_CHUNK = 1000
+RATE_REPORT_INTERVAL = 10
+# Hours the local clock of the diurnal curves is ahead of UTC (Belo Horizonte).
+UTC_OFFSET_HOURS = -3
+DRIVER_FLEET_SIZE = 10000
+ORDER_VALUE_RANGE = (10.0, 500.0)
+
+EVENT_TYPES = {
+    "drivers": (DRIVER_POSITION_EVENT, DRIVER_POSITION_STREAM),
+    "orders": (ORDER_EVENT, ORDER_STREAM),
+}
+
+# Spatial mixtures per event type: ("box", weight, lat_min, lat_max, lon_min,
+# lon_max) and ("hotspot", weight, lat, lon, stddev) components.
+DEFAULT_LOCATIONS = {
+    "drivers": [("box", 1.0, BH_LAT_MIN, BH_LAT_MAX, BH_LON_MIN, BH_LON_MAX)],
+    "orders": [("hotspot", 1.0, BH_LAT_CENTER, BH_LON_CENTER, LAT_STDDEV)],
+}
+
+# Rate multipliers for each local hour, interpolated in between.
+DIURNAL_CURVES = {
+    "flat": [1.0] * 24,
+    "commute": [
+        0.2, 0.1, 0.1, 0.1, 0.2, 0.4, 0.8, 1.4, 1.8, 1.3, 1.0, 1.1,
+        1.3, 1.2, 1.0, 1.0, 1.2, 1.6, 1.9, 1.6, 1.2, 0.9, 0.6, 0.4,
+    ],
+}
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+shutdown_flag = False
+
+
+def signal_handler(sig, frame):
+    global shutdown_flag
+    logger.info("Shutdown signal received. Stopping load generator...")
+    shutdown_flag = True
+
+
+def diurnal_factor(curve, epoch_seconds):
+    """Multiplier of `curve` at a moment, linear between the hourly points."""
+    hour = (epoch_seconds / 3600 + UTC_OFFSET_HOURS) % 24
+    lower = int(hour)
+    weight = hour - lower
+    return curve[lower] * (1 - weight) + curve[(lower + 1) % 24] * weight
+
+
+def random_uuids(rng, size):
+    """Version 4 UUIDs as a (size, 16) uint8 array."""
+    uuids = rng.integers(0, 256, size=(size, 16), dtype=np.uint8)
+    uuids[:, 6] = (uuids[:, 6] & 0x0F) | 0x40
+    uuids[:, 8] = (uuids[:, 8] & 0x3F) | 0x80
+    return uuids
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        event_type,
+        rate,
+        seed=0,
+        locations=None,
+        curve=DIURNAL_CURVES["flat"],
+        fleet_size=DRIVER_FLEET_SIZE,
+    ):
+        """
+        Generates events as record arrays of the event type's EventCodec.
+
+        Everything is drawn from one seeded generator, so the same seed, rate,
+        curve and start time give the same events. The number of events in a
+        tick is Poisson with mean `rate` times the diurnal factor; locations
+        come from a weighted mixture of uniform boxes and Gaussian hotspots.
+        Drivers come from a fixed fleet of `fleet_size` ids, so positions
+        repeat per driver as they would in production.
+        """
+        self.event_type = event_type
+        self.codec, self.stream_name = EVENT_TYPES[event_type]
+        self.rate = rate
+        self.rng = np.random.default_rng(seed)
+        self.locations = locations or DEFAULT_LOCATIONS[event_type]
+        self.curve = curve
+        self.fleet = random_uuids(self.rng, fleet_size)
+
+    def sample_locations(self, size):
+        weights = np.array([component[1] for component in self.locations])
+        choices = self.rng.choice(
+            len(self.locations), size=size, p=weights / weights.sum()
+        )
+        latitudes = np.empty(size)
+        longitudes = np.empty(size)
+        for i, component in enumerate(self.locations):
+            mask = choices == i
+            count = int(mask.sum())
+            if component[0] == "box":
+                _, _, lat_min, lat_max, lon_min, lon_max = component
+                latitudes[mask] = self.rng.uniform(lat_min, lat_max, count)
+                longitudes[mask] = self.rng.uniform(lon_min, lon_max, count)
+            else:
+                _, _, lat, lon, stddev = component
+                latitudes[mask] = self.rng.normal(lat, stddev, count)
+                longitudes[mask] = self.rng.normal(lon, stddev, count)
+        return latitudes, longitudes
+
+    def generate(self, start_ms, end_ms):
+        """Events of the [start_ms, end_ms) interval, sorted by timestamp."""
+        factor = diurnal_factor(self.curve, start_ms / 1000)
+        size = self.rng.poisson(self.rate * factor * (end_ms - start_ms) / 1000)
+        records = self.codec.new_records(size)
+        records["latitude"], records["longitude"] = self.sample_locations(size)
+        records["timestamp"] = np.sort(self.rng.integers(start_ms, end_ms, size))
+        if self.event_type == "drivers":
+            records["driver_id"] = self.fleet[
+                self.rng.integers(0, len(self.fleet), size)
+            ]
+        else:
+            records["order_id"] = random_uuids(self.rng, size)
+            records["customer_id"] = random_uuids(self.rng, size)
+            records["order_value"] = self.rng.uniform(*ORDER_VALUE_RANGE, size)
+        return records
+
+
+class TraceWriter:
+    """
+    Appends record arrays to a trace file: one JSON header line with the event
+    type and encoding version, then the packed records back to back.
+    """
+
+    def __init__(self, path, event_type):
+        self.file = open(path, "wb")
+        header = {"event_type": event_type, "version": ENCODING_VERSION}
+        self.file.write(json.dumps(header).encode() + b"\n")
+
+    def write(self, records):
+        self.file.write(records.tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path):
+    """Event type and memory-mapped records of a trace file."""
+    with open(path, "rb") as trace:
+        header_line = trace.readline()
+    header = json.loads(header_line)
+    codec, _ = EVENT_TYPES[header["event_type"]]
+    records = np.memmap(
+        path,
+        dtype=codec.dtypes[header["version"]],
+        mode="r",
+        offset=len(header_line),
+    )
+    return header["event_type"], records
+
+
+class StreamSender:
+    def __init__(
+        self,
+        client,
+        stream_name,
+        codec,
+        num_partitions=STREAM_PARTITIONS,
+        maxlen=STREAM_MAXLEN,
+        max_age=STREAM_MAX_AGE,
+    ):
+        """XADDs record arrays in pipelined chunks and reports the achieved rate."""
+        self.client = client
+        self.stream_name = stream_name
+        self.codec = codec
+        self.num_partitions = num_partitions
+        self.maxlen = maxlen
+        self.max_age = max_age
+        self.report_started = time.monotonic()
+        self.reported = 0
+
+    def get_stream_names(self, records):
+        if self.num_partitions <= 1:
+            return [self.stream_name] * len(records)
+        partitions = get_partitions(
+            records["latitude"], records["longitude"], self.num_partitions
+        )
+        names = [
+            partition_stream_name(self.stream_name, partition)
+            for partition in range(self.num_partitions)
+        ]
+        return [names[partition] for partition in partitions.tolist()]
+
+    def send(self, records):
+        trim_args = stream_trim_args(self.maxlen, self.max_age)
+        for start in range(0, len(records), PIPELINE_CHUNK):
+            chunk = records[start : start + PIPELINE_CHUNK]
+            with self.client.pipeline(transaction=False) as pipe:
+                for stream_name, payload in zip(
+                    self.get_stream_names(chunk), self.codec.encode_records(chunk)
+                ):
+                    pipe.xadd(stream_name, {EVENT_FIELD: payload}, **trim_args)
+                pipe.execute()
+        self.report(len(records))
+
+    def report(self, sent):
+        self.reported += sent
+        now = time.monotonic()
+        if now - self.report_started >= RATE_REPORT_INTERVAL:
+            logger.info(
+                f"Sent {self.reported} events to {self.stream_name} at "
+                f"{self.reported / (now - self.report_started):.0f} events/s"
+            )
+            self.report_started = now
+            self.reported = 0
+
+
+def run_generator(generator, start_ms, duration, sender=None, trace=None):
+    """
+    Generate `duration` seconds of events (forever when None) from `start_ms`.
+    With a sender, ticks are paced against the wall clock; trace-only runs go
+    as fast as generation allows.
+    """
+    started = time.monotonic()
+    ticks = 0
+    tick_ms = int(TICK * 1000)
+    generated = 0
+    while not shutdown_flag and (duration is None or ticks * TICK < duration):
+        tick_start = start_ms + ticks * tick_ms
+        records = generator.generate(tick_start, tick_start + tick_ms)
+        if trace:
+            trace.write(records)
+        if sender:
+            sender.send(records)
+            delay = started + (ticks + 1) * TICK - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        generated += len(records)
+        ticks += 1
+    logger.info(f"Generated {generated} events in {time.monotonic() - started:.1f}s")
+
+
+def replay_trace(records, sender, speed=1.0, retime=True):
+    """
+    Send a trace at `speed` times its original pace. With `retime`, event
+    timestamps are moved to the replay clock, so the aggregators bucket them
+    as live traffic.
+    """
+    if len(records) == 0:
+        logger.info("The trace has no events to replay")
+        return
+    timestamps = records["timestamp"]
+    first_ms = int(timestamps[0])
+    started = time.monotonic()
+    started_ms = int(time.time() * 1000)
+    position = 0
+    while not shutdown_flag and position < len(records):
+        trace_ms = first_ms + (time.monotonic() - started) * 1000 * speed
+        end = int(np.searchsorted(timestamps, trace_ms, side="right"))
+        if end == position:
+            time.sleep(TICK)
+            continue
+
+        chunk = np.array(records[position:end])
+        if retime:
+            chunk["timestamp"] = started_ms + (chunk["timestamp"] - first_ms) / speed
+        sender.send(chunk)
+        position = end
+    logger.info(f"Replayed {position} events in {time.monotonic() - started:.1f}s")
+
+
+def parse_hotspot(value):
+    lat, lon, stddev, weight = (float(part) for part in value.split(","))
+    return ("hotspot", weight, lat, lon, stddev)
+
+
+def parse_curve(value):
+    if value in DIURNAL_CURVES:
+        return DIURNAL_CURVES[value]
+    curve = [float(part) for part in value.split(",")]
+    if len(curve) != 24:
+        raise argparse.ArgumentTypeError("a curve needs one value per hour")
+    return curve
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate, record and replay synthetic stream load."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="Generate seeded events.")
+    generate.add_argument("event_type", choices=list(EVENT_TYPES))
+    generate.add_argument("--rate", type=float, required=True, help="Events/s.")
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument(
+        "--curve",
+        type=parse_curve,
+        default=DIURNAL_CURVES["flat"],
+        help="A named curve (flat, commute) or 24 comma separated multipliers.",
+    )
+    generate.add_argument(
+        "--hotspot",
+        type=parse_hotspot,
+        action="append",
+        help="lat,lon,stddev,weight; replaces the default locations.",
+    )
+    generate.add_argument("--fleet-size", type=int, default=DRIVER_FLEET_SIZE)
+    generate.add_argument("--start", type=float, help="Start epoch seconds.")
+    generate.add_argument("--duration", type=float, help="Seconds of events.")
+    generate.add_argument("--record", help="Write the events to a trace file.")
+    generate.add_argument(
+        "--no-send", action="store_true", help="Only record, as fast as possible."
+    )
+
+    replay = subparsers.add_parser("replay", help="Replay a recorded trace.")
+    replay.add_argument("trace")
+    replay.add_argument("--speed", type=float, default=1.0)
+    replay.add_argument(
+        "--keep-timestamps",
+        action="store_true",
+        help="Send the recorded timestamps instead of moving them to now.",
+    )
+
+    for subparser in (generate, replay):
+        subparser.add_argument("--stream", help="Stream name override.")
+        subparser.add_argument("--partitions", type=int, default=STREAM_PARTITIONS)
+
+    args = parser.parse_args()
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    if args.command == "generate":
+        if args.no_send and (not args.record or args.duration is None):
+            parser.error("--no-send needs --record and --duration")
+        generator = LoadGenerator(
+            args.event_type,
+            args.rate,
+            seed=args.seed,
+            locations=args.hotspot,
+            curve=args.curve,
+            fleet_size=args.fleet_size,
+        )
+        start_ms = int((args.start if args.start is not None else time.time()) * 1000)
+        trace = TraceWriter(args.record, args.event_type) if args.record else None
+        try:
+            if args.no_send:
+                run_generator(generator, start_ms, args.duration, trace=trace)
+                return
+            with redis_client() as client:
+                sender = StreamSender(
+                    client,
+                    args.stream or generator.stream_name,
+                    generator.codec,
+                    args.partitions,
+                )
+                run_generator(generator, start_ms, args.duration, sender, trace)
+        finally:
+            if trace:
+                trace.close()
+        return
+
+    event_type, records = read_trace(args.trace)
+    codec, stream_name = EVENT_TYPES[event_type]
+    with redis_client() as client:
+        sender = StreamSender(client, args.stream or stream_name, codec, args.partitions)
+        replay_trace(records, sender, args.speed, retime=not args.keep_timestamps)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,28 @@
 import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import JSONResponse
 
 from app.dash_app import app_dash
+from app.data_aggregator_service import TooManyCellsError
+from app.dependencies import lifespan
 from app.driver_position.endpoints import \
     router as driver_position_count_router
+from app.orders.endpoints import router as order_count_router
+from app.surge_pricing.endpoints import router as surge_pricing_router
 
 # Set up logging
 logging.basicConfig()
 logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(TooManyCellsError)
+async def too_many_cells_handler(request: Request, exc: TooManyCellsError):
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
 
 
 @app.get("/")
@@ -26,4 +36,16 @@ app.include_router(
     tags=["driver_position_count"],
 )
 
+app.include_router(
+    order_count_router,
+    prefix="/api/order_count",
+    tags=["order_count"],
+)
+
+app.include_router(
+    surge_pricing_router,
+    prefix="/api/surge_pricing",
+    tags=["surge_pricing"],
+)
+
 app.mount("/dash", WSGIMiddleware(app_dash.server))
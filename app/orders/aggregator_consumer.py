@@ -1,7 +1,9 @@
 import logging
 import os
 
-from app.redis_aggregator import StreamAggregator
+from app.event_encoding import ORDER_EVENT
+from app.redis_aggregator import (CONSUMER_NAME, FINEST_RESOLUTION_ONLY,
+                                  StreamAggregator)
 from app.redis_client import redis_client
 
 ORDER_STREAM = os.getenv("ORDER_REDIS_STREAM", "order_stream")
@@ -9,6 +11,8 @@ ORDER_COUNT_KEY = "order_count_by_region"
 
 RESOLUTIONS = [7, 8, 9]
 CONSUMER_GROUP_NAME = "order_consumer_group"
+# Resolution the counts are stored at when only the finest one is written.
+STORED_RESOLUTION = max(RESOLUTIONS) if FINEST_RESOLUTION_ONLY else None
 
 
 logging.basicConfig(
@@ -17,14 +21,17 @@ logging.basicConfig(
 logger = logging.getLogger()
 
 
-def main():
+def main(consumer_name=CONSUMER_NAME, partitions=None):
     with redis_client() as client:
         aggregator = StreamAggregator(
             client,
             stream_name=ORDER_STREAM,
             consumer_group_name=CONSUMER_GROUP_NAME,
+            consumer_name=consumer_name,
+            partitions=partitions,
             resolutions=RESOLUTIONS,
             key_prefix=ORDER_COUNT_KEY,
+            event_codec=ORDER_EVENT,
         )
         aggregator.run()
 
@@ -1,17 +1,86 @@
-from fastapi import APIRouter, Query
+from typing import List
 
-from app.data_aggregator_service import REDIS_CLIENT
-from app.driver_position.schemas import DriverPositionsCountResponse
+from fastapi import APIRouter, Depends, Query, Request
+
+from app.dependencies import (HistoryRange, get_bbox_cell_ids, get_cell_ids,
+                              get_disk_cell_ids, get_history_range,
+                              get_order_aggregator, get_polygon_cell_ids,
+                              get_response_format)
+from app.driver_position.schemas import (CountHistoryResponse,
+                                         DriverPositionsCountResponse)
 from app.orders.service import OrderAggregator
+from app.responses import OBJECTS_FORMAT, columnar_response
 
 router = APIRouter()
 
 
 @router.get("/order_count", response_model=DriverPositionsCountResponse)
-def order_count(cell_resolution: int = Query(..., description="H3 cell resolution")):
-    """API endpoint to get the real-time driver count."""
+async def order_count(
+    request: Request,
+    cell_resolution: int = Query(..., description="H3 cell resolution"),
+    response_format: str = Depends(get_response_format),
+    orders_aggregator: OrderAggregator = Depends(get_order_aggregator),
+):
+    """API endpoint to get the real-time order count."""
+
+    if response_format == OBJECTS_FORMAT:
+        return await orders_aggregator.get_order_count_for_all_cells_async(
+            cell_resolution=cell_resolution
+        )
+    counts = await orders_aggregator.get_window_counts_async(cell_resolution)
+    return columnar_response(
+        request, counts, orders_aggregator.get_window_time_keys(), response_format
+    )
+
+
+@router.get("/order_counts_for_cells", response_model=DriverPositionsCountResponse)
+async def order_counts_for_cells(
+    cell_ids: List[str] = Depends(get_cell_ids),
+    orders_aggregator: OrderAggregator = Depends(get_order_aggregator),
+):
+    """API endpoint to get the order count of several cells (0 if absent)."""
+
+    return await orders_aggregator.get_order_counts_for_cells_async(cell_ids)
+
+
+@router.get("/order_counts_near", response_model=DriverPositionsCountResponse)
+async def order_counts_near(
+    cell_ids: List[str] = Depends(get_disk_cell_ids),
+    orders_aggregator: OrderAggregator = Depends(get_order_aggregator),
+):
+    """API endpoint to get the order count of the cells k rings around a point."""
+
+    return await orders_aggregator.get_order_counts_for_cells_async(cell_ids)
+
+
+@router.get("/order_counts_in_bbox", response_model=DriverPositionsCountResponse)
+async def order_counts_in_bbox(
+    cell_ids: List[str] = Depends(get_bbox_cell_ids),
+    orders_aggregator: OrderAggregator = Depends(get_order_aggregator),
+):
+    """API endpoint to get the order count of the cells in a bounding box."""
+
+    return await orders_aggregator.get_order_counts_for_cells_async(cell_ids)
+
+
+@router.post("/order_counts_in_polygon", response_model=DriverPositionsCountResponse)
+async def order_counts_in_polygon(
+    cell_ids: List[str] = Depends(get_polygon_cell_ids),
+    orders_aggregator: OrderAggregator = Depends(get_order_aggregator),
+):
+    """API endpoint to get the order count of the cells in a polygon."""
+
+    return await orders_aggregator.get_order_counts_for_cells_async(cell_ids)
+
+
+@router.get("/order_count_history", response_model=CountHistoryResponse)
+async def order_count_history(
+    cell_ids: List[str] = Depends(get_cell_ids),
+    history_range: HistoryRange = Depends(get_history_range),
+    orders_aggregator: OrderAggregator = Depends(get_order_aggregator),
+):
+    """API endpoint to get the order count of several cells per step over a range."""
 
-    orders_aggregator = OrderAggregator(REDIS_CLIENT)
-    return orders_aggregator.get_order_count_for_all_cells(
-        cell_resolution=cell_resolution
+    return await orders_aggregator.get_order_count_history_async(
+        cell_ids, *history_range
     )
@@ -2,7 +2,7 @@ import logging
 import os
 
 from app.redis_client import redis_client
-from app.redis_persist import StreamSave
+from app.redis_persist import CONSUMER_NAME, StreamSave
 
 ORDER_STREAM = os.getenv("ORDER_REDIS_STREAM", "order_stream")
 CONSUMER_GROUP_NAME = "order_persist_consumer_group"
@@ -14,12 +14,14 @@ logging.basicConfig(
 logger = logging.getLogger()
 
 
-def main():
+def main(consumer_name=CONSUMER_NAME, partitions=None):
     with redis_client() as client:
         saver = StreamSave(
             client,
             stream_name=ORDER_STREAM,
             consumer_group_name=CONSUMER_GROUP_NAME,
+            consumer_name=consumer_name,
+            partitions=partitions,
         )
         saver.run()
 
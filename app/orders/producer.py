@@ -7,6 +7,7 @@ from datetime import datetime
 
 from dotenv import load_dotenv
 
+from app.event_encoding import ORDER_EVENT
 from app.redis_client import redis_client
 from app.redis_producer import RedisProducer, signal_handler
 
@@ -40,12 +41,12 @@ def generate_order():
     order_id = uuid.uuid4()
     """Generate a order within Belo Horizonte's coordinates."""
     return {
-        "order_id": str(order_id),
-        "customer_id": str(uuid.uuid4()),
-        "order_value": f"{random.uniform(10.0, 500.0):.2f}",
-        "latitude": f"{random.gauss(BH_LAT_CENTER, LAT_STDDEV):.6f}",
-        "longitude": f"{random.gauss(BH_LON_CENTER, LON_STDDEV):.6f}",
-        "timestamp": datetime.utcnow().isoformat(),
+        "order_id": order_id,
+        "customer_id": uuid.uuid4(),
+        "order_value": random.uniform(10.0, 500.0),
+        "latitude": random.gauss(BH_LAT_CENTER, LAT_STDDEV),
+        "longitude": random.gauss(BH_LON_CENTER, LON_STDDEV),
+        "timestamp": datetime.utcnow(),
     }
 
 
@@ -61,6 +62,7 @@ if __name__ == "__main__":
             client=client,
             stream_name=ORDER_STREAM,
             generate_data_callback=generate_order,
+            event_codec=ORDER_EVENT,
         )
 
         order.produce()
@@ -1,4 +1,5 @@
 from app.data_aggregator_service import DataAggregator
+from app.orders.aggregator_consumer import ORDER_COUNT_KEY, STORED_RESOLUTION
 
 TIME_WINDOW_MINUTES = 5
 
@@ -7,8 +8,9 @@ class OrderAggregator(DataAggregator):
     def __init__(self, redis_client, time_window_minutes=TIME_WINDOW_MINUTES):
         super().__init__(
             redis_client,
-            key_prefix="order_count_by_region",
+            key_prefix=ORDER_COUNT_KEY,
             time_window_minutes=time_window_minutes,
+            stored_resolution=STORED_RESOLUTION,
         )
 
     def get_order_count_for_all_cells(self, cell_resolution: int):
@@ -17,3 +19,23 @@ class OrderAggregator(DataAggregator):
 
     def get_order_count_in_last_minute(self, cell_id: str):
         return self.get_count_in_last_minute(cell_id=cell_id)
+
+    def get_order_counts_for_cells(self, cell_ids):
+        return self.get_counts_for_cells(cell_ids)
+
+    async def get_order_counts_for_cells_async(self, cell_ids):
+        return await self.get_counts_for_cells_async(cell_ids)
+
+    def get_order_count_history(self, cell_ids, start, end, step_minutes=1):
+        return self.get_count_history(cell_ids, start, end, step_minutes)
+
+    async def get_order_count_history_async(
+        self, cell_ids, start, end, step_minutes=1
+    ):
+        return await self.get_count_history_async(cell_ids, start, end, step_minutes)
+
+    async def get_order_count_for_all_cells_async(self, cell_resolution: int):
+        return await self.get_aggregated_data_async(cell_resolution)
+
+    async def get_order_count_in_last_minute_async(self, cell_id: str):
+        return await self.get_count_in_last_minute_async(cell_id=cell_id)
@@ -1,14 +1,27 @@
 import logging
-import time
+import os
+from collections import Counter, defaultdict
 
 import h3
+import numpy as np
 
-from app.redis_processor import StreamProcessor
+from app.event_encoding import decode_events, minute_time_keys
+from app.h3_indexing import get_h3_cells_batch
+from app.redis_processor import BATCH_SIZE, CLAIM_INTERVAL, StreamProcessor
+from app.redis_scripts import ADD_TO_WINDOWS, ATOMIC_COUNT_AND_ACK
+from app.retention import get_retention
+from app.sliding_window import (SLIDING_WINDOWS, window_key,
+                                window_watermark_key)
 
-STREAM_READ_TIMEOUT = 2000
-SLEEP_INTERVAL = 0.1
-BATCH_SIZE = 10
-CLAIM_INTERVAL = 60
+CONSUMER_NAME = os.getenv("CONSUMER_NAME", "agg_consumer_1")
+BATCH_MODE = os.getenv("AGGREGATOR_BATCH_MODE", "false").lower() in ("1", "true")
+ATOMIC_MODE = os.getenv("AGGREGATOR_ATOMIC_MODE", "false").lower() in ("1", "true")
+DEDUP_TTL = int(os.getenv("AGGREGATOR_DEDUP_TTL", 60 * 60))
+# Store only the finest resolution; readers roll coarser ones up from it
+# (see DataAggregator's `stored_resolution`).
+FINEST_RESOLUTION_ONLY = os.getenv(
+    "AGGREGATOR_FINEST_RESOLUTION_ONLY", "false"
+).lower() in ("1", "true")
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -26,53 +39,309 @@ class StreamAggregator(StreamProcessor):
         key_prefix,
         batch_size=BATCH_SIZE,
         claim_interval=CLAIM_INTERVAL,
+        consumer_name=CONSUMER_NAME,
+        partitions=None,
+        batch_mode=BATCH_MODE,
+        atomic_mode=ATOMIC_MODE,
+        dedup_ttl=DEDUP_TTL,
+        distinct_field=None,
+        window_sizes=SLIDING_WINDOWS,
+        event_codec=None,
+        finest_resolution_only=FINEST_RESOLUTION_ONLY,
     ):
         super().__init__(
-            redis_client, stream_name, consumer_group_name, batch_size, claim_interval
+            redis_client,
+            stream_name,
+            consumer_group_name,
+            batch_size,
+            claim_interval,
+            consumer_name=consumer_name,
+            partitions=partitions,
         )
-        self.resolutions = resolutions
+        # Writing one resolution cuts the HINCRBYs (and the memory) per event
+        # by the number of resolutions, at the cost of rolling up on read.
+        self.resolutions = [max(resolutions)] if finest_resolution_only else resolutions
         self.key_prefix = key_prefix
+        # Minute buckets expire on their own; see app.retention for rollups.
+        self.bucket_ttls = {
+            res: get_retention(key_prefix, res)["1m"] for res in self.resolutions
+        }
+        self.batch_mode = batch_mode
+        self.atomic_mode = atomic_mode
+        self.dedup_ttl = dedup_ttl
+        self.distinct_field = distinct_field
+        self.window_sizes = window_sizes
+        # Layout of binary encoded entries; legacy entries are read either way.
+        self.event_codec = event_codec
+        if window_sizes and (atomic_mode or distinct_field):
+            raise ValueError(
+                "Sliding windows are not supported with atomic_mode or distinct_field"
+            )
+        self.count_and_ack_script = (
+            self.client.register_script(ATOMIC_COUNT_AND_ACK) if atomic_mode else None
+        )
 
     def get_h3_cells(self, latitude, longitude):
         return {
             res: h3.latlng_to_cell(latitude, longitude, res) for res in self.resolutions
         }
 
-    def update_count(self, h3_cells, timestamp):
-        time_key = timestamp[:16]
+    def get_resolution_key(self, time_key, res):
+        return f"{self.key_prefix}:{time_key}:{res}"
+
+    def get_distinct_index_key(self, time_key, res):
+        """Set of the cells that have a distinct-count HyperLogLog."""
+        return f"{self.key_prefix}:distinct:{time_key}:{res}"
+
+    def get_distinct_key(self, time_key, res, h3_cell):
+        return f"{self.get_distinct_index_key(time_key, res)}:{h3_cell}"
+
+    def add_to_windows(self, pipe, counts):
+        """
+        Queue the increments of `counts` (keyed by (time_key, res, h3_cell))
+        onto the rolling window totals of every configured window size.
+        """
+        if not self.window_sizes:
+            return
+
+        keys = []
+        pair_numbers = {}
+        args = []
+        for (time_key, res, h3_cell), count in counts.items():
+            for window_minutes in self.window_sizes:
+                if (window_minutes, res) not in pair_numbers:
+                    keys += [
+                        window_key(self.key_prefix, window_minutes, res),
+                        window_watermark_key(self.key_prefix, window_minutes, res),
+                    ]
+                    pair_numbers[(window_minutes, res)] = len(keys) // 2
+                args += [pair_numbers[(window_minutes, res)], time_key, h3_cell, count]
+
+        # EVAL rather than EVALSHA: a missing script inside MULTI would fail
+        # alone while the bucket increments still apply.
+        pipe.eval(ADD_TO_WINDOWS, len(keys), *keys, *args)
+
+    def update_count(self, h3_cells, time_key):
         with self.client.pipeline() as pipe:
             for res, h3_cell in h3_cells.items():
-                resolution_key = f"{self.key_prefix}:{time_key}:{res}"
-                logger.info(f"Resolution KEY {resolution_key}")
+                resolution_key = self.get_resolution_key(time_key, res)
+                logger.debug(f"Resolution KEY {resolution_key}")
                 pipe.hincrby(resolution_key, h3_cell, 1)
+                pipe.expire(resolution_key, self.bucket_ttls[res])
+            self.add_to_windows(
+                pipe,
+                {(time_key, res, h3_cell): 1 for res, h3_cell in h3_cells.items()},
+            )
             pipe.execute()
 
-    def consume_messages(self):
-        logger.info("Starting Aggregator...")
+    def index_batch(self, messages, extra_fields=()):
+        """
+        Decode a batch of stream entries and index them into H3 cells.
+
+        Returns the ids of the messages that decoded, their minute time keys, a
+        dict mapping each resolution to the cells of those messages, in the
+        same order, and the decoded columns (including `extra_fields`).
+        Messages that fail to decode are logged and left out, so they stay
+        pending instead of blocking the batch.
+        """
+        processed_ids, columns = decode_events(
+            messages,
+            ["latitude", "longitude", "timestamp", *extra_fields],
+            self.event_codec,
+        )
+        if not processed_ids:
+            return processed_ids, [], {}, columns
+
+        time_keys = minute_time_keys(columns["timestamp"])
+        h3_cells = get_h3_cells_batch(
+            columns["latitude"], columns["longitude"], self.resolutions
+        )
+        return processed_ids, time_keys, h3_cells, columns
+
+    def aggregate_batch(self, messages):
+        """
+        Fold a batch of stream entries into in-memory counts.
+
+        Returns a Counter keyed by (time_key, resolution, h3_cell) and the ids
+        of the messages that were counted.
+        """
+        processed_ids, time_keys, h3_cells, _ = self.index_batch(messages)
+
+        counts = Counter()
+        for res, cells in h3_cells.items():
+            counts.update(zip(time_keys, [res] * len(cells), cells))
+
+        return counts, processed_ids
+
+    def queue_counts(self, pipe, stream_name, counts, message_ids):
+        """
+        Queue the batch counts with one HINCRBY per key, a TTL refresh for
+        every bucket touched and a single XACK for the whole batch.
+        """
+        resolution_keys = {}
+        for (time_key, res, h3_cell), count in counts.items():
+            resolution_key = self.get_resolution_key(time_key, res)
+            pipe.hincrby(resolution_key, h3_cell, count)
+            resolution_keys[resolution_key] = res
+        for resolution_key, res in resolution_keys.items():
+            pipe.expire(resolution_key, self.bucket_ttls[res])
+        self.add_to_windows(pipe, counts)
+        if message_ids:
+            pipe.xack(stream_name, self.consumer_group_name, *message_ids)
+
+    def flush_counts(self, stream_name, counts, message_ids):
+        with self.client.pipeline() as pipe:
+            self.queue_counts(pipe, stream_name, counts, message_ids)
+            pipe.execute()
 
-        response = self.client.xreadgroup(
+    def process_batch(self, stream_name, messages):
+        counts, processed_ids = self.aggregate_batch(messages)
+        if not processed_ids:
+            return
+        try:
+            self.flush_counts(stream_name, counts, processed_ids)
+            logger.debug(
+                f"Flushed {len(counts)} counters for {len(processed_ids)} messages"
+            )
+        except Exception as e:
+            logger.error(f"Error flushing batch of {len(processed_ids)} messages: {e}")
+
+    def get_dedup_key(self, stream_name, message_id):
+        """Processed ids are bucketed by the minute of the stream id."""
+        bucket = int(message_id.split("-")[0]) // 60000
+        return f"{stream_name}:processed:{bucket}"
+
+    def build_atomic_call(self, stream_name, processed_ids, time_keys, h3_cells):
+        """Keys and args of ATOMIC_COUNT_AND_ACK for an indexed batch."""
+        keys = [stream_name]
+        key_indexes = {}
+
+        def key_index(key):
+            if key not in key_indexes:
+                keys.append(key)
+                key_indexes[key] = len(keys)  # Lua KEYS are 1-based
+            return key_indexes[key]
+
+        dedup_indexes = [
+            key_index(self.get_dedup_key(stream_name, message_id))
+            for message_id in processed_ids
+        ]
+        num_dedup_keys = len(key_indexes)
+
+        message_args = []
+        count_key_ttls = []
+        for i, message_id in enumerate(processed_ids):
+            message_args += [message_id, dedup_indexes[i]]
+            for res in self.resolutions:
+                resolution_key = self.get_resolution_key(time_keys[i], res)
+                if resolution_key not in key_indexes:
+                    count_key_ttls.append(self.bucket_ttls[res])
+                message_args += [key_index(resolution_key), h3_cells[res][i]]
+
+        args = [
             self.consumer_group_name,
-            "agg_consumer_1",
-            {self.stream_name: ">"},  # '>' means read only new messages
-            count=self.batch_size,
-            block=STREAM_READ_TIMEOUT,
+            self.dedup_ttl,
+            num_dedup_keys,
+            len(self.resolutions),
+            *count_key_ttls,
+            *message_args,
+        ]
+        return keys, args
+
+    def process_batch_atomic(self, stream_name, messages):
+        """
+        Count and ack a batch in one server-side script call. Ids are recorded
+        in a dedup set, so a batch redelivered after a crash is acked without
+        being counted twice.
+        """
+        processed_ids, time_keys, h3_cells, _ = self.index_batch(messages)
+        if not processed_ids:
+            return
+
+        keys, args = self.build_atomic_call(
+            stream_name, processed_ids, time_keys, h3_cells
         )
-        if response:
-            stream_name, messages = response[0]
-            logger.info(f"Processing {len(messages)} messages from {stream_name}")
-            for message_id, data in messages:
-                try:
-                    latitude = float(data["latitude"])
-                    longitude = float(data["longitude"])
-                    timestamp = data["timestamp"]
-                    h3_cells = self.get_h3_cells(latitude, longitude)
-                    self.update_count(h3_cells, timestamp)
-                    logger.debug(f"Updated counts for {h3_cells} at {timestamp}")
-                    self.client.xack(
-                        self.stream_name, self.consumer_group_name, message_id
-                    )
-                except Exception as e:
-                    logger.error(f"Error processing message {message_id}: {e}")
+        try:
+            counted = self.count_and_ack_script(keys=keys, args=args)
+            if counted < len(processed_ids):
+                logger.info(
+                    f"Skipped {len(processed_ids) - counted} already counted messages"
+                )
+        except Exception as e:
+            logger.error(f"Error flushing batch of {len(processed_ids)} messages: {e}")
+
+    def aggregate_distinct(self, messages):
+        """
+        Group the distinct `distinct_field` values of a batch by
+        (time_key, resolution, h3_cell). Returns the groups and the ids of the
+        messages that were indexed.
+        """
+        processed_ids, time_keys, h3_cells, columns = self.index_batch(
+            messages, extra_fields=[self.distinct_field]
+        )
+        values = columns[self.distinct_field]
+
+        members = defaultdict(set)
+        for res, cells in h3_cells.items():
+            for value, time_key, h3_cell in zip(values, time_keys, cells):
+                if value:
+                    members[(time_key, res, h3_cell)].add(value)
+
+        return members, processed_ids
+
+    def queue_distinct(self, pipe, stream_name, members, message_ids):
+        for (time_key, res, h3_cell), cell_members in members.items():
+            distinct_key = self.get_distinct_key(time_key, res, h3_cell)
+            index_key = self.get_distinct_index_key(time_key, res)
+            pipe.pfadd(distinct_key, *cell_members)
+            pipe.expire(distinct_key, self.bucket_ttls[res])
+            pipe.sadd(index_key, h3_cell)
+            pipe.expire(index_key, self.bucket_ttls[res])
+        pipe.xack(stream_name, self.consumer_group_name, *message_ids)
+
+    def process_batch_distinct(self, stream_name, messages):
+        """
+        Count distinct `distinct_field` values per (minute, resolution, cell)
+        with one HyperLogLog each, instead of counting every message. PFADD is
+        idempotent, so redelivered messages never inflate the counts.
+        """
+        members, processed_ids = self.aggregate_distinct(messages)
+        if not processed_ids:
+            return
+
+        try:
+            with self.client.pipeline() as pipe:
+                self.queue_distinct(pipe, stream_name, members, processed_ids)
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Error flushing batch of {len(processed_ids)} messages: {e}")
+
+    def process_message(self, stream_name, message_id, data):
+        try:
+            processed_ids, columns = decode_events(
+                [(message_id, data)],
+                ["latitude", "longitude", "timestamp"],
+                self.event_codec,
+            )
+            if not processed_ids:
+                return
+            time_key = minute_time_keys(columns["timestamp"])[0]
+            h3_cells = self.get_h3_cells(
+                float(columns["latitude"][0]), float(columns["longitude"][0])
+            )
+            self.update_count(h3_cells, time_key)
+            logger.debug(f"Updated counts for {h3_cells} at {time_key}")
+            self.client.xack(stream_name, self.consumer_group_name, message_id)
+        except Exception as e:
+            logger.error(f"Error processing message {message_id}: {e}")
+
+    def process_messages(self, stream_name, messages):
+        if self.distinct_field:
+            self.process_batch_distinct(stream_name, messages)
+        elif self.atomic_mode:
+            self.process_batch_atomic(stream_name, messages)
+        elif self.batch_mode:
+            self.process_batch(stream_name, messages)
         else:
-            logger.info("No new messages, sleeping...")
-            time.sleep(SLEEP_INTERVAL)
+            for message_id, data in messages:
+                self.process_message(stream_name, message_id, data)
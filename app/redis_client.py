@@ -4,10 +4,11 @@ import random
 import signal
 import time
 import uuid
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
 
 import redis
+import redis.asyncio
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -17,6 +18,7 @@ logger = logging.getLogger(__name__)
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
 
 
 @contextmanager
@@ -32,3 +34,41 @@ def redis_client():
     finally:
         logger.info("Closing Redis connection.")
         client.close()
+
+
+@asynccontextmanager
+async def async_redis_client(max_connections=REDIS_MAX_CONNECTIONS):
+    """Context manager for an asyncio Redis client backed by a connection pool."""
+    pool = redis.asyncio.ConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        decode_responses=True,
+        max_connections=max_connections,
+    )
+    client = redis.asyncio.Redis(connection_pool=pool)
+    try:
+        logger.info(f"Connecting to Redis at {REDIS_HOST}:{REDIS_PORT}")
+        yield client
+    except redis.ConnectionError as e:
+        logger.error(f"Failed to connect to Redis: {e}")
+        raise
+    finally:
+        logger.info("Closing Redis connection.")
+        await client.aclose()
+        await pool.aclose()
+
+
+def bytes_client(client):
+    """
+    A client with the settings of `client` (sync or asyncio) that returns raw
+    bytes, for reading binary stream payloads (see app.event_encoding). It
+    has its own connection pool.
+    """
+    pool = client.connection_pool
+    return client.__class__(
+        connection_pool=pool.__class__(
+            connection_class=pool.connection_class,
+            max_connections=pool.max_connections,
+            **{**pool.connection_kwargs, "decode_responses": False},
+        )
+    )
@@ -0,0 +1,130 @@
+import logging
+import os
+import time
+
+from app.event_encoding import decode_events
+from app.h3_indexing import get_h3_cells_batch
+from app.redis_processor import CLAIM_INTERVAL, StreamProcessor
+from app.redis_scripts import EXPIRE_LOCATIONS, UPDATE_LOCATIONS
+
+# Location updates are cheap to apply, so this consumer reads larger batches
+# than the aggregators.
+BATCH_SIZE = 100
+CONSUMER_NAME = os.getenv("CONSUMER_NAME", "location_consumer_1")
+LOCATION_TTL = int(os.getenv("LOCATION_TTL", 5 * 60))
+EXPIRE_INTERVAL = 10
+EXPIRE_BATCH_SIZE = 1000
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger()
+
+
+class StreamLocationIndex(StreamProcessor):
+    def __init__(
+        self,
+        redis_client,
+        stream_name,
+        consumer_group_name,
+        resolutions,
+        id_field,
+        location_key,
+        supply_key,
+        last_seen_key,
+        batch_size=BATCH_SIZE,
+        claim_interval=CLAIM_INTERVAL,
+        consumer_name=CONSUMER_NAME,
+        partitions=None,
+        location_ttl=LOCATION_TTL,
+        event_codec=None,
+    ):
+        """
+        Keeps the latest cell of every entity (e.g. driver) in the stream.
+
+        Args:
+            resolutions: H3 resolutions to index.
+            id_field: Message field identifying the entity.
+            location_key: Prefix of the `<prefix>:<res>` hashes of entity -> cell.
+            supply_key: Prefix of the `<prefix>:<res>` hashes of cell -> number
+                of entities currently in it.
+            last_seen_key: Sorted set of entity -> last seen epoch timestamp.
+            location_ttl: Seconds without events after which an entity is
+                removed from the index.
+            event_codec: Layout of binary encoded entries (see
+                app.event_encoding); legacy entries are read either way.
+        """
+        super().__init__(
+            redis_client,
+            stream_name,
+            consumer_group_name,
+            batch_size,
+            claim_interval,
+            consumer_name=consumer_name,
+            partitions=partitions,
+        )
+        self.resolutions = resolutions
+        self.id_field = id_field
+        self.location_key = location_key
+        self.supply_key = supply_key
+        self.last_seen_key = last_seen_key
+        self.location_ttl = location_ttl
+        self.event_codec = event_codec
+        self.last_expire_time = 0
+        self.update_script = self.client.register_script(UPDATE_LOCATIONS)
+        self.expire_script = self.client.register_script(EXPIRE_LOCATIONS)
+
+    def get_index_keys(self):
+        keys = [self.last_seen_key]
+        for res in self.resolutions:
+            keys += [f"{self.location_key}:{res}", f"{self.supply_key}:{res}"]
+        return keys
+
+    def process_messages(self, stream_name, messages):
+        processed_ids, columns = decode_events(
+            messages,
+            [self.id_field, "latitude", "longitude", "timestamp"],
+            self.event_codec,
+        )
+        if not processed_ids:
+            return
+
+        h3_cells = get_h3_cells_batch(
+            columns["latitude"], columns["longitude"], self.resolutions
+        )
+        timestamps = columns["timestamp"] / 1000
+        args = [len(self.resolutions)]
+        for i, entity_id in enumerate(columns[self.id_field]):
+            args += [entity_id, float(timestamps[i])]
+            args += [h3_cells[res][i] for res in self.resolutions]
+
+        try:
+            self.update_script(keys=self.get_index_keys(), args=args)
+            self.client.xack(stream_name, self.consumer_group_name, *processed_ids)
+        except Exception as e:
+            logger.error(f"Error updating {len(processed_ids)} locations: {e}")
+
+    def expire_stale_locations(self):
+        """Drop entities not seen for `location_ttl` seconds, in chunks."""
+        cutoff = time.time() - self.location_ttl
+        expired = 0
+        while True:
+            removed = self.expire_script(
+                keys=self.get_index_keys(),
+                args=[len(self.resolutions), cutoff, EXPIRE_BATCH_SIZE],
+            )
+            expired += removed
+            if removed < EXPIRE_BATCH_SIZE:
+                break
+
+        if expired:
+            logger.info(f"Expired {expired} stale locations")
+        return expired
+
+    def consume_messages(self):
+        current_time = time.time()
+        if current_time - self.last_expire_time >= EXPIRE_INTERVAL:
+            self.expire_stale_locations()
+            self.last_expire_time = current_time
+
+        super().consume_messages()
@@ -1,14 +1,11 @@
 import logging
-import time
+import os
 
 import h3
 
-from app.redis_processor import StreamProcessor
+from app.redis_processor import BATCH_SIZE, CLAIM_INTERVAL, StreamProcessor
 
-STREAM_READ_TIMEOUT = 2000
-SLEEP_INTERVAL = 0.1
-BATCH_SIZE = 10
-CLAIM_INTERVAL = 60
+CONSUMER_NAME = os.getenv("CONSUMER_NAME", "persist_consumer_1")
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -22,12 +19,20 @@ class StreamSave(StreamProcessor):
         redis_client,
         stream_name,
         consumer_group_name,
-        db_connection,
+        db_connection=None,
         batch_size=BATCH_SIZE,
         claim_interval=CLAIM_INTERVAL,
+        consumer_name=CONSUMER_NAME,
+        partitions=None,
     ):
         super().__init__(
-            redis_client, stream_name, consumer_group_name, batch_size, claim_interval
+            redis_client,
+            stream_name,
+            consumer_group_name,
+            batch_size,
+            claim_interval,
+            consumer_name=consumer_name,
+            partitions=partitions,
         )
         self.db_connection = db_connection  # Your DB connection here
 
@@ -38,28 +43,11 @@ class StreamSave(StreamProcessor):
         except Exception as e:
             logger.error(f"Error saving to database: {e}")
 
-    def consume_messages(self):
-        logger.info("Starting Saver...")
-
-        response = self.client.xreadgroup(
-            self.consumer_group_name,
-            "persist_consumer_1",
-            {self.stream_name: ">"},  # '>' means read only new messages
-            count=self.batch_size,
-            block=STREAM_READ_TIMEOUT,
-        )
-        if response:
-            stream_name, messages = response[0]
-            logger.info(f"Processing {len(messages)} messages from {stream_name}")
-            for message_id, data in messages:
-                try:
-                    # In this example, we're directly saving the data to DB
-                    self.save_to_db(data)
-                    self.client.xack(
-                        self.stream_name, self.consumer_group_name, message_id
-                    )
-                except Exception as e:
-                    logger.error(f"Error processing message {message_id}: {e}")
-        else:
-            logger.info("No new messages, sleeping...")
-            time.sleep(SLEEP_INTERVAL)
+    def process_messages(self, stream_name, messages):
+        for message_id, data in messages:
+            try:
+                # In this example, we're directly saving the data to DB
+                self.save_to_db(data)
+                self.client.xack(stream_name, self.consumer_group_name, message_id)
+            except Exception as e:
+                logger.error(f"Error processing message {message_id}: {e}")
@@ -1,15 +1,27 @@
 import logging
+import signal
+import threading
 import time
 
 import h3
 import redis
 
-from app.redis_client import redis_client
+from app.batch_control import (ADAPTIVE_BATCHING, LAG_CHECK_INTERVAL,
+                               AdaptiveBatchController)
+from app.event_encoding import decode_entries
+from app.redis_client import bytes_client, redis_client
+from app.stream_partitioning import get_partition_stream_names
 
+# Idle consumers wait inside the blocking XREADGROUP instead of sleeping.
 STREAM_READ_TIMEOUT = 2000
-SLEEP_INTERVAL = 0.1
 BATCH_SIZE = 10
 CLAIM_INTERVAL = 60
+CONSUMER_NAME = "consumer_1"
+CONSUMER_MAX_IDLE_TIME = 60 * 60 * 1000
+CLAIM_MIN_IDLE_TIME = 60000
+CLAIM_BATCH_SIZE = 100
+MAX_DELIVERIES = 5
+DEAD_LETTER_SUFFIX = ":dead_letter"
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -25,19 +37,39 @@ class StreamProcessor:
         consumer_group_name,
         batch_size=BATCH_SIZE,
         claim_interval=CLAIM_INTERVAL,
+        consumer_name=CONSUMER_NAME,
+        consumer_max_idle_time=CONSUMER_MAX_IDLE_TIME,
+        partitions=None,
+        claim_min_idle_time=CLAIM_MIN_IDLE_TIME,
+        claim_batch_size=CLAIM_BATCH_SIZE,
+        max_deliveries=MAX_DELIVERIES,
+        adaptive_batching=ADAPTIVE_BATCHING,
     ):
         self.client = redis_client
+        # Entries are read as bytes, so binary payloads arrive intact.
+        self.stream_client = bytes_client(redis_client)
         self.stream_name = stream_name
+        self.stream_names = get_partition_stream_names(stream_name, partitions)
         self.consumer_group_name = consumer_group_name
         self.batch_size = batch_size
         self.claim_interval = claim_interval
+        self.consumer_name = consumer_name
+        self.consumer_max_idle_time = consumer_max_idle_time
+        self.claim_min_idle_time = claim_min_idle_time
+        self.claim_batch_size = claim_batch_size
+        self.max_deliveries = max_deliveries
         self.last_claim_time = 0
+        self.last_lag_check_time = 0
+        self.running = False
+        self.batch_controller = (
+            AdaptiveBatchController(batch_size) if adaptive_batching else None
+        )
 
-    def create_consumer_group(self):
+    def create_consumer_group(self, stream_name):
         """Create the consumer group if it doesn't exist."""
         try:
             self.client.xgroup_create(
-                self.stream_name, self.consumer_group_name, id="0"
+                stream_name, self.consumer_group_name, id="0", mkstream=True
             )
             logger.info("Consumer group created successfully.")
         except redis.exceptions.ResponseError as e:
@@ -46,53 +78,257 @@ class StreamProcessor:
             else:
                 logger.error(f"Unexpected error creating consumer group: {e}")
 
-    def claim_unacknowledged_messages(
-        self, new_consumer="consumer_1", min_idle_time=60000
-    ):
-        try:
-            pending_info = self.client.xpending_range(
-                self.stream_name,
+    def dead_letter_stream_name(self, stream_name):
+        return f"{stream_name}{DEAD_LETTER_SUFFIX}"
+
+    def queue_dead_letter(self, pipe, stream_name, messages, deliveries):
+        """Queue moving poison messages to the dead-letter stream and acking them."""
+        dead_letter_stream = self.dead_letter_stream_name(stream_name)
+        for message_id, data in messages:
+            pipe.xadd(
+                dead_letter_stream,
+                {
+                    **data,
+                    "original_id": message_id,
+                    "consumer_group": self.consumer_group_name,
+                    "deliveries": deliveries[message_id],
+                },
+            )
+        pipe.xack(
+            stream_name,
+            self.consumer_group_name,
+            *[message_id for message_id, _ in messages],
+        )
+        logger.warning(
+            f"Moving {len(messages)} messages from {stream_name} "
+            f"to {dead_letter_stream}"
+        )
+
+    def dead_letter_messages(self, stream_name, messages, deliveries):
+        with self.client.pipeline() as pipe:
+            self.queue_dead_letter(pipe, stream_name, messages, deliveries)
+            pipe.execute()
+
+    def queue_pending_lookups(self, pipe, stream_name, messages):
+        """
+        Queue one XPENDING per claimed message, bounded to its own id. A
+        single range query over the page could be filled up by other entries
+        this consumer owns in between, leaving claimed ids without a row.
+        """
+        for message_id, _ in messages:
+            pipe.xpending_range(
+                stream_name,
                 self.consumer_group_name,
-                min="-",
-                max="+",
-                count=10,
-                consumer=None,
+                min=message_id,
+                max=message_id,
+                count=1,
             )
 
-            if pending_info:
-                logger.info(f"Claiming {len(pending_info)} pending messages...")
-                for msg in pending_info:
-                    message_id = msg["message_id"]
-                    reclaimed_messages = self.client.xclaim(
-                        self.stream_name,
-                        self.consumer_group_name,
-                        new_consumer,
-                        min_idle_time,
-                        message_id,
-                    )
-                    if reclaimed_messages:
-                        logger.info(f"Message {message_id} successfully claimed.")
-                    else:
-                        logger.warning(f"Failed to claim message {message_id}.")
+    def split_by_deliveries(self, messages, pending):
+        """
+        Split claimed messages into the ones to retry and the ones that were
+        already delivered more than `max_deliveries` times, given the replies
+        of `queue_pending_lookups`.
+        """
+        deliveries = {
+            msg["message_id"]: msg["times_delivered"]
+            for rows in pending
+            for msg in rows
+        }
+
+        retry, poison = [], []
+        for message_id, data in messages:
+            if deliveries.get(message_id, 0) > self.max_deliveries:
+                poison.append((message_id, data))
             else:
-                logger.info("No pending messages to claim.")
+                retry.append((message_id, data))
+        return retry, poison, deliveries
+
+    def recover_pending_messages(self, stream_name):
+        """
+        Claim entries idle in the group's PEL for longer than
+        `claim_min_idle_time` with XAUTOCLAIM and feed them back through
+        `process_messages`, paging with the returned cursor until the whole
+        PEL has been scanned.
+        """
+        start_id = "0-0"
+        recovered = 0
+        try:
+            while True:
+                start_id, messages, deleted_ids = self.stream_client.xautoclaim(
+                    stream_name,
+                    self.consumer_group_name,
+                    self.consumer_name,
+                    self.claim_min_idle_time,
+                    start_id=start_id,
+                    count=self.claim_batch_size,
+                )[:3]
+                start_id = start_id.decode()
+                messages = decode_entries(messages)
+                if deleted_ids:
+                    logger.warning(
+                        f"{len(deleted_ids)} pending messages of {stream_name} "
+                        "no longer exist in the stream"
+                    )
+
+                if messages:
+                    with self.client.pipeline(transaction=False) as pipe:
+                        self.queue_pending_lookups(pipe, stream_name, messages)
+                        pending = pipe.execute()
+                    retry, poison, deliveries = self.split_by_deliveries(
+                        messages, pending
+                    )
+                    if poison:
+                        self.dead_letter_messages(stream_name, poison, deliveries)
+                    if retry:
+                        self.process_messages(stream_name, retry)
+                    recovered += len(messages)
+
+                if start_id == "0-0":
+                    break
+        except redis.exceptions.ConnectionError:
+            raise
         except Exception as e:
-            logger.error(f"Error processing pending messages: {e}")
+            logger.error(f"Error recovering pending messages of {stream_name}: {e}")
 
-    def consume_messages(self):
-        """Base method to be overridden in subclasses to process messages."""
+        if recovered:
+            logger.info(f"Recovered {recovered} pending messages from {stream_name}")
+        return recovered
+
+    def select_idle_consumers(self, consumers, max_idle_time=None):
+        """
+        Names of the XINFO CONSUMERS entries, other than this consumer, idle
+        for at least `max_idle_time` milliseconds with no pending messages.
+        """
+        if max_idle_time is None:
+            max_idle_time = self.consumer_max_idle_time
+        return [
+            consumer["name"]
+            for consumer in consumers
+            if consumer["name"] != self.consumer_name
+            and consumer["pending"] == 0
+            and consumer["idle"] >= max_idle_time
+        ]
+
+    def delete_idle_consumers(self, stream_name, max_idle_time=None):
+        """
+        Retire consumers of the group that have been idle for longer than
+        `max_idle_time` milliseconds and hold no pending messages. Consumers
+        with pending messages are kept until their entries are claimed.
+        """
+        try:
+            consumers = self.client.xinfo_consumers(
+                stream_name, self.consumer_group_name
+            )
+        except redis.exceptions.ResponseError as e:
+            logger.error(f"Error listing consumers: {e}")
+            return []
+
+        deleted = self.select_idle_consumers(consumers, max_idle_time)
+        for name in deleted:
+            self.client.xgroup_delconsumer(stream_name, self.consumer_group_name, name)
+
+        if deleted:
+            logger.info(f"Deleted idle consumers of {stream_name}: {deleted}")
+        return deleted
+
+    def stop(self, *args):
+        """Ask the run loop to exit after the batch in progress."""
+        logger.info("Shutdown signal received. Stopping processor...")
+        self.running = False
+
+    def install_signal_handlers(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+    def read_messages(self):
+        """Read new messages from every stream this processor owns."""
+        response = self.stream_client.xreadgroup(
+            self.consumer_group_name,
+            self.consumer_name,
+            {name: ">" for name in self.stream_names},  # '>' means only new messages
+            count=self.batch_size,
+            block=STREAM_READ_TIMEOUT,
+        )
+        return self.decode_response(response)
+
+    def decode_response(self, response):
+        """(stream name, entries) pairs of an XREADGROUP reply, as strings."""
+        return [
+            (stream_name.decode(), decode_entries(messages))
+            for stream_name, messages in response or []
+        ]
+
+    def process_messages(self, stream_name, messages):
+        """
+        Base method to be overridden in subclasses to process a batch of
+        (message_id, data) entries read from `stream_name`. Used for both new
+        and reclaimed messages.
+        """
         raise NotImplementedError(
-            "consume_messages method must be implemented by subclasses."
+            "process_messages method must be implemented by subclasses."
         )
 
+    def get_consumer_lag(self):
+        """
+        Entries not yet delivered to the group, summed over the owned streams.
+        Redis reports no lag in some cases (e.g. after XDEL); those count as 0.
+        """
+        lag = 0
+        for stream_name in self.stream_names:
+            for group in self.client.xinfo_groups(stream_name):
+                if group["name"] == self.consumer_group_name:
+                    lag += group.get("lag") or 0
+        return lag
+
+    def record_batch(self, num_messages, latency):
+        if self.batch_controller:
+            self.batch_size = self.batch_controller.record_batch(num_messages, latency)
+
+    def update_lag(self):
+        current_time = time.time()
+        if not self.batch_controller:
+            return
+        if current_time - self.last_lag_check_time < LAG_CHECK_INTERVAL:
+            return
+        self.last_lag_check_time = current_time
+        try:
+            self.batch_controller.record_lag(self.get_consumer_lag())
+        except redis.exceptions.ResponseError as e:
+            logger.error(f"Error reading consumer lag: {e}")
+
+    def consume_messages(self):
+        """Read one batch from the owned streams and process it."""
+        self.update_lag()
+
+        response = self.read_messages()
+        if not response:
+            logger.debug("No new messages.")
+            return
+
+        started = time.monotonic()
+        num_messages = 0
+        for stream_name, messages in response:
+            logger.info(f"Processing {len(messages)} messages from {stream_name}")
+            self.process_messages(stream_name, messages)
+            num_messages += len(messages)
+        self.record_batch(num_messages, time.monotonic() - started)
+
     def run(self):
-        self.create_consumer_group()
+        for stream_name in self.stream_names:
+            self.create_consumer_group(stream_name)
+        self.install_signal_handlers()
+        self.running = True
+        logger.info(f"Consuming {self.stream_names} as {self.consumer_name}")
 
         try:
-            while True:
+            while self.running:
                 current_time = time.time()
                 if current_time - self.last_claim_time >= self.claim_interval:
-                    self.claim_unacknowledged_messages()
+                    for stream_name in self.stream_names:
+                        self.recover_pending_messages(stream_name)
+                        self.delete_idle_consumers(stream_name)
                     self.last_claim_time = current_time
 
                 self.consume_messages()
@@ -104,3 +340,6 @@ class StreamProcessor:
             logger.exception(f"Unexpected error: {e}")
         finally:
             logger.info("Shutting down.")
+            # The bytes client owns its pool; closing the client leaves it open.
+            self.stream_client.close()
+            self.stream_client.connection_pool.disconnect()
@@ -5,9 +5,28 @@ import time
 import redis
 from dotenv import load_dotenv
 
+from app.event_encoding import STREAM_ENCODING
+from app.stream_partitioning import (STREAM_PARTITIONS, get_partition,
+                                     partition_stream_name)
+
 load_dotenv()
 
 PRODUCE_INTERVAL = float(os.getenv("PRODUCE_INTERVAL", 1.0))
+# Target events per second. When set, events are sent in pipelined batches
+# instead of one every PRODUCE_INTERVAL.
+PRODUCE_RATE = float(os.getenv("PRODUCE_RATE", 0))
+PRODUCE_BATCH_SIZE = int(os.getenv("PRODUCE_BATCH_SIZE", 500))
+# Longest a generated event waits for its batch to fill up, in seconds.
+MAX_BATCH_DELAY = 0.1
+RATE_REPORT_INTERVAL = 10
+
+# Optional approximate trimming on every XADD, per (partition) stream. MINID
+# keeps the last STREAM_MAX_AGE seconds of events; MAXLEN the last
+# STREAM_MAXLEN entries; MINID wins if both are set. Neither looks at what
+# the consumer groups have acked, so both are off by default and streams are
+# trimmed by app.stream_trimmer instead.
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", 0))
+STREAM_MAX_AGE = int(os.getenv("STREAM_MAX_AGE", 0))
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -23,8 +42,29 @@ def signal_handler(sig, frame):
     shutdown_flag = True
 
 
+def stream_trim_args(maxlen=STREAM_MAXLEN, max_age=STREAM_MAX_AGE):
+    """XADD arguments of the configured approximate trimming."""
+    if max_age:
+        return {"minid": int((time.time() - max_age) * 1000), "approximate": True}
+    if maxlen:
+        return {"maxlen": maxlen, "approximate": True}
+    return {}
+
+
 class RedisProducer:
-    def __init__(self, client, stream_name, generate_data_callback):
+    def __init__(
+        self,
+        client,
+        stream_name,
+        generate_data_callback,
+        num_partitions=STREAM_PARTITIONS,
+        event_codec=None,
+        encoding=STREAM_ENCODING,
+        rate=PRODUCE_RATE,
+        batch_size=PRODUCE_BATCH_SIZE,
+        maxlen=STREAM_MAXLEN,
+        max_age=STREAM_MAX_AGE,
+    ):
         """
         A general Redis producer that sends data to a Redis stream.
 
@@ -32,24 +72,64 @@ class RedisProducer:
             client: Redis client instance.
             stream_name: The name of the Redis stream.
             generate_data_callback: A function that generates data for the stream.
+            num_partitions: When greater than 1, events are routed to
+                `<stream_name>:<partition>` by their coarse H3 cell.
+            event_codec: EventCodec used to encode the generated events;
+                without one they are written as they are.
+            encoding: "binary" or "legacy" stream layout.
+            rate: Target events per second; 0 sends one event every
+                PRODUCE_INTERVAL seconds.
+            batch_size: Most events sent per pipeline at the target rate.
+            maxlen: Approximate MAXLEN trim of each stream, 0 to disable.
+            max_age: Seconds of events kept with an approximate MINID trim,
+                0 to disable. Takes precedence over `maxlen`.
         """
         self.client = client
         self.stream_name = stream_name
         self.generate_data_callback = generate_data_callback
+        self.num_partitions = num_partitions
+        self.event_codec = event_codec
+        self.encoding = encoding
+        self.rate = rate
+        # Small batches at low rates, so events are not held back for long.
+        self.batch_size = max(1, min(batch_size, int(rate * MAX_BATCH_DELAY)))
+        self.maxlen = maxlen
+        self.max_age = max_age
+
+    def encode(self, data):
+        if self.event_codec is None:
+            return data
+        return self.event_codec.encode_fields(data, self.encoding)
+
+    def get_stream_name(self, data):
+        if self.num_partitions <= 1:
+            return self.stream_name
+        partition = get_partition(
+            float(data["latitude"]), float(data["longitude"]), self.num_partitions
+        )
+        return partition_stream_name(self.stream_name, partition)
+
+    def send_batch(self, events):
+        trim_args = stream_trim_args(self.maxlen, self.max_age)
+        with self.client.pipeline(transaction=False) as pipe:
+            for data in events:
+                pipe.xadd(self.get_stream_name(data), self.encode(data), **trim_args)
+            pipe.execute()
 
     def produce(self):
         """Continuously produce data and send it to the Redis stream."""
+        if self.rate:
+            self.produce_at_rate()
+            return
+
         global shutdown_flag
         try:
             while not shutdown_flag:
                 data = self.generate_data_callback()
+                stream_name = self.get_stream_name(data)
                 try:
-                    with self.client.pipeline() as pipe:
-                        # Add data to the stream
-                        pipe.xadd(self.stream_name, data)
-                        pipe.execute()
-
-                    logger.info(f"Data sent to {self.stream_name}: {data}")
+                    self.send_batch([data])
+                    logger.debug(f"Data sent to {stream_name}: {data}")
 
                 except redis.RedisError as e:
                     logger.error(f"Failed to send data to Redis: {e}")
@@ -61,3 +141,54 @@ class RedisProducer:
             logger.exception(f"Unexpected error in producer: {e}")
         finally:
             logger.info("Producer stopped.")
+
+    def produce_at_rate(self):
+        """
+        Send `rate` events per second in pipelined batches of `batch_size`.
+        Batches are paced against a fixed schedule, so a slow batch is made
+        up by the next ones; the achieved rate is logged periodically.
+        """
+        global shutdown_flag
+        logger.info(
+            f"Producing {self.rate:g} events/s to {self.stream_name} "
+            f"in batches of {self.batch_size}"
+        )
+        started = time.monotonic()
+        scheduled = 0
+        report_started = started
+        reported = 0
+        try:
+            while not shutdown_flag:
+                events = [
+                    self.generate_data_callback() for _ in range(self.batch_size)
+                ]
+                try:
+                    self.send_batch(events)
+                    scheduled += len(events)
+                    reported += len(events)
+                except redis.RedisError as e:
+                    logger.error(f"Failed to send data to Redis: {e}")
+                    time.sleep(PRODUCE_INTERVAL * 2)  # Backoff before retrying
+                    # Do not burst to catch up on what was lost while failing.
+                    started = time.monotonic()
+                    scheduled = 0
+                    continue
+
+                now = time.monotonic()
+                if now - report_started >= RATE_REPORT_INTERVAL:
+                    logger.info(
+                        f"Sent {reported} events to {self.stream_name} at "
+                        f"{reported / (now - report_started):.0f} events/s "
+                        f"(target {self.rate:g})"
+                    )
+                    report_started = now
+                    reported = 0
+
+                delay = started + scheduled / self.rate - now
+                if delay > 0:
+                    time.sleep(delay)
+
+        except Exception as e:
+            logger.exception(f"Unexpected error in producer: {e}")
+        finally:
+            logger.info("Producer stopped.")
@@ -0,0 +1,202 @@
+# Server-side Lua scripts shared by the stream processors. Register them with
+# `client.register_script(...)`, which runs them through EVALSHA and reloads
+# them transparently after a script cache flush.
+
+# Count a batch of aggregated messages and ack it in one atomic call,
+# skipping messages whose ids were already recorded as processed.
+#
+# KEYS: stream, dedup set keys..., count hash keys...
+# ARGV: group, dedup TTL (seconds), number of dedup keys, resolutions per
+#       message, one TTL per count hash key, then per message: id, dedup key
+#       index, and one (count key index, cell) pair per resolution. Indexes
+#       point into KEYS.
+#
+# Returns the number of messages that were counted (not duplicates).
+ATOMIC_COUNT_AND_ACK = """
+local group = ARGV[1]
+local ttl = tonumber(ARGV[2])
+local num_dedup_keys = tonumber(ARGV[3])
+local num_resolutions = tonumber(ARGV[4])
+local first_count_key = num_dedup_keys + 2
+local num_count_keys = #KEYS - first_count_key + 1
+local counted = 0
+
+local i = 5 + num_count_keys
+while i <= #ARGV do
+    local message_id = ARGV[i]
+    local dedup_key = KEYS[tonumber(ARGV[i + 1])]
+    if redis.call('SADD', dedup_key, message_id) == 1 then
+        for j = 0, num_resolutions - 1 do
+            local key = KEYS[tonumber(ARGV[i + 2 + 2 * j])]
+            redis.call('HINCRBY', key, ARGV[i + 3 + 2 * j], 1)
+        end
+        counted = counted + 1
+    end
+    redis.call('XACK', KEYS[1], group, message_id)
+    i = i + 2 + 2 * num_resolutions
+end
+
+for k = 2, num_dedup_keys + 1 do
+    redis.call('EXPIRE', KEYS[k], ttl)
+end
+for k = first_count_key, #KEYS do
+    redis.call('EXPIRE', KEYS[k], tonumber(ARGV[5 + k - first_count_key]))
+end
+
+return counted
+"""
+
+# Move drivers between cells in the live location index. Events older than
+# the driver's last seen timestamp are ignored, so out-of-order and
+# redelivered events are harmless.
+#
+# KEYS: last seen sorted set, then per resolution: location hash
+#       (driver -> cell) and supply hash (cell -> driver count).
+# ARGV: resolutions per event, then per event: driver id, epoch timestamp,
+#       and one cell per resolution, in the same order as KEYS.
+#
+# Returns the number of events applied.
+UPDATE_LOCATIONS = """
+local num_resolutions = tonumber(ARGV[1])
+local applied = 0
+
+local i = 2
+while i <= #ARGV do
+    local driver = ARGV[i]
+    local timestamp = tonumber(ARGV[i + 1])
+    local last_seen = redis.call('ZSCORE', KEYS[1], driver)
+    if not last_seen or tonumber(last_seen) <= timestamp then
+        redis.call('ZADD', KEYS[1], timestamp, driver)
+        for j = 0, num_resolutions - 1 do
+            local locations = KEYS[2 + 2 * j]
+            local supply = KEYS[3 + 2 * j]
+            local cell = ARGV[i + 2 + j]
+            local previous = redis.call('HGET', locations, driver)
+            if previous ~= cell then
+                if previous then
+                    if redis.call('HINCRBY', supply, previous, -1) <= 0 then
+                        redis.call('HDEL', supply, previous)
+                    end
+                end
+                redis.call('HSET', locations, driver, cell)
+                redis.call('HINCRBY', supply, cell, 1)
+            end
+        end
+        applied = applied + 1
+    end
+    i = i + 2 + num_resolutions
+end
+
+return applied
+"""
+
+# Remove drivers not seen since a cutoff from the live location index.
+#
+# KEYS: same layout as UPDATE_LOCATIONS.
+# ARGV: resolutions, cutoff epoch timestamp, max drivers to remove.
+#
+# Returns the number of drivers removed.
+EXPIRE_LOCATIONS = """
+local num_resolutions = tonumber(ARGV[1])
+local stale = redis.call(
+    'ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[2], 'LIMIT', 0, tonumber(ARGV[3])
+)
+
+for _, driver in ipairs(stale) do
+    for j = 0, num_resolutions - 1 do
+        local locations = KEYS[2 + 2 * j]
+        local supply = KEYS[3 + 2 * j]
+        local previous = redis.call('HGET', locations, driver)
+        if previous then
+            if redis.call('HINCRBY', supply, previous, -1) <= 0 then
+                redis.call('HDEL', supply, previous)
+            end
+            redis.call('HDEL', locations, driver)
+        end
+    end
+    redis.call('ZREM', KEYS[1], driver)
+end
+
+return #stale
+"""
+
+# Add minute bucket increments to rolling window totals, unless the bucket
+# already left the window. A window's watermark is the time key of the last
+# minute subtracted from it (see ADVANCE_WINDOW).
+#
+# KEYS: (window hash, watermark) pairs.
+# ARGV: per increment: pair number (1-based), time key, cell, count.
+ADD_TO_WINDOWS = """
+local watermarks = {}
+for p = 1, #KEYS / 2 do
+    watermarks[p] = redis.call('GET', KEYS[2 * p]) or ''
+end
+
+local i = 1
+while i <= #ARGV do
+    local p = tonumber(ARGV[i])
+    if ARGV[i + 1] > watermarks[p] then
+        redis.call('HINCRBY', KEYS[2 * p - 1], ARGV[i + 2], ARGV[i + 3])
+    end
+    i = i + 4
+end
+"""
+
+# Subtract a minute bucket that left the window from the window totals.
+# Does nothing if the watermark is already at or past the bucket.
+#
+# KEYS: window hash, watermark, minute bucket.
+# ARGV: time key of the minute bucket.
+ADVANCE_WINDOW = """
+local watermark = redis.call('GET', KEYS[2]) or ''
+if watermark >= ARGV[1] then
+    return 0
+end
+
+local bucket = redis.call('HGETALL', KEYS[3])
+for i = 1, #bucket, 2 do
+    if redis.call('HINCRBY', KEYS[1], bucket[i], -tonumber(bucket[i + 1])) <= 0 then
+        redis.call('HDEL', KEYS[1], bucket[i])
+    end
+end
+redis.call('SET', KEYS[2], ARGV[1])
+return 1
+"""
+
+# Recompute window totals from the minute buckets inside the window.
+#
+# KEYS: window hash, watermark, minute buckets...
+# ARGV: time key of the last minute before the window.
+REBUILD_WINDOW = """
+local totals = {}
+for k = 3, #KEYS do
+    local bucket = redis.call('HGETALL', KEYS[k])
+    for i = 1, #bucket, 2 do
+        totals[bucket[i]] = (totals[bucket[i]] or 0) + tonumber(bucket[i + 1])
+    end
+end
+
+redis.call('DEL', KEYS[1])
+for cell, count in pairs(totals) do
+    redis.call('HSET', KEYS[1], cell, count)
+end
+redis.call('SET', KEYS[2], ARGV[1])
+"""
+
+# Mark an unchanged surge table as fresh: set its computed-at field and
+# extend its TTL, but only if the table still exists. A table that expired
+# or was deleted has to be rebuilt in full instead of being recreated with
+# the computed-at field alone.
+#
+# KEYS: surge table hash.
+# ARGV: computed-at field, computed-at timestamp, TTL (seconds).
+#
+# Returns 1 if the table was refreshed, 0 if it does not exist.
+TOUCH_SURGE_TABLE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return 1
+"""
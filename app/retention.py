@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import signal
+import time
+from datetime import datetime, timedelta
+
+from app.redis_client import redis_client
+
+TIME_KEY_FORMAT = "%Y-%m-%dT%H:%M"
+
+# Seconds each bucket granularity is kept for. Minute buckets must outlive
+# the rollup delay, so they are compacted before they expire.
+DEFAULT_RETENTION = {
+    "1m": 2 * 60 * 60,
+    "15m": 7 * 24 * 60 * 60,
+    "1h": 30 * 24 * 60 * 60,
+}
+
+# Per prefix and per resolution overrides, e.g.
+# RETENTION_CONFIG='{"driver_count_by_region": {"9": {"1m": 3600}}}'
+RETENTION_CONFIG = json.loads(os.getenv("RETENTION_CONFIG", "{}"))
+
+# The granularity each rollup granularity is summed from.
+ROLLUP_SOURCES = {"15m": "1m", "1h": "15m"}
+
+ROLLUP_PREFIXES = ["driver_count_by_region", "order_count_by_region"]
+ROLLUP_RESOLUTIONS = [7, 8, 9]
+# Minutes a period is left open for late events before it is rolled up.
+ROLLUP_GRACE_MINUTES = 2
+COMPACT_INTERVAL = 60
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def check_retention(retention):
+    """
+    Raise ValueError if a source bucket could expire before the period it
+    belongs to is rolled up: that takes the period length, the grace time
+    and up to one compaction interval.
+    """
+    for granularity, source in ROLLUP_SOURCES.items():
+        period = RollupCompactor.GRANULARITIES[granularity].total_seconds()
+        required = int(period) + ROLLUP_GRACE_MINUTES * 60 + COMPACT_INTERVAL
+        if retention[source] < required:
+            raise ValueError(
+                f"{source} retention of {retention[source]}s is shorter than "
+                f"the {required}s needed to roll it up into {granularity}"
+            )
+
+
+def get_retention(key_prefix, resolution):
+    """TTLs in seconds per granularity for a prefix and resolution."""
+    overrides = RETENTION_CONFIG.get(key_prefix, {}).get(str(resolution), {})
+    retention = {**DEFAULT_RETENTION, **overrides}
+    check_retention(retention)
+    return retention
+
+
+def rollup_key(key_prefix, granularity, period_start, resolution):
+    return (
+        f"{key_prefix}:{granularity}:"
+        f"{period_start.strftime(TIME_KEY_FORMAT)}:{resolution}"
+    )
+
+
+def rollup_watermark_key(key_prefix, granularity, resolution):
+    """Start of the last period compacted into `granularity` buckets."""
+    return f"{key_prefix}:rollup:{granularity}:{resolution}"
+
+
+class RollupCompactor:
+    GRANULARITIES = {"15m": timedelta(minutes=15), "1h": timedelta(hours=1)}
+
+    def __init__(self, redis_client, key_prefixes, resolutions):
+        """
+        Sums minute buckets (`<prefix>:<minute>:<res>`) into 15-minute buckets
+        (`<prefix>:15m:<start>:<res>`) before the minute buckets expire, and
+        the 15-minute buckets into hourly ones (`<prefix>:1h:<start>:<res>`).
+
+        Each rolled up period is overwritten as a whole, so running the
+        compactor twice, or on several hosts, gives the same result. The last
+        compacted period is tracked in `<prefix>:rollup:<granularity>:<res>`.
+        """
+        self.client = redis_client
+        self.key_prefixes = key_prefixes
+        self.resolutions = resolutions
+        self.shutdown_flag = False
+
+    def _first_period(self, key_prefix, granularity, resolution, now):
+        watermark = self.client.get(
+            rollup_watermark_key(key_prefix, granularity, resolution)
+        )
+        if watermark:
+            last_period = datetime.strptime(watermark, TIME_KEY_FORMAT)
+            return last_period + self.GRANULARITIES[granularity]
+
+        # Nothing compacted yet: start at the oldest minute that may still exist.
+        minute_ttl = get_retention(key_prefix, resolution)["1m"]
+        return self._period_start(now - timedelta(seconds=minute_ttl), granularity)
+
+    def _period_start(self, moment, granularity):
+        if granularity == "1h":
+            return moment.replace(minute=0, second=0, microsecond=0)
+        return moment.replace(
+            minute=moment.minute - moment.minute % 15, second=0, microsecond=0
+        )
+
+    def _source_keys(self, key_prefix, granularity, period_start, resolution):
+        if granularity == "1h":
+            return [
+                rollup_key(
+                    key_prefix,
+                    "15m",
+                    period_start + timedelta(minutes=15 * i),
+                    resolution,
+                )
+                for i in range(4)
+            ]
+        return [
+            f"{key_prefix}:"
+            f"{(period_start + timedelta(minutes=i)).strftime(TIME_KEY_FORMAT)}:"
+            f"{resolution}"
+            for i in range(15)
+        ]
+
+    def compact_period(self, key_prefix, granularity, period_start, resolution):
+        source_keys = self._source_keys(
+            key_prefix, granularity, period_start, resolution
+        )
+        with self.client.pipeline() as pipe:
+            for source_key in source_keys:
+                pipe.hgetall(source_key)
+            buckets = pipe.execute()
+
+        totals = {}
+        for bucket in buckets:
+            for region, count in bucket.items():
+                totals[region] = totals.get(region, 0) + int(count)
+
+        key = rollup_key(key_prefix, granularity, period_start, resolution)
+        ttl = get_retention(key_prefix, resolution)[granularity]
+        with self.client.pipeline() as pipe:
+            pipe.delete(key)
+            if totals:
+                pipe.hset(key, mapping=totals)
+                pipe.expire(key, ttl)
+            pipe.set(
+                rollup_watermark_key(key_prefix, granularity, resolution),
+                period_start.strftime(TIME_KEY_FORMAT),
+            )
+            pipe.execute()
+
+    def compact(self, now=None):
+        """Roll up every period that closed more than the grace time ago."""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(minutes=ROLLUP_GRACE_MINUTES)
+        compacted = 0
+        for key_prefix in self.key_prefixes:
+            for resolution in self.resolutions:
+                for granularity, length in self.GRANULARITIES.items():
+                    period_start = self._first_period(
+                        key_prefix, granularity, resolution, now
+                    )
+                    while period_start + length <= cutoff and not self.shutdown_flag:
+                        self.compact_period(
+                            key_prefix, granularity, period_start, resolution
+                        )
+                        period_start += length
+                        compacted += 1
+
+        if compacted:
+            logger.info(f"Compacted {compacted} rollup periods")
+        return compacted
+
+    def stop(self, *args):
+        logger.info("Shutdown signal received. Stopping compactor...")
+        self.shutdown_flag = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        while not self.shutdown_flag:
+            try:
+                self.compact()
+            except Exception as e:
+                logger.exception(f"Error compacting rollups: {e}")
+            for _ in range(COMPACT_INTERVAL):
+                if self.shutdown_flag:
+                    break
+                time.sleep(1)
+        logger.info("Compactor stopped.")
+
+
+def main():
+    with redis_client() as client:
+        RollupCompactor(client, ROLLUP_PREFIXES, ROLLUP_RESOLUTIONS).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import logging
+import os
+import signal
+import time
+from datetime import datetime, timedelta
+
+from app.redis_client import redis_client
+from app.redis_scripts import ADVANCE_WINDOW, REBUILD_WINDOW
+
+TIME_KEY_FORMAT = "%Y-%m-%dT%H:%M"
+
+# Window lengths, in minutes, kept as incrementally maintained totals.
+# Windows must be shorter than the minute bucket TTL (see app.retention).
+SLIDING_WINDOWS = [
+    int(minutes) for minutes in os.getenv("SLIDING_WINDOWS", "").split(",") if minutes
+]
+WINDOW_PREFIXES = ["driver_count_by_region", "order_count_by_region"]
+WINDOW_RESOLUTIONS = [7, 8, 9]
+ADVANCE_INTERVAL = 1
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def window_key(key_prefix, window_minutes, resolution):
+    return f"{key_prefix}:window:{window_minutes}:{resolution}"
+
+
+def window_watermark_key(key_prefix, window_minutes, resolution):
+    """Time key of the last minute bucket subtracted from the window."""
+    return f"{window_key(key_prefix, window_minutes, resolution)}:retired"
+
+
+def window_start_watermark(now, window_minutes):
+    """Watermark of an up to date window: the minute just before it."""
+    return (now - timedelta(minutes=window_minutes)).strftime(TIME_KEY_FORMAT)
+
+
+class SlidingWindowMaintainer:
+    def __init__(self, redis_client, key_prefixes, resolutions, window_sizes):
+        """
+        Subtracts minute buckets from the rolling window totals as they leave
+        the window. Aggregators add to the totals as they count (see
+        StreamAggregator's `window_sizes`), so a window read is one HGETALL.
+
+        Every step is an idempotent script keyed on the window's watermark,
+        so several maintainers can run side by side.
+        """
+        self.client = redis_client
+        self.key_prefixes = key_prefixes
+        self.resolutions = resolutions
+        self.window_sizes = window_sizes
+        self.advance_script = self.client.register_script(ADVANCE_WINDOW)
+        self.rebuild_script = self.client.register_script(REBUILD_WINDOW)
+        self.shutdown_flag = False
+
+    def rebuild(self, key_prefix, window_minutes, resolution, now):
+        bucket_keys = [
+            f"{key_prefix}:"
+            f"{(now - timedelta(minutes=i)).strftime(TIME_KEY_FORMAT)}:{resolution}"
+            for i in range(window_minutes)
+        ]
+        self.rebuild_script(
+            keys=[
+                window_key(key_prefix, window_minutes, resolution),
+                window_watermark_key(key_prefix, window_minutes, resolution),
+                *bucket_keys,
+            ],
+            args=[window_start_watermark(now, window_minutes)],
+        )
+        logger.info(
+            f"Rebuilt {window_minutes} minute window of {key_prefix} at {resolution}"
+        )
+
+    def advance(self, key_prefix, window_minutes, resolution, now):
+        """Retire every minute bucket that left the window since the last call."""
+        target = window_start_watermark(now, window_minutes)
+        watermark = self.client.get(
+            window_watermark_key(key_prefix, window_minutes, resolution)
+        )
+        if watermark == target:
+            return
+
+        oldest = window_start_watermark(now, 2 * window_minutes)
+        if not watermark or watermark < oldest:
+            # Never built, or too far behind for the buckets to be trusted.
+            self.rebuild(key_prefix, window_minutes, resolution, now)
+            return
+
+        minute = datetime.strptime(watermark, TIME_KEY_FORMAT)
+        while minute.strftime(TIME_KEY_FORMAT) < target:
+            minute += timedelta(minutes=1)
+            time_key = minute.strftime(TIME_KEY_FORMAT)
+            self.advance_script(
+                keys=[
+                    window_key(key_prefix, window_minutes, resolution),
+                    window_watermark_key(key_prefix, window_minutes, resolution),
+                    f"{key_prefix}:{time_key}:{resolution}",
+                ],
+                args=[time_key],
+            )
+
+    def advance_all(self, now=None):
+        now = now or datetime.utcnow()
+        for key_prefix in self.key_prefixes:
+            for resolution in self.resolutions:
+                for window_minutes in self.window_sizes:
+                    self.advance(key_prefix, window_minutes, resolution, now)
+
+    def stop(self, *args):
+        logger.info("Shutdown signal received. Stopping window maintainer...")
+        self.shutdown_flag = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        while not self.shutdown_flag:
+            try:
+                self.advance_all()
+            except Exception as e:
+                logger.exception(f"Error advancing sliding windows: {e}")
+            time.sleep(ADVANCE_INTERVAL)
+        logger.info("Window maintainer stopped.")
+
+
+def main():
+    with redis_client() as client:
+        SlidingWindowMaintainer(
+            client, WINDOW_PREFIXES, WINDOW_RESOLUTIONS, SLIDING_WINDOWS
+        ).run()
+
+
+if __name__ == "__main__":
+    main()
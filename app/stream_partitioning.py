@@ -0,0 +1,70 @@
+import os
+import zlib
+
+import h3
+import numpy as np
+
+from app.h3_indexing import cells_to_str, latlng_to_cells
+
+# With more than one partition, events go to `<stream>:<partition>` instead of
+# `<stream>`. The partition is a hash of the event's coarse H3 cell, so every
+# event of a cell lands in the same sub-stream and keeps its relative order.
+STREAM_PARTITIONS = int(os.getenv("STREAM_PARTITIONS", 1))
+PARTITION_RESOLUTION = int(os.getenv("STREAM_PARTITION_RESOLUTION", 6))
+
+
+def partition_stream_name(stream_name, partition):
+    return f"{stream_name}:{partition}"
+
+
+def get_partition(
+    latitude,
+    longitude,
+    num_partitions=STREAM_PARTITIONS,
+    resolution=PARTITION_RESOLUTION,
+):
+    """Map a coordinate to a partition through its coarse H3 cell."""
+    cell = h3.latlng_to_cell(latitude, longitude, resolution)
+    # crc32 rather than hash() so every process agrees on the partition.
+    return zlib.crc32(cell.encode()) % num_partitions
+
+
+def get_partitions(
+    latitudes,
+    longitudes,
+    num_partitions=STREAM_PARTITIONS,
+    resolution=PARTITION_RESOLUTION,
+):
+    """Vectorized get_partition, hashing each distinct coarse cell once."""
+    cells, inverse = np.unique(
+        latlng_to_cells(latitudes, longitudes, resolution), return_inverse=True
+    )
+    partitions = np.array(
+        [zlib.crc32(cell.encode()) % num_partitions for cell in cells_to_str(cells)],
+        dtype=np.int64,
+    )
+    return partitions[inverse.ravel()]
+
+
+def get_partition_stream_names(
+    stream_name, partitions=None, num_partitions=STREAM_PARTITIONS
+):
+    """
+    Stream keys a consumer should read. Without partitioning this is just
+    `stream_name`; otherwise it is one key per partition in `partitions`
+    (all of them when `partitions` is None).
+    """
+    if num_partitions <= 1:
+        return [stream_name]
+    if partitions is None:
+        partitions = range(num_partitions)
+    return [partition_stream_name(stream_name, partition) for partition in partitions]
+
+
+def assign_partitions(worker_index, num_workers, num_partitions=STREAM_PARTITIONS):
+    """Round-robin the partitions over the workers of a pool."""
+    return [
+        partition
+        for partition in range(num_partitions)
+        if partition % num_workers == worker_index
+    ]
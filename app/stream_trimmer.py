@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import signal
+import time
+
+import redis
+
+from app.driver_position import aggregator_consumer as driver_aggregator
+from app.driver_position import location_index_consumer as location_index
+from app.orders import aggregator_consumer as order_aggregator
+from app.redis_client import redis_client
+from app.stream_partitioning import get_partition_stream_names
+
+# Consumer groups that must exist before a stream is trimmed, so entries are
+# never dropped ahead of a group that has not been created yet. Any other
+# group on the stream is taken into account as well. The defaults are the
+# aggregator and location index groups that compose.yaml runs; deployments
+# running the persist consumers should add their groups, e.g.
+# TRIM_REQUIRED_GROUPS='{"order_stream": ["order_consumer_group",
+#                                         "order_persist_consumer_group"]}'.
+DEFAULT_REQUIRED_GROUPS = {
+    driver_aggregator.DRIVER_POSITION_STREAM: [
+        driver_aggregator.CONSUMER_GROUP_NAME,
+        location_index.CONSUMER_GROUP_NAME,
+    ],
+    order_aggregator.ORDER_STREAM: [order_aggregator.CONSUMER_GROUP_NAME],
+}
+TRIM_REQUIRED_GROUPS = json.loads(
+    os.getenv("TRIM_REQUIRED_GROUPS", "null")
+) or DEFAULT_REQUIRED_GROUPS
+TRIM_INTERVAL = int(os.getenv("TRIM_INTERVAL", 30))
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_stream_id(stream_id):
+    milliseconds, sequence = stream_id.split("-")
+    return int(milliseconds), int(sequence)
+
+
+def next_stream_id(stream_id):
+    milliseconds, sequence = parse_stream_id(stream_id)
+    return f"{milliseconds}-{sequence + 1}"
+
+
+class StreamTrimmer:
+    def __init__(self, redis_client, required_groups=TRIM_REQUIRED_GROUPS):
+        """
+        Trims streams up to the oldest entry some consumer group still needs.
+
+        For every group, that is its oldest pending entry (delivered but not
+        acked) or, with nothing pending, the entry after its last delivered
+        id. XTRIM MINID drops everything older than the lowest of these marks,
+        so only entries every group has acked are removed. Groups only move
+        forward, so a mark read before trimming stays safe when applied.
+
+        Args:
+            required_groups: Mapping of stream to the groups that must exist
+                before it is trimmed. Partitions of a stream are trimmed
+                separately, each with its own marks.
+        """
+        self.client = redis_client
+        self.required_groups = required_groups
+        self.shutdown_flag = False
+
+    def get_low_water_mark(self, stream_name, required_groups):
+        """Lowest id still needed on the stream, or None if it must not be trimmed."""
+        try:
+            groups = self.client.xinfo_groups(stream_name)
+        except redis.exceptions.ResponseError:
+            # The stream does not exist (yet).
+            return None
+
+        names = {group["name"] for group in groups}
+        missing = set(required_groups) - names
+        if missing:
+            logger.debug(f"Not trimming {stream_name}: missing groups {missing}")
+            return None
+        if not groups:
+            return None
+
+        marks = []
+        for group in groups:
+            if group["pending"]:
+                summary = self.client.xpending(stream_name, group["name"])
+                marks.append(summary["min"])
+            else:
+                marks.append(next_stream_id(group["last-delivered-id"]))
+        return min(marks, key=parse_stream_id)
+
+    def trim_stream(self, stream_name, required_groups):
+        low_water_mark = self.get_low_water_mark(stream_name, required_groups)
+        if low_water_mark is None:
+            return 0
+
+        # Approximate trimming only removes whole macro nodes, which is much
+        # cheaper; the few entries it keeps go with the next pass.
+        trimmed = self.client.xtrim(
+            stream_name, minid=low_water_mark, approximate=True
+        )
+        if trimmed:
+            logger.info(
+                f"Trimmed {trimmed} entries from {stream_name} "
+                f"below {low_water_mark}"
+            )
+        return trimmed
+
+    def trim(self):
+        trimmed = 0
+        for stream, required_groups in self.required_groups.items():
+            for stream_name in get_partition_stream_names(stream):
+                try:
+                    trimmed += self.trim_stream(stream_name, required_groups)
+                except redis.exceptions.ResponseError as e:
+                    logger.error(f"Error trimming {stream_name}: {e}")
+        return trimmed
+
+    def stop(self, *args):
+        logger.info("Shutdown signal received. Stopping stream trimmer...")
+        self.shutdown_flag = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        while not self.shutdown_flag:
+            try:
+                self.trim()
+            except Exception as e:
+                logger.exception(f"Error trimming streams: {e}")
+            for _ in range(TRIM_INTERVAL):
+                if self.shutdown_flag:
+                    break
+                time.sleep(1)
+        logger.info("Stream trimmer stopped.")
+
+
+def main():
+    with redis_client() as client:
+        StreamTrimmer(client).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import h3
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.dependencies import get_surge_table
+from app.surge_pricing.schemas import SurgePrice, SurgePricesResponse
+from app.surge_pricing.service import SurgeTable
+
+router = APIRouter()
+
+
+def raise_surge_unavailable(cell_resolution):
+    raise HTTPException(
+        status_code=503,
+        detail=f"No surge prices materialized at resolution {cell_resolution}",
+    )
+
+
+@router.get("/surge_prices", response_model=SurgePricesResponse)
+async def surge_prices(
+    cell_resolution: int = Query(..., description="H3 cell resolution"),
+    surge_table: SurgeTable = Depends(get_surge_table),
+):
+    """API endpoint to get the materialized surge price of every cell."""
+
+    surge_prices = await surge_table.get_surge_prices_async(cell_resolution)
+    if surge_prices.version is None:
+        raise_surge_unavailable(cell_resolution)
+    return surge_prices
+
+
+@router.get("/surge_price_for_cell", response_model=SurgePrice)
+async def surge_price_for_cell(
+    cell_id: str = Query(..., description="H3 cell id"),
+    surge_table: SurgeTable = Depends(get_surge_table),
+):
+    """API endpoint to get the materialized surge price of a cell."""
+
+    if not h3.is_valid_cell(cell_id):
+        raise HTTPException(status_code=422, detail=f"Invalid H3 cell: {cell_id}")
+    surge_price = await surge_table.get_surge_price_async(cell_id)
+    if surge_price.version is None:
+        raise_surge_unavailable(h3.get_resolution(cell_id))
+    return surge_price
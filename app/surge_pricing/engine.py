@@ -0,0 +1,155 @@
+import json
+import os
+from itertools import repeat
+
+import numpy as np
+
+from app.h3_indexing import cells_to_parent
+
+# Tiers are [min ratio, multiplier] pairs: a cell whose orders / drivers
+# ratio reaches `min ratio` gets that multiplier, and 1 below the first tier.
+DEFAULT_TIERS = [[1, 1.2], [2, 1.5], [3, 2]]
+# Tier tables per city and per resolution, with "default" fallbacks at both
+# levels, e.g.
+# SURGE_TIER_TABLES='{"default": {"default": [[1, 1.2], [2, 1.5], [3, 2]]},
+#                     "bh": {"9": [[1.5, 1.3], [3, 1.8]]}}'
+SURGE_TIER_TABLES = json.loads(os.getenv("SURGE_TIER_TABLES", "{}"))
+# H3 cells (any resolution) covering each city, e.g.
+# SURGE_CITIES='{"bh": ["85a88cd7fffffff"]}'. Cells outside every city use
+# the "default" tier tables.
+SURGE_CITIES = json.loads(os.getenv("SURGE_CITIES", "{}"))
+
+
+class TierTable:
+    def __init__(self, tiers):
+        tiers = sorted(tiers)
+        self.thresholds = np.array([ratio for ratio, _ in tiers], dtype=np.float64)
+        self.multipliers = np.array(
+            [1.0] + [multiplier for _, multiplier in tiers], dtype=np.float64
+        )
+
+    def apply(self, ratios):
+        """Multiplier of each ratio: the last tier it reaches."""
+        return self.multipliers[
+            np.searchsorted(self.thresholds, ratios, side="right")
+        ]
+
+
+class SurgeEngine:
+    def __init__(self, tier_tables=SURGE_TIER_TABLES, cities=SURGE_CITIES):
+        """
+        Prices batches of cells at once. Order and driver counts come in as
+        arrays aligned on the same cells; the ratios are computed in one
+        division and mapped to multipliers with a `searchsorted` over the
+        tier thresholds, one call per (city, resolution) group of cells.
+
+        As before, cells without orders, and cells with orders but no
+        drivers, get a multiplier of 1.
+        """
+        self.cities = list(cities)
+        # City -> resolution -> parent cells, to match cells by ancestry.
+        self.city_cells = []
+        for city in self.cities:
+            by_resolution = {}
+            for cell in cities[city]:
+                by_resolution.setdefault(int(cell[1], 16), []).append(int(cell, 16))
+            self.city_cells.append(
+                {
+                    res: np.array(parents, dtype=np.uint64)
+                    for res, parents in by_resolution.items()
+                }
+            )
+        self.tier_tables = {
+            city: {res: TierTable(tiers) for res, tiers in tables.items()}
+            for city, tables in tier_tables.items()
+        }
+        self.default_tier_table = TierTable(DEFAULT_TIERS)
+
+    def get_tier_table(self, city, resolution):
+        for name in (city, "default"):
+            tables = self.tier_tables.get(name, {})
+            for key in (str(resolution), "default"):
+                if key in tables:
+                    return tables[key]
+        return self.default_tier_table
+
+    def _group_tier_table(self, group_key):
+        city, resolution = divmod(int(group_key), 16)
+        return self.get_tier_table(
+            self.cities[city - 1] if city else "default", resolution
+        )
+
+    def _cities_of(self, cell_ids, resolutions):
+        """Index into `self.cities` of each cell's city, -1 outside all of them."""
+        city_index = np.full(len(cell_ids), -1)
+        if not self.cities:
+            return city_index
+        cells = np.array([int(cell, 16) for cell in cell_ids], dtype=np.uint64)
+        for i, city_cells in enumerate(self.city_cells):
+            for res, parents in city_cells.items():
+                candidates = np.flatnonzero((city_index == -1) & (resolutions >= res))
+                if len(candidates):
+                    matches = np.isin(cells_to_parent(cells[candidates], res), parents)
+                    city_index[candidates[matches]] = i
+        return city_index
+
+    def multipliers(self, cell_ids, order_counts, driver_counts, resolution=None):
+        """
+        Surge multiplier of each cell, given arrays of its order and driver
+        counts. `resolution` saves reading it from every cell id when they
+        all share one.
+        """
+        order_counts = np.asarray(order_counts, dtype=np.float64)
+        driver_counts = np.asarray(driver_counts, dtype=np.float64)
+        ratios = np.divide(
+            order_counts,
+            driver_counts,
+            out=np.zeros(len(order_counts)),
+            where=driver_counts > 0,
+        )
+
+        if resolution is not None:
+            resolutions = np.full(len(cell_ids), resolution)
+        else:
+            # The resolution is the second hex digit of an H3 cell id.
+            resolutions = np.fromiter(
+                (int(cell[1], 16) for cell in cell_ids), dtype=np.int64
+            )
+        city_index = self._cities_of(cell_ids, resolutions)
+
+        # One group per (city, resolution); cells outside cities are city 0.
+        group_keys = (city_index + 1) * 16 + resolutions
+        groups = np.unique(group_keys)
+        if len(groups) == 1:
+            multipliers = self._group_tier_table(groups[0]).apply(ratios)
+        else:
+            multipliers = np.ones(len(ratios))
+            for group in groups.tolist():
+                members = group_keys == group
+                multipliers[members] = self._group_tier_table(group).apply(
+                    ratios[members]
+                )
+        multipliers[order_counts == 0] = 1
+        return multipliers
+
+    def align_counts(self, order_counts, driver_counts, cell_ids=None):
+        """
+        Order and driver count arrays over a shared cell index: `cell_ids`,
+        or the cells with orders. Missing cells count 0.
+        """
+        cell_ids = list(order_counts) if cell_ids is None else list(cell_ids)
+        # map(dict.get, keys, repeat(0)) keeps the lookups out of Python code.
+        orders = np.fromiter(
+            map(order_counts.get, cell_ids, repeat(0)),
+            dtype=np.float64,
+            count=len(cell_ids),
+        )
+        drivers = np.fromiter(
+            map(driver_counts.get, cell_ids, repeat(0)),
+            dtype=np.float64,
+            count=len(cell_ids),
+        )
+        return cell_ids, orders, drivers
+
+
+SURGE_ENGINE = SurgeEngine()
@@ -0,0 +1,139 @@
+import logging
+import os
+import signal
+import time
+
+from app.driver_position.service import DriverPositionAggregator
+from app.orders.service import OrderAggregator
+from app.redis_client import redis_client
+from app.redis_scripts import TOUCH_SURGE_TABLE
+from app.surge_pricing.service import (COMPUTED_AT_FIELD, SURGE_BASE_PRICE,
+                                       VERSION_FIELD, SurgePricingCalculator,
+                                       surge_key)
+
+SURGE_RESOLUTIONS = [7, 8, 9]
+SURGE_WINDOW_MINUTES = int(os.getenv("SURGE_WINDOW_MINUTES", 1))
+# Seconds between recomputations; at most one minute, so every minute tick
+# is picked up.
+SURGE_REFRESH_INTERVAL = min(float(os.getenv("SURGE_REFRESH_INTERVAL", 5)), 60)
+# Tables disappear this many seconds after the last refresh, so readers answer
+# 503 rather than serve a stale surge.
+SURGE_TTL = int(os.getenv("SURGE_TTL", 5 * 60))
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class SurgeMaterializer:
+    def __init__(
+        self,
+        redis_client,
+        resolutions=SURGE_RESOLUTIONS,
+        window_minutes=SURGE_WINDOW_MINUTES,
+        refresh_interval=SURGE_REFRESH_INTERVAL,
+        ttl=SURGE_TTL,
+    ):
+        """
+        Keeps a `surge_multiplier:<res>` hash of cell -> multiplier per
+        resolution, for app.surge_pricing.service.SurgeTable to read.
+
+        Every `refresh_interval` seconds the order and driver windows are
+        merged once per resolution. When the multipliers changed, the table
+        is rebuilt under a temporary key and renamed over the live one in a
+        MULTI/EXEC, with a new version from `surge_multiplier:<res>:version`;
+        readers see either the old or the new table, never a mix. Otherwise
+        only the computed-at field and the TTL are refreshed, in a script that
+        falls back to a full rebuild if the table has expired meanwhile.
+        """
+        self.client = redis_client
+        self.resolutions = resolutions
+        self.refresh_interval = refresh_interval
+        self.ttl = ttl
+        self.calculator = SurgePricingCalculator(
+            base_price=SURGE_BASE_PRICE,
+            driver_position_aggregator=DriverPositionAggregator(
+                redis_client, time_window_minutes=window_minutes
+            ),
+            order_aggregator=OrderAggregator(
+                redis_client, time_window_minutes=window_minutes
+            ),
+        )
+        self.touch_script = self.client.register_script(TOUCH_SURGE_TABLE)
+        self.multipliers = {}
+        self.shutdown_flag = False
+
+    def _version_key(self, cell_resolution):
+        return f"{surge_key(cell_resolution)}:version"
+
+    def materialize(self, cell_resolution):
+        """Recompute one resolution; returns the new version, or None if unchanged."""
+        multipliers = self.calculator.calculate_multipliers_for_all_cells(
+            cell_resolution
+        )
+        key = surge_key(cell_resolution)
+        computed_at = time.time()
+
+        unchanged = multipliers == self.multipliers.get(cell_resolution)
+        if unchanged and self.touch_script(
+            keys=[key], args=[COMPUTED_AT_FIELD, computed_at, self.ttl]
+        ):
+            return None
+
+        version = self.client.incr(self._version_key(cell_resolution))
+        building_key = f"{key}:building"
+        with self.client.pipeline() as pipe:
+            pipe.delete(building_key)
+            pipe.hset(
+                building_key,
+                mapping={
+                    **multipliers,
+                    VERSION_FIELD: version,
+                    COMPUTED_AT_FIELD: computed_at,
+                },
+            )
+            pipe.expire(building_key, self.ttl)
+            pipe.rename(building_key, key)
+            pipe.execute()
+
+        self.multipliers[cell_resolution] = multipliers
+        logger.info(
+            f"Materialized surge v{version} for {len(multipliers)} cells "
+            f"at resolution {cell_resolution}"
+        )
+        return version
+
+    def refresh(self):
+        for cell_resolution in self.resolutions:
+            self.materialize(cell_resolution)
+
+    def stop(self, *args):
+        logger.info("Shutdown signal received. Stopping surge materializer...")
+        self.shutdown_flag = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        while not self.shutdown_flag:
+            started = time.time()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.exception(f"Error materializing surge: {e}")
+            # Wake up on the refresh interval and on every minute boundary.
+            next_refresh = min(
+                started + self.refresh_interval, (started // 60 + 1) * 60
+            )
+            while not self.shutdown_flag and time.time() < next_refresh:
+                time.sleep(min(1, max(next_refresh - time.time(), 0)))
+        logger.info("Surge materializer stopped.")
+
+
+def main():
+    with redis_client() as client:
+        SurgeMaterializer(client).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+
+class SurgePrice(BaseModel):
+    region: str
+    surge_price: float
+    # Version and epoch time of the materialized table, None without one.
+    version: Optional[int]
+    computed_at: Optional[float]
+
+
+class SurgePricesResponse(BaseModel):
+    version: Optional[int]
+    computed_at: Optional[float]
+    surge_prices: Dict[str, float]
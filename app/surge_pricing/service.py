@@ -1,59 +1,144 @@
+import os
+from datetime import datetime
+
+import h3
+
+from app.surge_pricing.engine import SURGE_ENGINE
+from app.surge_pricing.schemas import SurgePrice, SurgePricesResponse
+
+SURGE_BASE_PRICE = float(os.getenv("SURGE_BASE_PRICE", 1))
+
+# Materialized multipliers live in `<prefix>:<res>` hashes of cell ->
+# multiplier, next to the version and computed-at fields below, so one
+# HGETALL (or HMGET of a cell) returns a consistent table.
+SURGE_KEY = "surge_multiplier"
+VERSION_FIELD = "_version"
+COMPUTED_AT_FIELD = "_computed_at"
+
+
+def surge_key(cell_resolution):
+    return f"{SURGE_KEY}:{cell_resolution}"
+
+
 class SurgePricingCalculator:
-    def __init__(self, base_price, driver_position_aggregator, order_aggregator):
+    def __init__(
+        self,
+        base_price,
+        driver_position_aggregator,
+        order_aggregator,
+        engine=SURGE_ENGINE,
+    ):
         self.base_price = base_price
         self.driver_position_aggregator = driver_position_aggregator
         self.order_aggregator = order_aggregator
+        self.engine = engine
 
-    def _calculate_surge_for_cell(self, order_count, driver_count):
-        """Helper method to calculate surge price for a single cell."""
-        if order_count == 0:
-            return self.base_price
-
-        ratio = order_count / driver_count if driver_count else 0
-
-        if ratio < 1:
-            surge_multiplier = 1
-        elif ratio < 2:
-            surge_multiplier = 1.2
-        elif ratio < 3:
-            surge_multiplier = 1.5
-        else:
-            surge_multiplier = 2
-
-        return self.base_price * surge_multiplier
+    def _multipliers(self, order_counts, driver_counts, cell_ids=None, resolution=None):
+        cell_ids, orders, drivers = self.engine.align_counts(
+            order_counts, driver_counts, cell_ids
+        )
+        multipliers = self.engine.multipliers(cell_ids, orders, drivers, resolution)
+        return dict(zip(cell_ids, multipliers.tolist()))
 
-    def calculate_surge_for_all_cells(self, cell_resolution):
-        """Calculate surge pricing for all cells given a resolution."""
-        order_counts = self.order_aggregator.get_order_count_for_all_cells(
+    def calculate_multipliers_for_all_cells(self, cell_resolution):
+        """Surge multiplier of every cell with orders in the window."""
+        order_counts = self.order_aggregator.get_window_counts(cell_resolution)
+        driver_counts = self.driver_position_aggregator.get_window_counts(
             cell_resolution
         )
-        driver_counts = self.driver_position_aggregator.get_driver_count_for_all_cells(
-            cell_resolution
+        return self._multipliers(
+            order_counts, driver_counts, resolution=cell_resolution
         )
 
-        order_counts = {
-            data.region: data.count for data in order_counts.driver_position_counts
+    def calculate_surge_for_all_cells(self, cell_resolution):
+        """Calculate surge pricing for all cells given a resolution."""
+        return {
+            h3_cell_id: self.base_price * multiplier
+            for h3_cell_id, multiplier in self.calculate_multipliers_for_all_cells(
+                cell_resolution
+            ).items()
+        }
+
+    def calculate_surge_for_cells(self, cell_ids, time_keys=None):
+        """
+        Surge price of each cell in `cell_ids` (any mix of resolutions) over
+        the aggregators' window, or `time_keys`.
+        """
+        order_counts = self.order_aggregator.get_cell_counts(cell_ids, time_keys)
+        driver_counts = self.driver_position_aggregator.get_cell_counts(
+            cell_ids, time_keys
+        )
+        return {
+            h3_cell_id: self.base_price * multiplier
+            for h3_cell_id, multiplier in self._multipliers(
+                order_counts, driver_counts, cell_ids=dict.fromkeys(cell_ids)
+            ).items()
         }
 
-        driver_counts = {
-            data.region: data.count for data in driver_counts.driver_position_counts
+    def calculate_surge(self, h3_cell_id):
+        """Calculate surge pricing based on driver and order count."""
+        time_keys = [datetime.utcnow().strftime("%Y-%m-%dT%H:%M")]
+        return self.calculate_surge_for_cells([h3_cell_id], time_keys)[h3_cell_id]
+
+
+class SurgeTable:
+    def __init__(self, redis_client, base_price=SURGE_BASE_PRICE):
+        """
+        Reads the surge multipliers written by app.surge_pricing.materializer.
+
+        A quote costs one HMGET and a full table one HGETALL, whatever the
+        window size or number of cells. Cells missing from the table have no
+        orders and get the base price. Without a table (the materializer is
+        not running, or does not cover the resolution) the version is None,
+        and the endpoints answer 503 instead of quoting the base price.
+        """
+        self.client = redis_client
+        self.base_price = base_price
+
+    def _parse_table(self, table):
+        version = table.pop(VERSION_FIELD, None)
+        computed_at = table.pop(COMPUTED_AT_FIELD, None)
+        prices = {
+            h3_cell_id: self.base_price * float(multiplier)
+            for h3_cell_id, multiplier in table.items()
         }
+        return SurgePricesResponse(
+            version=int(version) if version else None,
+            computed_at=float(computed_at) if computed_at else None,
+            surge_prices=prices,
+        )
 
-        surge_prices = {}
-        for h3_cell_id in order_counts:
-            order_count = order_counts[h3_cell_id]
-            driver_count = driver_counts.get(h3_cell_id, 0)
-            surge_prices[h3_cell_id] = self._calculate_surge_for_cell(
-                order_count, driver_count
-            )
+    def _parse_cell(self, h3_cell_id, values):
+        multiplier, version, computed_at = values
+        return SurgePrice(
+            region=h3_cell_id,
+            surge_price=self.base_price * float(multiplier or 1),
+            version=int(version) if version else None,
+            computed_at=float(computed_at) if computed_at else None,
+        )
 
-        return surge_prices
+    def get_surge_prices(self, cell_resolution):
+        return self._parse_table(self.client.hgetall(surge_key(cell_resolution)))
 
-    def calculate_surge(self, h3_cell_id):
-        """Calculate surge pricing based on driver and order count."""
-        driver_count = self.driver_position_aggregator.get_driver_count_in_last_minute(
-            h3_cell_id
+    def get_surge_price(self, h3_cell_id):
+        values = self.client.hmget(
+            surge_key(h3.get_resolution(h3_cell_id)),
+            h3_cell_id,
+            VERSION_FIELD,
+            COMPUTED_AT_FIELD,
+        )
+        return self._parse_cell(h3_cell_id, values)
+
+    async def get_surge_prices_async(self, cell_resolution):
+        return self._parse_table(
+            await self.client.hgetall(surge_key(cell_resolution))
         )
-        order_count = self.order_aggregator.get_order_count_in_last_minute(h3_cell_id)
 
-        return self._calculate_surge_for_cell(order_count, driver_count)
+    async def get_surge_price_async(self, h3_cell_id):
+        values = await self.client.hmget(
+            surge_key(h3.get_resolution(h3_cell_id)),
+            h3_cell_id,
+            VERSION_FIELD,
+            COMPUTED_AT_FIELD,
+        )
+        return self._parse_cell(h3_cell_id, values)
@@ -0,0 +1,169 @@
+import argparse
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from app.stream_partitioning import STREAM_PARTITIONS, assign_partitions
+
+AGGREGATOR_WORKERS = int(os.getenv("AGGREGATOR_WORKERS", 1))
+CONSUMER_NAME_PREFIX = os.getenv("CONSUMER_NAME_PREFIX", socket.gethostname())
+SUPERVISE_INTERVAL = 1.0
+SHUTDOWN_TIMEOUT = 10
+
+# Entry points that accept `consumer_name` and `partitions` keywords and block
+# until stopped.
+ROLES = {
+    "driver_aggregator": "app.driver_position.aggregator_consumer",
+    "order_aggregator": "app.orders.aggregator_consumer",
+    "driver_location_index": "app.driver_position.location_index_consumer",
+    "async_aggregators": "app.async_processor",
+    "driver_persist": "app.driver_position.persist_consumer",
+    "order_persist": "app.orders.persist_consumer",
+}
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def build_consumer_name(role, worker_index, prefix=CONSUMER_NAME_PREFIX):
+    """
+    Consumer names are stable across restarts, so a restarted worker picks up
+    its own pending entries. The prefix defaults to the hostname, which keeps
+    names unique when pools run on several hosts against the same groups.
+    """
+    return f"{role}-{prefix}-{worker_index}"
+
+
+def run_worker(role, consumer_name, partitions=None):
+    # Drop the pool's handlers; the processor installs its own in run().
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    module = importlib.import_module(ROLES[role])
+    module.main(consumer_name=consumer_name, partitions=partitions)
+
+
+class WorkerPool:
+    def __init__(
+        self,
+        role,
+        num_workers=AGGREGATOR_WORKERS,
+        consumer_name_prefix=CONSUMER_NAME_PREFIX,
+        num_partitions=STREAM_PARTITIONS,
+    ):
+        """
+        Run `num_workers` processes of one role inside its consumer group.
+
+        Args:
+            role: One of ROLES.
+            num_workers: Number of worker processes to keep alive.
+            consumer_name_prefix: Prefix for the consumer names of this pool.
+            num_partitions: Number of stream partitions. When greater than 1,
+                each worker reads only the partitions assigned to it.
+        """
+        if role not in ROLES:
+            raise ValueError(f"Unknown role {role}, expected one of {list(ROLES)}")
+        if 1 < num_partitions < num_workers:
+            logger.warning(
+                f"Only {num_partitions} partitions for {num_workers} workers, "
+                f"starting {num_partitions} workers."
+            )
+            num_workers = num_partitions
+        self.role = role
+        self.num_workers = num_workers
+        self.num_partitions = num_partitions
+        self.consumer_name_prefix = consumer_name_prefix
+        self.workers = {}
+        self.shutdown_flag = False
+
+    def start_worker(self, worker_index):
+        consumer_name = build_consumer_name(
+            self.role, worker_index, self.consumer_name_prefix
+        )
+        partitions = None
+        if self.num_partitions > 1:
+            partitions = assign_partitions(
+                worker_index, self.num_workers, self.num_partitions
+            )
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(self.role, consumer_name, partitions),
+            name=consumer_name,
+        )
+        process.start()
+        self.workers[worker_index] = process
+        logger.info(
+            f"Started worker {consumer_name} with PID {process.pid}"
+            + (f" for partitions {partitions}" if partitions is not None else "")
+        )
+
+    def stop(self, *args):
+        logger.info("Shutdown signal received. Stopping workers...")
+        self.shutdown_flag = True
+
+    def supervise(self):
+        """Restart workers that exited while the pool is still running."""
+        for worker_index, process in list(self.workers.items()):
+            if not process.is_alive():
+                logger.warning(
+                    f"Worker {process.name} exited with code {process.exitcode}, "
+                    "restarting..."
+                )
+                self.start_worker(worker_index)
+
+    def shutdown(self):
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.time() + SHUTDOWN_TIMEOUT
+        for process in self.workers.values():
+            process.join(max(deadline - time.time(), 0))
+            if process.is_alive():
+                logger.warning(f"Worker {process.name} did not stop, killing it.")
+                process.kill()
+                process.join()
+
+        logger.info("Worker pool stopped.")
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        for worker_index in range(self.num_workers):
+            self.start_worker(worker_index)
+
+        try:
+            while not self.shutdown_flag:
+                time.sleep(SUPERVISE_INTERVAL)
+                if not self.shutdown_flag:
+                    self.supervise()
+        finally:
+            self.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a pool of stream consumers.")
+    parser.add_argument("role", choices=list(ROLES))
+    parser.add_argument("--workers", type=int, default=AGGREGATOR_WORKERS)
+    parser.add_argument("--consumer-name-prefix", default=CONSUMER_NAME_PREFIX)
+    parser.add_argument(
+        "--partitions",
+        type=int,
+        default=STREAM_PARTITIONS,
+        help="Stream partitions, as configured on the producers.",
+    )
+    args = parser.parse_args()
+
+    WorkerPool(
+        args.role, args.workers, args.consumer_name_prefix, args.partitions
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
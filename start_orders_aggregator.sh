@@ -1,3 +1,3 @@
-# Start the aggregator consumer (this will block until the consumer stops)
+# Start the aggregator consumers (this will block until the consumers stop)
 echo "Starting the driver position aggregator..."
-python app/orders/aggregator_consumer.py
\ No newline at end of file
+python -m app.worker_pool order_aggregator
\ No newline at end of file
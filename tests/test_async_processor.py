@@ -0,0 +1,124 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime
+
+import fakeredis
+import h3
+import pytest
+
+from app.async_processor import AsyncStreamAggregator
+from app.event_encoding import DRIVER_POSITION_EVENT
+from app.sliding_window import window_key
+
+STREAM = "positions"
+GROUP = "aggregator"
+PREFIX = "driver_count"
+TIMESTAMP = datetime(2026, 10, 17, 12, 0, 30)
+POINTS = [(-19.92, -43.94), (-19.92, -43.94), (-23.55, -46.63)]
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def client(server):
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+@pytest.fixture
+def raw_client(server):
+    # Binary payloads are not valid UTF-8.
+    return fakeredis.FakeRedis(server=server)
+
+
+def make_aggregator(server, **kwargs):
+    return AsyncStreamAggregator(
+        fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+        STREAM,
+        GROUP,
+        resolutions=[9],
+        key_prefix=PREFIX,
+        atomic_mode=False,
+        event_codec=DRIVER_POSITION_EVENT,
+        **kwargs,
+    )
+
+
+def add_events(client):
+    return [
+        client.xadd(
+            STREAM,
+            DRIVER_POSITION_EVENT.encode(
+                {
+                    "driver_id": uuid.uuid4(),
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "timestamp": TIMESTAMP,
+                }
+            ),
+        )
+        for latitude, longitude in POINTS
+    ]
+
+
+def expected_counts():
+    counts = {}
+    for latitude, longitude in POINTS:
+        cell = h3.latlng_to_cell(latitude, longitude, 9)
+        counts[cell] = str(int(counts.get(cell, 0)) + 1)
+    return counts
+
+
+def test_batches_are_read_counted_and_acked(server, client):
+    aggregator = make_aggregator(server, window_sizes=[5])
+
+    async def consume():
+        await aggregator.create_consumer_group_async(STREAM)
+        add_events(client)
+        [(stream_name, messages)] = await aggregator.read_messages_async()
+        await aggregator.process_messages_async(stream_name, messages)
+
+    asyncio.run(consume())
+    assert client.hgetall(f"{PREFIX}:2026-10-17T12:00:9") == expected_counts()
+    assert client.hgetall(window_key(PREFIX, 5, 9)) == expected_counts()
+    assert client.xpending(STREAM, GROUP)["pending"] == 0
+
+
+def test_entries_of_a_crashed_consumer_are_claimed_and_counted(
+    server, client, raw_client
+):
+    client.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+    ids = add_events(client)
+    raw_client.xreadgroup(GROUP, "crashed", {STREAM: ">"})
+    time.sleep(0.05)
+    aggregator = make_aggregator(server, window_sizes=[])
+    aggregator.claim_min_idle_time = 30
+
+    assert asyncio.run(aggregator.recover_pending_messages_async(STREAM)) == len(ids)
+    assert client.hgetall(f"{PREFIX}:2026-10-17T12:00:9") == expected_counts()
+    assert client.xpending(STREAM, GROUP)["pending"] == 0
+    assert asyncio.run(aggregator.delete_idle_consumers_async(STREAM, 0)) == [
+        "crashed"
+    ]
+
+
+def test_entries_past_the_delivery_limit_are_dead_lettered(
+    server, client, raw_client
+):
+    client.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+    ids = add_events(client)
+    raw_client.xreadgroup(GROUP, "crashed", {STREAM: ">"})
+    raw_client.xreadgroup(GROUP, "crashed", {STREAM: "0"})
+    time.sleep(0.05)
+    aggregator = make_aggregator(server, window_sizes=[])
+    aggregator.claim_min_idle_time = 30
+    aggregator.max_deliveries = 1
+
+    asyncio.run(aggregator.recover_pending_messages_async(STREAM))
+    dead_letters = raw_client.xrange(aggregator.dead_letter_stream_name(STREAM))
+    assert [data[b"original_id"].decode() for _, data in dead_letters] == ids
+    assert not client.exists(f"{PREFIX}:2026-10-17T12:00:9")
+    assert client.xpending(STREAM, GROUP)["pending"] == 0
@@ -0,0 +1,38 @@
+from app.batch_control import AdaptiveBatchController
+
+
+def make_controller(initial_batch_size=100):
+    return AdaptiveBatchController(
+        initial_batch_size, min_batch_size=10, max_batch_size=400, target_latency=1.0
+    )
+
+
+def test_initial_batch_size_is_clamped():
+    assert make_controller(1).batch_size == 10
+    assert make_controller(10_000).batch_size == 400
+
+
+def test_batch_grows_under_backlog_up_to_the_maximum():
+    controller = make_controller()
+    controller.record_lag(5000)
+    sizes = [controller.record_batch(controller.batch_size, 0.1) for _ in range(4)]
+    assert sizes == [200, 400, 400, 400]
+
+
+def test_full_reads_count_as_backlog_without_lag():
+    controller = make_controller()
+    assert controller.record_batch(100, 0.1) == 200
+
+
+def test_batch_holds_without_backlog_or_when_latency_is_close_to_target():
+    controller = make_controller()
+    assert controller.record_batch(40, 0.1) == 100
+    controller.record_lag(5000)
+    assert controller.record_batch(100, 0.8) == 100
+
+
+def test_slow_batches_halve_down_to_the_minimum():
+    controller = make_controller()
+    controller.record_lag(5000)
+    sizes = [controller.record_batch(controller.batch_size, 2.0) for _ in range(4)]
+    assert sizes == [50, 25, 12, 10]
@@ -0,0 +1,241 @@
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+import h3
+import pytest
+
+from app import data_aggregator_service
+from app.data_aggregator_service import (MAX_EXPANDED_CELLS, BucketCache,
+                                         DataAggregator, TooManyCellsError)
+from app.retention import get_retention
+
+PREFIX = "counts"
+TIME_KEY = "2026-10-17T12:00"
+FINE_CELL = h3.latlng_to_cell(-19.92, -43.94, 9)
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def make_aggregator(client, stored_resolution=9):
+    return DataAggregator(
+        client, PREFIX, cache=None, stored_resolution=stored_resolution
+    )
+
+
+def test_coarse_cells_are_rolled_up_from_stored_children(client):
+    siblings = list(h3.cell_to_children(h3.cell_to_parent(FINE_CELL, 8), 9))
+    client.hset(
+        f"{PREFIX}:{TIME_KEY}:9", mapping={siblings[0]: 2, siblings[1]: 3}
+    )
+    parent = h3.cell_to_parent(FINE_CELL, 7)
+
+    counts = make_aggregator(client).get_cell_counts([parent], [TIME_KEY])
+    assert counts == {parent: 5}
+
+
+def test_queries_expanding_past_the_limit_are_rejected(client):
+    coarse_cell = h3.cell_to_parent(FINE_CELL, 0)
+    aggregator = make_aggregator(client)
+    with pytest.raises(TooManyCellsError):
+        aggregator.get_cell_counts([coarse_cell], [TIME_KEY])
+
+    # The same cell is cheap when its resolution is stored.
+    assert make_aggregator(client, stored_resolution=None).get_cell_counts(
+        [coarse_cell], [TIME_KEY]
+    ) == {coarse_cell: 0}
+
+
+def test_limit_counts_every_requested_cell(client):
+    cells_at_7 = list(h3.grid_disk(h3.cell_to_parent(FINE_CELL, 7), 30))
+    assert len(cells_at_7) * 49 > MAX_EXPANDED_CELLS
+    with pytest.raises(TooManyCellsError):
+        make_aggregator(client).get_cell_counts(cells_at_7, [TIME_KEY])
+
+
+def minute_key(moment):
+    return f"{PREFIX}:{moment.strftime('%Y-%m-%dT%H:%M')}:9"
+
+
+def test_history_steps_include_the_partial_last_minute(client):
+    aggregator = make_aggregator(client)
+    start = datetime(2026, 10, 17, 11, 58)
+    first, num_steps = aggregator._history_steps(
+        start, datetime(2026, 10, 17, 12, 0, 30), 1
+    )
+    assert first * 60 == start.replace(tzinfo=timezone.utc).timestamp()
+    assert num_steps == 3
+    # A range within one minute still covers that minute.
+    assert aggregator._history_steps(
+        datetime(2026, 10, 17, 12, 0, 10), datetime(2026, 10, 17, 12, 0, 20), 5
+    ) == (first + 2, 1)
+    # Ends on a step boundary are exclusive.
+    assert aggregator._history_steps(
+        start, datetime(2026, 10, 17, 12, 0), 1
+    ) == (first, 2)
+
+
+def test_empty_history_ranges_are_rejected(client):
+    moment = datetime(2026, 10, 17, 12, 0)
+    with pytest.raises(ValueError):
+        make_aggregator(client)._history_steps(moment, moment, 1)
+
+
+def test_history_up_to_now_counts_the_current_minute(client):
+    current_minute = datetime.utcnow().replace(second=0, microsecond=0)
+    client.hset(minute_key(current_minute - timedelta(minutes=1)), FINE_CELL, 2)
+    client.hset(minute_key(current_minute), FINE_CELL, 3)
+
+    history = make_aggregator(client, stored_resolution=None).get_count_history(
+        [FINE_CELL],
+        current_minute - timedelta(minutes=1),
+        current_minute + timedelta(seconds=30),
+    )
+    assert history.regions == [FINE_CELL]
+    assert history.values == [[2, 3]]
+    assert history.timestamps[-1] == (
+        current_minute.replace(tzinfo=timezone.utc).timestamp()
+    )
+
+
+def test_distinct_histories_only_read_minutes_within_retention(client):
+    current_minute = datetime.utcnow().replace(second=0, microsecond=0)
+    distinct_key = f"{PREFIX}:distinct:{current_minute.strftime('%Y-%m-%dT%H:%M')}:9"
+    client.pfadd(f"{distinct_key}:{FINE_CELL}", "driver-1", "driver-2")
+    aggregator = DataAggregator(client, PREFIX, distinct=True, cache=None)
+
+    start = current_minute - timedelta(days=1000)
+    end = current_minute + timedelta(seconds=30)
+    first, num_steps = aggregator._history_steps(start, end, 24 * 60)
+    members, fields = aggregator._expand_cells([FINE_CELL])
+    reads = aggregator._plan_history_reads(
+        members, fields, first, num_steps, 24 * 60, {}
+    )
+    stored_minutes = get_retention(PREFIX, 9)["1m"] // 60 + 1
+    assert sum(len(keys) for _, _, keys, _ in reads) <= stored_minutes
+
+    history = aggregator.get_count_history([FINE_CELL], start, end, 24 * 60)
+    assert len(history.timestamps) == num_steps
+    assert history.values[0][-1] == 2
+    assert sum(history.values[0]) == 2
+
+
+def test_distinct_histories_past_the_limit_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(data_aggregator_service, "MAX_HISTORY_CELL_MINUTES", 1000)
+    aggregator = DataAggregator(client, PREFIX, distinct=True, cache=None)
+    cells = list(h3.grid_disk(FINE_CELL, 2))
+    end = datetime.utcnow()
+    with pytest.raises(TooManyCellsError):
+        aggregator.get_count_history(cells, end - timedelta(hours=1), end)
+
+    # Only minutes still kept count towards the limit.
+    assert aggregator.get_count_history(
+        [FINE_CELL], end - timedelta(days=30), end, 24 * 60
+    ).values[0] == [0] * 31
+
+
+def test_history_sources_skip_expired_minute_buckets(client):
+    aggregator = make_aggregator(client, stored_resolution=None)
+    end = datetime.utcnow()
+    first, num_steps = aggregator._history_steps(end - timedelta(days=10), end, 7)
+    sources = aggregator._history_sources(first, num_steps, 7, 9, {})
+    assert len(sources) <= get_retention(PREFIX, 9)["1m"] // 60 + 1
+
+
+def test_cell_counts_read_only_the_requested_fields(client, monkeypatch):
+    other_cell = h3.latlng_to_cell(-23.55, -46.63, 9)
+    missing_cell = h3.latlng_to_cell(-22.9, -43.2, 9)
+    coarse_cell = h3.cell_to_parent(FINE_CELL, 7)
+    time_keys = [TIME_KEY, "2026-10-17T12:01"]
+    client.hset(f"{PREFIX}:{TIME_KEY}:9", mapping={FINE_CELL: 2, other_cell: 5})
+    client.hset(f"{PREFIX}:2026-10-17T12:01:9", FINE_CELL, 1)
+    client.hset(f"{PREFIX}:{TIME_KEY}:7", coarse_cell, 4)
+    commands = []
+    pipeline = client.pipeline
+
+    def recording_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def recording_execute(*args, **kwargs):
+            commands.extend(command[0][0] for command in pipe.command_stack)
+            return execute(*args, **kwargs)
+
+        pipe.execute = recording_execute
+        return pipe
+
+    monkeypatch.setattr(client, "pipeline", recording_pipeline)
+    counts = make_aggregator(client, stored_resolution=None).get_cell_counts(
+        [FINE_CELL, missing_cell, coarse_cell, FINE_CELL], time_keys
+    )
+    assert counts == {FINE_CELL: 3, missing_cell: 0, coarse_cell: 4}
+    # One HMGET per minute bucket and resolution, in a single pipeline.
+    assert commands == ["HMGET"] * 4
+
+
+def test_last_minute_count_of_a_cell_without_data_is_zero(client):
+    aggregator = make_aggregator(client, stored_resolution=None)
+    assert aggregator.get_count_in_last_minute(FINE_CELL).count == 0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(data_aggregator_service.time, "monotonic", fake_clock.monotonic)
+    return fake_clock
+
+
+def test_buckets_count_as_complete_once_their_minute_has_settled():
+    cache = BucketCache(settle_seconds=10)
+    assert not cache.is_complete(TIME_KEY, datetime(2026, 10, 17, 12, 0, 59))
+    assert not cache.is_complete(TIME_KEY, datetime(2026, 10, 17, 12, 1, 9))
+    assert cache.is_complete(TIME_KEY, datetime(2026, 10, 17, 12, 1, 10))
+
+
+def test_cached_entries_expire_and_the_least_recently_used_is_evicted(clock):
+    cache = BucketCache(max_buckets=2, max_staleness=1)
+    cache.put_bucket("a", {"cell": 1}, ttl=60)
+    cache.put_bucket("b", {"cell": 2}, ttl=5)
+    cache.get_bucket("a")
+    cache.put_bucket("c", {"cell": 3}, ttl=60)
+    assert cache.get_bucket("b") is None
+    assert cache.get_bucket("a") == {"cell": 1}
+
+    cache.put_result("window", {"cell": 4})
+    clock.now = 1
+    assert cache.get_result("window") is None
+    assert cache.get_bucket("c") == {"cell": 3}
+    clock.now = 60
+    assert cache.get_bucket("a") is None
+
+    # Results are not cached at all without a staleness budget.
+    cache = BucketCache(max_staleness=0)
+    cache.put_result("window", {"cell": 4})
+    assert cache.get_result("window") is None
+
+
+def test_only_completed_buckets_are_served_from_the_cache(client, clock):
+    aggregator = DataAggregator(client, PREFIX, cache=BucketCache(max_staleness=0))
+    current_minute = datetime.utcnow().replace(second=0, microsecond=0)
+    time_keys = [
+        (current_minute - timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M")
+        for i in (0, 2)
+    ]
+    for time_key in time_keys:
+        client.hset(f"{PREFIX}:{time_key}:9", FINE_CELL, 1)
+    assert aggregator._aggregate_counts(time_keys, 9) == {FINE_CELL: 2}
+
+    for time_key in time_keys:
+        client.hincrby(f"{PREFIX}:{time_key}:9", FINE_CELL, 10)
+    # The current minute is read again; the completed one comes from the cache.
+    assert aggregator._aggregate_counts(time_keys, 9) == {FINE_CELL: 12}
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime
+
+import fakeredis
+import h3
+import pytest
+from fastapi import HTTPException
+
+from app.dependencies import MAX_CELLS_PER_REQUEST, get_cell_id, get_cell_ids
+from app.driver_position.aggregator_consumer import DRIVER_COUNT_KEY
+from app.driver_position.endpoints import (current_driver_count_by_cell,
+                                           driver_count_by_cell,
+                                           driver_counts_for_cells)
+from app.driver_position.service import DriverPositionAggregator
+
+CELL = h3.latlng_to_cell(-19.92, -43.94, 9)
+
+
+@pytest.mark.parametrize("cell_id", ["", "not-a-cell", "8928308280fffff0", "7"])
+def test_invalid_cell_ids_are_rejected(cell_id):
+    with pytest.raises(HTTPException) as error:
+        get_cell_id(cell_id)
+    assert error.value.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "endpoint", [driver_count_by_cell, current_driver_count_by_cell]
+)
+def test_single_cell_endpoints_count_valid_cells(endpoint):
+    aggregator = DriverPositionAggregator(
+        fakeredis.FakeAsyncRedis(decode_responses=True)
+    )
+    cell_id = get_cell_id(CELL)
+    count = asyncio.run(
+        endpoint(cell_id=cell_id, driver_position_aggregator=aggregator)
+    )
+    assert count.count == 0
+
+
+
+def test_multi_cell_lookups_reject_invalid_or_too_many_cells():
+    with pytest.raises(HTTPException) as error:
+        get_cell_ids([CELL, "not-a-cell"])
+    assert error.value.status_code == 422
+    with pytest.raises(HTTPException) as error:
+        get_cell_ids([CELL] * (MAX_CELLS_PER_REQUEST + 1))
+    assert error.value.status_code == 422
+
+
+def test_multi_cell_lookups_count_missing_cells_as_zero():
+    server = fakeredis.FakeServer()
+    minute = datetime.utcnow().strftime("%Y-%m-%dT%H:%M")
+    fakeredis.FakeRedis(server=server).hset(f"{DRIVER_COUNT_KEY}:{minute}:9", CELL, 3)
+    aggregator = DriverPositionAggregator(
+        fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    )
+    other_cell = h3.latlng_to_cell(-23.55, -46.63, 9)
+    response = asyncio.run(
+        driver_counts_for_cells(
+            cell_ids=get_cell_ids([CELL, other_cell]),
+            driver_position_aggregator=aggregator,
+        )
+    )
+    counts = response.driver_position_counts
+    assert [(count.region, count.count) for count in counts] == [
+        (CELL, 3),
+        (other_cell, 0),
+    ]
@@ -0,0 +1,101 @@
+import uuid
+from datetime import datetime, timezone
+
+import fakeredis
+import numpy as np
+import pytest
+
+from app.event_encoding import (DRIVER_POSITION_EVENT, EVENT_FIELD,
+                                decode_entries, decode_events,
+                                minute_time_keys, to_epoch_ms)
+from app.redis_client import bytes_client
+
+NAMES = ["driver_id", "latitude", "longitude", "timestamp"]
+TIMESTAMP = datetime(2026, 10, 17, 12, 0, 30)
+
+
+def driver_event(latitude=-19.92, longitude=-43.94):
+    return {
+        "driver_id": uuid.uuid4(),
+        "latitude": latitude,
+        "longitude": longitude,
+        "timestamp": TIMESTAMP,
+    }
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def read_entries(client, stream="events"):
+    return decode_entries(bytes_client(client).xrange(stream))
+
+
+def test_binary_and_legacy_entries_decode_to_the_same_columns(client):
+    events = [driver_event(), driver_event(latitude=-19.5)]
+    ids = [
+        client.xadd("events", DRIVER_POSITION_EVENT.encode(events[0])),
+        client.xadd("events", DRIVER_POSITION_EVENT.encode_legacy(events[1])),
+    ]
+
+    message_ids, columns = decode_events(
+        read_entries(client), NAMES, DRIVER_POSITION_EVENT
+    )
+    assert message_ids == ids
+    assert columns["driver_id"] == [str(event["driver_id"]) for event in events]
+    np.testing.assert_allclose(columns["latitude"], [-19.92, -19.5])
+    np.testing.assert_allclose(columns["longitude"], [-43.94, -43.94])
+    assert columns["timestamp"].tolist() == [to_epoch_ms(TIMESTAMP)] * 2
+
+
+def test_payloads_that_are_not_utf8_survive_the_round_trip(client):
+    # 0xff and 0x80 bytes are invalid UTF-8 on their own.
+    event = driver_event(latitude=float.fromhex("0x1.ffffffffff80p-1"))
+    fields = DRIVER_POSITION_EVENT.encode(event)
+    client.xadd("events", fields)
+
+    [(_, data)] = read_entries(client)
+    assert data == fields
+    _, columns = decode_events([("1-0", data)], NAMES, DRIVER_POSITION_EVENT)
+    assert columns["latitude"].tolist() == [event["latitude"]]
+
+
+def test_undecodable_entries_are_left_out(client):
+    client.xadd("events", {EVENT_FIELD: b"\x09garbage"})
+    client.xadd("events", {"driver_id": "not a uuid", "latitude": "nan"})
+    client.xadd("events", DRIVER_POSITION_EVENT.encode(driver_event()))
+
+    entries = read_entries(client)
+    message_ids, columns = decode_events(entries, NAMES, DRIVER_POSITION_EVENT)
+    assert message_ids == [entries[2][0]]
+    assert len(columns["latitude"]) == 1
+
+
+def test_batches_encode_to_the_same_payloads_as_single_events():
+    events = [driver_event(), driver_event(longitude=-44.0)]
+    records = DRIVER_POSITION_EVENT.new_records(2)
+    for name in ("latitude", "longitude"):
+        records[name] = [event[name] for event in events]
+    records["timestamp"] = to_epoch_ms(TIMESTAMP)
+    for i, event in enumerate(events):
+        records["driver_id"][i] = np.frombuffer(
+            event["driver_id"].bytes, dtype=np.uint8
+        )
+
+    assert DRIVER_POSITION_EVENT.encode_records(records) == [
+        DRIVER_POSITION_EVENT.encode(event)[EVENT_FIELD] for event in events
+    ]
+
+
+def test_minute_time_keys():
+    timestamps = [
+        to_epoch_ms(datetime(2026, 10, 17, 12, 0, 59, tzinfo=timezone.utc)),
+        to_epoch_ms(datetime(2026, 10, 17, 12, 1)),
+        to_epoch_ms("2026-10-17T12:00:00"),
+    ]
+    assert minute_time_keys(timestamps) == [
+        "2026-10-17T12:00",
+        "2026-10-17T12:01",
+        "2026-10-17T12:00",
+    ]
@@ -0,0 +1,60 @@
+import h3
+import numpy as np
+
+from app.h3_indexing import (ParentCache, cells_to_parent, cells_to_str,
+                             get_h3_cells_batch, latlng_to_cells,
+                             rollup_counts)
+
+rng = np.random.default_rng(7)
+LATITUDES = rng.uniform(-60, 60, 200)
+LONGITUDES = rng.uniform(-180, 180, 200)
+# A descendant of a pentagon, which has no children on the deleted k-axis.
+PENTAGON_CHILD = h3.cell_to_center_child(h3.get_pentagons(2)[0], 15)
+
+
+def test_latlng_to_cells_matches_h3():
+    cells = cells_to_str(latlng_to_cells(LATITUDES, LONGITUDES, 9))
+    assert cells == [
+        h3.latlng_to_cell(lat, lng, 9) for lat, lng in zip(LATITUDES, LONGITUDES)
+    ]
+
+
+def test_cells_to_parent_matches_h3_at_every_coarser_resolution():
+    cells = latlng_to_cells(LATITUDES, LONGITUDES, 15).tolist()
+    cells.append(h3.str_to_int(PENTAGON_CHILD))
+    for res in range(16):
+        parents = cells_to_str(cells_to_parent(cells, res))
+        assert parents == [
+            h3.cell_to_parent(h3.int_to_str(cell), res) for cell in cells
+        ]
+
+
+def test_batch_indexing_matches_h3_at_every_resolution():
+    cells = get_h3_cells_batch(LATITUDES, LONGITUDES, [7, 8, 9])
+    for res in (7, 8, 9):
+        assert cells[res] == [
+            h3.latlng_to_cell(lat, lng, res) for lat, lng in zip(LATITUDES, LONGITUDES)
+        ]
+
+
+def test_rollup_counts_sums_children_into_their_parents():
+    cells = [h3.latlng_to_cell(lat, lng, 9) for lat, lng in zip(LATITUDES, LONGITUDES)]
+    siblings = list(h3.cell_to_children(h3.cell_to_parent(cells[0], 8), 9))[:3]
+    counts = {cell: 1 for cell in cells}
+    counts.update({sibling: 2 for sibling in siblings})
+
+    expected = {}
+    for cell, count in counts.items():
+        parent = h3.cell_to_parent(cell, 7)
+        expected[parent] = expected.get(parent, 0) + count
+    assert rollup_counts(counts, 7, ParentCache()) == expected
+    assert rollup_counts({}, 7) == {}
+
+
+def test_parent_cache_is_dropped_when_full():
+    cache = ParentCache(max_size=2)
+    cells = [h3.latlng_to_cell(lat, lng, 9) for lat, lng in zip(LATITUDES, LONGITUDES)]
+    cache.get_parents(cells[:2], 7)
+    parents = cache.get_parents(cells[2:4], 7)
+    assert cells_to_str(parents) == [h3.cell_to_parent(cell, 7) for cell in cells[2:4]]
+    assert set(cache.parents[7]) == set(cells[2:4])
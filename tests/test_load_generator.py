@@ -0,0 +1,98 @@
+import time
+
+import fakeredis
+import numpy as np
+import pytest
+
+from app.event_encoding import EVENT_FIELD, ORDER_EVENT, decode_entries
+from app.load_generator import (LoadGenerator, StreamSender, TraceWriter,
+                                read_trace, replay_trace)
+from app.redis_client import bytes_client
+
+START_MS = 1_700_000_000_000
+
+
+class RecordingSender:
+    def __init__(self):
+        self.chunks = []
+
+    def send(self, records):
+        self.chunks.append(records)
+
+
+def generate(event_type, seed, ticks=5):
+    generator = LoadGenerator(event_type, rate=2000, seed=seed, fleet_size=100)
+    return [
+        generator.generate(START_MS + tick * 100, START_MS + (tick + 1) * 100)
+        for tick in range(ticks)
+    ]
+
+
+@pytest.mark.parametrize("event_type", ["drivers", "orders"])
+def test_the_same_seed_generates_the_same_events(event_type):
+    first, second = generate(event_type, seed=1), generate(event_type, seed=1)
+    assert [records.tobytes() for records in first] == [
+        records.tobytes() for records in second
+    ]
+    assert np.concatenate(first).tobytes() != np.concatenate(
+        generate(event_type, seed=2)
+    ).tobytes()
+
+
+def test_generated_events_stay_in_their_tick():
+    for tick, records in enumerate(generate("drivers", seed=1)):
+        assert len(records) > 0
+        assert np.all(np.diff(records["timestamp"]) >= 0)
+        assert records["timestamp"].min() >= START_MS + tick * 100
+        assert records["timestamp"].max() < START_MS + (tick + 1) * 100
+
+
+@pytest.mark.parametrize("event_type", ["drivers", "orders"])
+def test_recorded_traces_replay_the_same_events(tmp_path, event_type):
+    chunks = generate(event_type, seed=3)
+    path = tmp_path / "trace.bin"
+    trace = TraceWriter(path, event_type)
+    for records in chunks:
+        trace.write(records)
+    trace.close()
+
+    recorded_type, records = read_trace(path)
+    assert recorded_type == event_type
+    assert records.tobytes() == np.concatenate(chunks).tobytes()
+
+    sender = RecordingSender()
+    replay_trace(records, sender, speed=1e6, retime=False)
+    assert np.concatenate(sender.chunks).tobytes() == records.tobytes()
+
+
+def test_replay_moves_timestamps_to_the_replay_clock():
+    records = np.concatenate(generate("drivers", seed=3))
+    sender = RecordingSender()
+    started_ms = time.time() * 1000
+    replay_trace(records, sender, speed=1e6)
+
+    replayed = np.concatenate(sender.chunks)
+    assert abs(replayed["timestamp"].min() - started_ms) < 1000
+    assert replayed["latitude"].tobytes() == records["latitude"].tobytes()
+
+
+def test_empty_traces_replay_nothing(tmp_path):
+    path = tmp_path / "trace.bin"
+    TraceWriter(path, "drivers").close()
+    _, records = read_trace(path)
+
+    sender = RecordingSender()
+    replay_trace(records, sender)
+    assert sender.chunks == []
+
+
+def test_sent_records_decode_to_the_generated_events():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    records = np.concatenate(generate("orders", seed=4))
+    StreamSender(client, "orders", ORDER_EVENT, num_partitions=1).send(records)
+
+    entries = decode_entries(bytes_client(client).xrange("orders"))
+    assert len(entries) == len(records)
+    assert [data for _, data in entries][:3] == [
+        {EVENT_FIELD: payload} for payload in ORDER_EVENT.encode_records(records[:3])
+    ]
@@ -0,0 +1,168 @@
+import uuid
+from datetime import datetime
+
+import fakeredis
+import h3
+import pytest
+
+from app.data_aggregator_service import DataAggregator
+from app.event_encoding import DRIVER_POSITION_EVENT
+from app.redis_aggregator import StreamAggregator
+
+STREAM = "positions"
+GROUP = "aggregator"
+PREFIX = "driver_count"
+TIMESTAMP = datetime(2026, 10, 17, 12, 0, 30)
+POINTS = [(-19.92, -43.94), (-19.92, -43.94), (-23.55, -46.63)]
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def make_aggregator(client, atomic_mode):
+    return StreamAggregator(
+        client,
+        STREAM,
+        GROUP,
+        resolutions=[7, 9],
+        key_prefix=PREFIX,
+        atomic_mode=atomic_mode,
+        window_sizes=[],
+        event_codec=DRIVER_POSITION_EVENT,
+    )
+
+
+def read_batch(client, aggregator):
+    for latitude, longitude in POINTS:
+        client.xadd(
+            STREAM,
+            DRIVER_POSITION_EVENT.encode(
+                {
+                    "driver_id": uuid.uuid4(),
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "timestamp": TIMESTAMP,
+                }
+            ),
+        )
+    aggregator.create_consumer_group(STREAM)
+    [(stream_name, messages)] = aggregator.read_messages()
+    return stream_name, messages
+
+
+def expected_counts(res):
+    counts = {}
+    for latitude, longitude in POINTS:
+        cell = h3.latlng_to_cell(latitude, longitude, res)
+        counts[cell] = str(int(counts.get(cell, 0)) + 1)
+    return counts
+
+
+@pytest.mark.parametrize("atomic_mode", [False, True])
+def test_batches_are_counted_per_resolution_and_acked(client, atomic_mode):
+    aggregator = make_aggregator(client, atomic_mode)
+    aggregator.process_messages(*read_batch(client, aggregator))
+
+    for res in (7, 9):
+        key = f"{PREFIX}:2026-10-17T12:00:{res}"
+        assert client.hgetall(key) == expected_counts(res)
+        assert client.ttl(key) > 0
+    assert client.xpending(STREAM, GROUP)["pending"] == 0
+
+
+def test_atomic_mode_does_not_count_redelivered_messages_twice(client):
+    aggregator = make_aggregator(client, atomic_mode=True)
+    stream_name, messages = read_batch(client, aggregator)
+    aggregator.process_messages(stream_name, messages)
+    # A crash after the script ran, but before the consumer knew, redelivers
+    # the whole batch.
+    aggregator.process_messages(stream_name, messages)
+
+    assert client.hgetall(f"{PREFIX}:2026-10-17T12:00:9") == expected_counts(9)
+    dedup_keys = {
+        aggregator.get_dedup_key(stream_name, message_id) for message_id, _ in messages
+    }
+    assert set().union(*map(client.smembers, dedup_keys)) == {
+        message_id for message_id, _ in messages
+    }
+    assert all(client.ttl(dedup_key) > 0 for dedup_key in dedup_keys)
+
+
+def counted_keys(client):
+    return {key: client.hgetall(key) for key in client.keys(f"{PREFIX}:*")}
+
+
+def test_batch_mode_counts_the_same_as_one_message_at_a_time():
+    counts = []
+    for batch_mode in (False, True):
+        client = fakeredis.FakeRedis(decode_responses=True)
+        aggregator = make_aggregator(client, atomic_mode=False)
+        aggregator.batch_mode = batch_mode
+        aggregator.process_messages(*read_batch(client, aggregator))
+        assert client.xpending(STREAM, GROUP)["pending"] == 0
+        counts.append(counted_keys(client))
+
+    assert counts[0] == counts[1]
+    assert counts[1][f"{PREFIX}:2026-10-17T12:00:9"] == expected_counts(9)
+
+
+@pytest.mark.parametrize("batch_mode", [False, True])
+def test_malformed_entries_stay_pending_without_blocking_the_batch(
+    client, batch_mode
+):
+    aggregator = make_aggregator(client, atomic_mode=False)
+    aggregator.batch_mode = batch_mode
+    bad_id = client.xadd(
+        STREAM, {"latitude": "north", "longitude": "0", "timestamp": "now"}
+    )
+    aggregator.process_messages(*read_batch(client, aggregator))
+
+    assert client.hgetall(f"{PREFIX}:2026-10-17T12:00:9") == expected_counts(9)
+    pending = client.xpending_range(STREAM, GROUP, "-", "+", 10)
+    assert [entry["message_id"] for entry in pending] == [bad_id]
+
+
+def test_distinct_mode_counts_each_driver_once_per_cell(client):
+    aggregator = StreamAggregator(
+        client,
+        STREAM,
+        GROUP,
+        resolutions=[9],
+        key_prefix=PREFIX,
+        distinct_field="driver_id",
+        window_sizes=[],
+        event_codec=DRIVER_POSITION_EVENT,
+    )
+    aggregator.create_consumer_group(STREAM)
+    drivers = [uuid.uuid4(), uuid.uuid4()]
+    # The first driver pings every second of a minute, and once in the next.
+    pings = [(drivers[0], TIMESTAMP.replace(second=second)) for second in range(60)]
+    pings += [(drivers[0], TIMESTAMP.replace(minute=1)), (drivers[1], TIMESTAMP)]
+    for driver_id, timestamp in pings:
+        client.xadd(
+            STREAM,
+            DRIVER_POSITION_EVENT.encode(
+                {
+                    "driver_id": driver_id,
+                    "latitude": POINTS[0][0],
+                    "longitude": POINTS[0][1],
+                    "timestamp": timestamp,
+                }
+            ),
+        )
+    aggregator.batch_size = len(pings)
+    [(stream_name, messages)] = aggregator.read_messages()
+    aggregator.process_messages(stream_name, messages)
+    # Redelivered entries are added to the HyperLogLogs again, harmlessly.
+    aggregator.process_messages(stream_name, messages)
+
+    cell = h3.latlng_to_cell(*POINTS[0], 9)
+    reader = DataAggregator(client, PREFIX, distinct=True)
+    assert reader._aggregate_counts(["2026-10-17T12:00"], 9) == {cell: 2}
+    assert reader._aggregate_counts(["2026-10-17T12:01"], 9) == {cell: 1}
+    assert reader._aggregate_counts(
+        ["2026-10-17T12:00", "2026-10-17T12:01"], 9
+    ) == {cell: 2}
+    assert client.xpending(STREAM, GROUP)["pending"] == 0
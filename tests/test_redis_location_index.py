@@ -0,0 +1,122 @@
+import uuid
+from datetime import datetime, timedelta
+
+import fakeredis
+import h3
+import pytest
+
+from app.event_encoding import DRIVER_POSITION_EVENT, decode_entries
+from app.redis_client import bytes_client
+from app.redis_location_index import StreamLocationIndex
+
+STREAM = "positions"
+GROUP = "location_index"
+CENTER = (-19.92, -43.94)
+AWAY = (-23.55, -46.63)
+DRIVERS = [str(uuid.uuid4()) for _ in range(3)]
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def index(client):
+    location_index = StreamLocationIndex(
+        client,
+        STREAM,
+        GROUP,
+        resolutions=[7, 9],
+        id_field="driver_id",
+        location_key="location",
+        supply_key="supply",
+        last_seen_key="last_seen",
+        location_ttl=5 * 60,
+        event_codec=DRIVER_POSITION_EVENT,
+    )
+    location_index.create_consumer_group(STREAM)
+    return location_index
+
+
+def send(client, index, positions):
+    """Add (driver, (lat, lng), minutes ago) positions and index them."""
+    now = datetime.utcnow()
+    for driver_id, (latitude, longitude), minutes_ago in positions:
+        client.xadd(
+            STREAM,
+            DRIVER_POSITION_EVENT.encode(
+                {
+                    "driver_id": driver_id,
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "timestamp": now - timedelta(minutes=minutes_ago),
+                }
+            ),
+        )
+    entries = bytes_client(client).xreadgroup(GROUP, "consumer", {STREAM: ">"})
+    for stream_name, messages in entries:
+        index.process_messages(stream_name.decode(), decode_entries(messages))
+
+
+def cell(point, res=9):
+    return h3.latlng_to_cell(*point, res)
+
+
+def assert_supply_matches_locations(client):
+    for res in (7, 9):
+        supply = {
+            cell_id: int(count)
+            for cell_id, count in client.hgetall(f"supply:{res}").items()
+        }
+        assert all(count > 0 for count in supply.values())
+        expected = {}
+        for cell_id in client.hgetall(f"location:{res}").values():
+            expected[cell_id] = expected.get(cell_id, 0) + 1
+        assert supply == expected
+
+
+def test_moves_decrement_the_old_cell_and_increment_the_new_one(client, index):
+    send(client, index, [(DRIVERS[0], CENTER, 2), (DRIVERS[1], CENTER, 2)])
+    assert client.hgetall("supply:9") == {cell(CENTER): "2"}
+
+    send(client, index, [(DRIVERS[0], AWAY, 1)])
+    assert client.hgetall("supply:9") == {cell(CENTER): "1", cell(AWAY): "1"}
+    assert client.hget("location:7", DRIVERS[0]) == cell(AWAY, 7)
+    assert client.xpending(STREAM, GROUP)["pending"] == 0
+
+    # A position older than the last one seen is ignored.
+    send(client, index, [(DRIVERS[0], CENTER, 3)])
+    assert client.hget("location:9", DRIVERS[0]) == cell(AWAY)
+
+    send(client, index, [(DRIVERS[1], AWAY, 0)])
+    assert client.hgetall("supply:9") == {cell(AWAY): "2"}
+    assert_supply_matches_locations(client)
+
+
+def test_drivers_not_seen_within_the_ttl_are_expired(client, index):
+    send(
+        client,
+        index,
+        [(DRIVERS[0], CENTER, 10), (DRIVERS[1], CENTER, 1), (DRIVERS[2], AWAY, 10)],
+    )
+
+    assert index.expire_stale_locations() == 2
+    assert client.hgetall("supply:9") == {cell(CENTER): "1"}
+    assert client.hgetall("location:9") == {DRIVERS[1]: cell(CENTER)}
+    assert client.zrange("last_seen", 0, -1) == [DRIVERS[1]]
+    assert index.expire_stale_locations() == 0
+    assert_supply_matches_locations(client)
+
+
+def test_supply_never_goes_negative(client, index):
+    send(client, index, [(DRIVERS[0], CENTER, 10)])
+    index.expire_stale_locations()
+    # The driver comes back, moves, and expires again.
+    send(client, index, [(DRIVERS[0], AWAY, 9), (DRIVERS[0], CENTER, 8)])
+    assert client.hgetall("supply:9") == {cell(CENTER): "1"}
+    index.expire_stale_locations()
+
+    for res in (7, 9):
+        assert client.hgetall(f"supply:{res}") == {}
+        assert client.hgetall(f"location:{res}") == {}
@@ -0,0 +1,89 @@
+import time
+
+import fakeredis
+import pytest
+
+from app.redis_processor import StreamProcessor
+
+STREAM = "events"
+GROUP = "group"
+
+
+class RecordingProcessor(StreamProcessor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.processed = []
+        self.data = []
+
+    def process_messages(self, stream_name, messages):
+        self.processed += [message_id for message_id, _ in messages]
+        self.data += [data for _, data in messages]
+        self.client.xack(
+            stream_name,
+            self.consumer_group_name,
+            *[message_id for message_id, _ in messages],
+        )
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_poison_messages_are_dead_lettered_past_other_pending_entries(client):
+    ids = [client.xadd(STREAM, {"n": str(i)}) for i in range(4)]
+    client.xgroup_create(STREAM, GROUP, id="0")
+    # "gone" holds the first and last entries, "worker" the two in between.
+    client.xreadgroup(GROUP, "gone", {STREAM: ">"}, count=1)
+    client.xreadgroup(GROUP, "worker", {STREAM: ">"}, count=2)
+    client.xreadgroup(GROUP, "gone", {STREAM: ">"}, count=1)
+    for _ in range(5):
+        client.xreadgroup(GROUP, "gone", {STREAM: "0"})
+    time.sleep(0.05)
+    # Keep the worker's own entries fresh, so only the other two are claimed.
+    client.xclaim(STREAM, GROUP, "worker", 0, [ids[1], ids[2]])
+
+    processor = RecordingProcessor(
+        client,
+        STREAM,
+        GROUP,
+        consumer_name="worker",
+        claim_min_idle_time=30,
+        max_deliveries=3,
+    )
+    assert processor.recover_pending_messages(STREAM) == 2
+
+    assert processor.processed == []
+    dead_letters = client.xrange(processor.dead_letter_stream_name(STREAM))
+    assert [data["original_id"] for _, data in dead_letters] == [ids[0], ids[3]]
+    assert all(int(data["deliveries"]) > 3 for _, data in dead_letters)
+    pending = client.xpending_range(STREAM, GROUP, "-", "+", 10)
+    assert {row["message_id"] for row in pending} == {ids[1], ids[2]}
+
+
+def test_claimed_messages_under_the_delivery_limit_are_retried(client):
+    ids = [client.xadd(STREAM, {"n": str(i)}) for i in range(3)]
+    client.xgroup_create(STREAM, GROUP, id="0")
+    client.xreadgroup(GROUP, "gone", {STREAM: ">"})
+    time.sleep(0.05)
+
+    processor = RecordingProcessor(
+        client, STREAM, GROUP, consumer_name="worker", claim_min_idle_time=30
+    )
+    assert processor.recover_pending_messages(STREAM) == 3
+
+    assert processor.processed == ids
+    assert client.xpending(STREAM, GROUP)["pending"] == 0
+    assert client.xlen(processor.dead_letter_stream_name(STREAM)) == 0
+
+
+def test_new_messages_are_read_with_raw_values(client):
+    payload = bytes(range(256))
+    message_id = client.xadd(STREAM, {"e": payload})
+    processor = RecordingProcessor(client, STREAM, GROUP)
+    processor.create_consumer_group(STREAM)
+
+    processor.consume_messages()
+
+    assert processor.processed == [message_id]
+    assert processor.data == [{"e": payload}]
@@ -0,0 +1,111 @@
+import time
+
+import fakeredis
+import pytest
+
+from app import redis_producer
+from app.redis_producer import RedisProducer, stream_trim_args
+
+
+class RecordingPipeline:
+    """Pipeline that records the XADD arguments instead of sending them."""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def xadd(self, name, fields, **kwargs):
+        self.calls.append((name, fields, kwargs))
+
+    def execute(self):
+        pass
+
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def pipeline(self, transaction=True):
+        return RecordingPipeline(self.calls)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture(autouse=True)
+def running(monkeypatch):
+    monkeypatch.setattr(redis_producer, "shutdown_flag", False)
+
+
+def test_trimming_is_off_unless_configured():
+    assert stream_trim_args(0, 0) == {}
+    assert stream_trim_args(1000, 0) == {"maxlen": 1000, "approximate": True}
+
+    minid = int((time.time() - 60) * 1000)
+    trim_args = stream_trim_args(1000, 60)
+    assert trim_args["approximate"]
+    assert minid <= trim_args["minid"] <= minid + 1000
+
+
+def test_batches_are_added_with_the_configured_trimming():
+    client = RecordingClient()
+    producer = RedisProducer(
+        client, "positions", None, num_partitions=1, maxlen=500, max_age=0
+    )
+    producer.send_batch([{"n": n} for n in range(3)])
+    assert client.calls == [
+        ("positions", {"n": n}, {"maxlen": 500, "approximate": True})
+        for n in range(3)
+    ]
+
+    client.calls.clear()
+    producer.maxlen = 0
+    producer.send_batch([{"n": 0}])
+    assert client.calls == [("positions", {"n": 0}, {})]
+
+
+def test_batch_size_keeps_events_from_waiting_too_long():
+    def make(rate, batch_size):
+        return RedisProducer(None, "positions", None, rate=rate, batch_size=batch_size)
+
+    assert make(rate=100_000, batch_size=500).batch_size == 500
+    assert make(rate=1000, batch_size=500).batch_size == 100
+    assert make(rate=2, batch_size=500).batch_size == 1
+
+
+def test_rate_mode_sends_pipelined_batches_on_schedule(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    clock = FakeClock()
+    monkeypatch.setattr(redis_producer.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(redis_producer.time, "sleep", clock.sleep)
+    events = iter(range(300))
+
+    def generate():
+        n = next(events)
+        if n == 299:
+            redis_producer.shutdown_flag = True
+        return {"n": n}
+
+    producer = RedisProducer(
+        client, "positions", generate, num_partitions=1, rate=1000, batch_size=500
+    )
+    producer.produce()
+
+    assert client.xlen("positions") == 300
+    # Three batches of 100, each due 0.1s after the previous one.
+    assert clock.sleeps == pytest.approx([0.1, 0.1, 0.1])
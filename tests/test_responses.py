@@ -0,0 +1,85 @@
+import json
+
+import msgpack
+import pytest
+from fastapi import HTTPException, Request
+
+from app.dependencies import get_response_format
+from app.responses import (COLUMNAR_FORMAT, COLUMNAR_MEDIA_TYPE,
+                           MSGPACK_FORMAT, OBJECTS_FORMAT, columnar_response)
+
+COUNTS = {"89a8100c6bbffff": 3, "8928308280fffff": 1}
+TIME_KEYS = ["2026-10-17T12:00", "2026-10-17T12:01"]
+
+
+def make_request(**headers):
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "response_format, headers, expected",
+    [
+        (None, {}, OBJECTS_FORMAT),
+        (None, {"accept": "application/msgpack"}, MSGPACK_FORMAT),
+        (None, {"accept": COLUMNAR_MEDIA_TYPE}, COLUMNAR_FORMAT),
+        (COLUMNAR_FORMAT, {"accept": "application/msgpack"}, COLUMNAR_FORMAT),
+    ],
+)
+def test_format_comes_from_the_query_flag_then_the_accept_header(
+    response_format, headers, expected
+):
+    assert get_response_format(make_request(**headers), response_format) == expected
+
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(HTTPException) as error:
+        get_response_format(make_request(), "xml")
+    assert error.value.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "response_format, loads",
+    [(COLUMNAR_FORMAT, json.loads), (MSGPACK_FORMAT, msgpack.unpackb)],
+)
+def test_columnar_bodies_hold_sorted_parallel_arrays(response_format, loads):
+    response = columnar_response(make_request(), COUNTS, TIME_KEYS, response_format)
+    assert response.status_code == 200
+    assert loads(response.body) == {
+        "regions": sorted(COUNTS),
+        "counts": [COUNTS[region] for region in sorted(COUNTS)],
+    }
+
+
+def test_unchanged_windows_are_revalidated_with_a_304():
+    etag = columnar_response(
+        make_request(), COUNTS, TIME_KEYS, COLUMNAR_FORMAT
+    ).headers["etag"]
+    # The same counts in another order give the same body and ETag.
+    reordered = dict(reversed(list(COUNTS.items())))
+    response = columnar_response(
+        make_request(if_none_match=f'"other", W/{etag}'),
+        reordered,
+        TIME_KEYS,
+        COLUMNAR_FORMAT,
+    )
+    assert response.status_code == 304
+    assert response.body == b""
+
+    # A new minute or new counts change the ETag.
+    for counts, time_keys in [
+        (COUNTS, TIME_KEYS[1:] + ["2026-10-17T12:02"]),
+        ({**COUNTS, "8928308280fffff": 2}, TIME_KEYS),
+    ]:
+        response = columnar_response(
+            make_request(if_none_match=etag), counts, time_keys, COLUMNAR_FORMAT
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+
+from app.retention import (DEFAULT_RETENTION, TIME_KEY_FORMAT, RollupCompactor,
+                           check_retention, rollup_key, rollup_watermark_key)
+
+PREFIX = "counts"
+PERIOD_START = datetime(2026, 10, 17, 12, 0)
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_default_retention_is_valid():
+    check_retention(DEFAULT_RETENTION)
+
+
+@pytest.mark.parametrize(
+    "overrides", [{"1m": 15 * 60}, {"1m": 17 * 60}, {"15m": 60 * 60}]
+)
+def test_retention_shorter_than_the_rollup_delay_is_rejected(overrides):
+    with pytest.raises(ValueError):
+        check_retention({**DEFAULT_RETENTION, **overrides})
+
+
+def test_minute_buckets_are_rolled_up_after_the_grace_time(client):
+    for minute in (0, 7, 14, 15):
+        moment = PERIOD_START + timedelta(minutes=minute)
+        client.hset(f"{PREFIX}:{moment.strftime(TIME_KEY_FORMAT)}:9", "cell", 2)
+    compactor = RollupCompactor(client, [PREFIX], [9])
+    key = rollup_key(PREFIX, "15m", PERIOD_START, 9)
+    watermark_key = rollup_watermark_key(PREFIX, "15m", 9)
+
+    compactor.compact(now=PERIOD_START + timedelta(minutes=16))
+    assert not client.exists(key)
+
+    compactor.compact(now=PERIOD_START + timedelta(minutes=17))
+    assert client.hgetall(key) == {"cell": "6"}
+    assert client.get(watermark_key) == PERIOD_START.strftime(TIME_KEY_FORMAT)
+    assert client.ttl(key) > 0
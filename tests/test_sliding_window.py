@@ -0,0 +1,105 @@
+import random
+from datetime import datetime, timedelta
+
+import fakeredis
+import h3
+import pytest
+
+from app.redis_aggregator import StreamAggregator
+from app.sliding_window import (TIME_KEY_FORMAT, SlidingWindowMaintainer,
+                                window_key, window_watermark_key)
+
+PREFIX = "driver_count"
+WINDOW = 5
+START = datetime(2026, 10, 17, 12, 0)
+CELLS = [
+    h3.latlng_to_cell(lat, lng, 9)
+    for lat, lng in [(-19.92, -43.94), (-19.93, -43.95), (-23.55, -46.63)]
+]
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def aggregator(client):
+    return StreamAggregator(
+        client,
+        "positions",
+        "aggregator",
+        resolutions=[9],
+        key_prefix=PREFIX,
+        window_sizes=[WINDOW],
+    )
+
+
+@pytest.fixture
+def maintainer(client):
+    return SlidingWindowMaintainer(client, [PREFIX], [9], [WINDOW])
+
+
+def time_key(minute):
+    return (START + timedelta(minutes=minute)).strftime(TIME_KEY_FORMAT)
+
+
+def count(aggregator, minute, cell, n=1):
+    aggregator.flush_counts("positions", {(time_key(minute), 9, cell): n}, [])
+
+
+def window_totals(client):
+    return {
+        cell: int(total)
+        for cell, total in client.hgetall(window_key(PREFIX, WINDOW, 9)).items()
+    }
+
+
+def bucket_totals(client, last_minute):
+    totals = {}
+    for minute in range(last_minute - WINDOW + 1, last_minute + 1):
+        for cell, n in client.hgetall(f"{PREFIX}:{time_key(minute)}:9").items():
+            totals[cell] = totals.get(cell, 0) + int(n)
+    return totals
+
+
+def test_rebuild_sums_only_the_buckets_inside_the_window(
+    client, aggregator, maintainer
+):
+    for minute in range(8):
+        count(aggregator, minute, CELLS[minute % 2], minute + 1)
+    client.delete(window_key(PREFIX, WINDOW, 9))
+
+    maintainer.rebuild(PREFIX, WINDOW, 9, START + timedelta(minutes=7))
+    assert window_totals(client) == bucket_totals(client, 7)
+    assert client.get(window_watermark_key(PREFIX, WINDOW, 9)) == time_key(2)
+
+
+def test_advancing_retires_each_bucket_once_and_drops_empty_cells(
+    client, aggregator, maintainer
+):
+    maintainer.advance_all(START)
+    count(aggregator, 0, CELLS[0], 2)
+    count(aggregator, 1, CELLS[1])
+
+    now = START + timedelta(minutes=WINDOW, seconds=30)
+    maintainer.advance_all(now)
+    maintainer.advance_all(now)
+    assert window_totals(client) == {CELLS[1]: 1}
+
+    # An increment to a minute that already left the window is not added.
+    count(aggregator, 0, CELLS[2])
+    assert window_totals(client) == {CELLS[1]: 1}
+
+
+def test_window_totals_always_match_the_buckets_in_the_window(
+    client, aggregator, maintainer
+):
+    rng = random.Random(10)
+    for minute in range(30):
+        # Events arrive up to a few minutes late.
+        for _ in range(rng.randint(0, 6)):
+            late = rng.randint(0, min(minute, WINDOW + 2))
+            count(aggregator, minute - late, rng.choice(CELLS), rng.randint(1, 3))
+        maintainer.advance_all(START + timedelta(minutes=minute, seconds=30))
+        assert window_totals(client) == bucket_totals(client, minute)
@@ -0,0 +1,57 @@
+import zlib
+
+import h3
+import numpy as np
+
+from app.redis_producer import RedisProducer
+from app.stream_partitioning import (assign_partitions, get_partition,
+                                     get_partition_stream_names,
+                                     get_partitions)
+
+rng = np.random.default_rng(4)
+LATITUDES = rng.uniform(-60, 60, 200)
+LONGITUDES = rng.uniform(-180, 180, 200)
+
+
+def test_partition_is_the_crc32_of_the_coarse_cell():
+    for lat, lng in zip(LATITUDES, LONGITUDES):
+        cell = h3.latlng_to_cell(lat, lng, 6)
+        assert get_partition(lat, lng, 8, 6) == zlib.crc32(cell.encode()) % 8
+
+
+def test_points_of_one_coarse_cell_share_a_partition():
+    cell = h3.latlng_to_cell(-19.92, -43.94, 6)
+    points = [h3.cell_to_latlng(child) for child in h3.cell_to_children(cell, 9)]
+    # Finer cells do not nest exactly, so keep the points inside the cell.
+    points = [point for point in points if h3.latlng_to_cell(*point, 6) == cell]
+    partitions = {get_partition(lat, lng, 8, 6) for lat, lng in points}
+    assert len(partitions) == 1
+
+
+def test_get_partitions_matches_get_partition():
+    partitions = get_partitions(LATITUDES, LONGITUDES, 8, 6)
+    assert partitions.tolist() == [
+        get_partition(lat, lng, 8, 6) for lat, lng in zip(LATITUDES, LONGITUDES)
+    ]
+
+
+def test_stream_names_and_assignments_cover_every_partition_once():
+    assert get_partition_stream_names("positions", num_partitions=1) == ["positions"]
+    assert get_partition_stream_names("positions", [1, 3], num_partitions=4) == [
+        "positions:1",
+        "positions:3",
+    ]
+
+    assignments = [assign_partitions(index, 3, 8) for index in range(3)]
+    assert sorted(sum(assignments, [])) == list(range(8))
+
+
+def test_producer_routes_each_event_to_its_partition_stream():
+    producer = RedisProducer(None, "positions", None, num_partitions=4)
+    for lat, lng in zip(LATITUDES, LONGITUDES):
+        event = {"latitude": str(lat), "longitude": str(lng)}
+        partition = get_partition(lat, lng, 4)
+        assert producer.get_stream_name(event) == f"positions:{partition}"
+
+    producer = RedisProducer(None, "positions", None, num_partitions=1)
+    assert producer.get_stream_name({}) == "positions"
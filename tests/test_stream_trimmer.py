@@ -0,0 +1,44 @@
+import fakeredis
+import pytest
+
+from app.stream_trimmer import StreamTrimmer, next_stream_id
+
+STREAM = "events"
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def ids(client):
+    return [client.xadd(STREAM, {"n": str(i)}) for i in range(5)]
+
+
+def test_streams_are_not_trimmed_before_required_groups_exist(client, ids):
+    client.xgroup_create(STREAM, "aggregator", id="$")
+    trimmer = StreamTrimmer(client, {STREAM: ["aggregator", "persist"]})
+    assert trimmer.get_low_water_mark(STREAM, ["aggregator", "persist"]) is None
+    assert trimmer.trim() == 0
+    assert client.xlen(STREAM) == 5
+
+
+def test_low_water_mark_is_the_oldest_entry_a_group_needs(client, ids):
+    client.xgroup_create(STREAM, "aggregator", id="0")
+    client.xgroup_create(STREAM, "index", id="0")
+    # The aggregator holds ids[1] and ids[2] pending after acking ids[0].
+    client.xreadgroup("aggregator", "worker", {STREAM: ">"}, count=3)
+    client.xack(STREAM, "aggregator", ids[0])
+    # The index read and acked up to ids[3].
+    client.xreadgroup("index", "worker", {STREAM: ">"}, count=4)
+    client.xack(STREAM, "index", *ids[:4])
+
+    trimmer = StreamTrimmer(client, {STREAM: ["aggregator"]})
+    assert trimmer.get_low_water_mark(STREAM, ["aggregator"]) == ids[1]
+
+    client.xack(STREAM, "aggregator", ids[1], ids[2])
+    # With nothing pending, a group needs the entry after its last delivered.
+    assert trimmer.get_low_water_mark(STREAM, ["aggregator"]) == next_stream_id(
+        ids[2]
+    )
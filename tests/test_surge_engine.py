@@ -0,0 +1,54 @@
+import h3
+import numpy as np
+
+from app.surge_pricing.engine import SurgeEngine, TierTable
+
+CITY_CELL = h3.latlng_to_cell(-19.92, -43.94, 5)
+INSIDE = h3.cell_to_center_child(CITY_CELL, 9)
+OUTSIDE = h3.latlng_to_cell(-23.55, -46.63, 9)
+
+
+def test_tier_table_applies_the_last_tier_reached():
+    table = TierTable([[2, 1.5], [1, 1.2], [3, 2]])
+    ratios = np.array([0, 0.99, 1, 1.5, 2, 2.99, 3, 10])
+    assert table.apply(ratios).tolist() == [1, 1, 1.2, 1.2, 1.5, 1.5, 2, 2]
+
+
+def test_default_tiers_and_cells_without_orders_or_drivers():
+    engine = SurgeEngine(tier_tables={}, cities={})
+    cells = [OUTSIDE] * 5
+    multipliers = engine.multipliers(
+        cells, order_counts=[0, 3, 4, 9, 5], driver_counts=[0, 0, 2, 3, 10]
+    )
+    assert multipliers.tolist() == [1, 1, 1.5, 2, 1]
+
+
+def test_tier_tables_are_picked_per_city_and_resolution():
+    engine = SurgeEngine(
+        tier_tables={
+            "default": {"default": [[1, 1.1]]},
+            "bh": {"9": [[1, 1.3]], "default": [[1, 1.8]]},
+        },
+        cities={"bh": [CITY_CELL]},
+    )
+    inside_8 = h3.cell_to_parent(INSIDE, 8)
+    # The city's cell is at resolution 5, so coarser cells are outside it.
+    inside_4 = h3.cell_to_parent(INSIDE, 4)
+    cells = [INSIDE, OUTSIDE, inside_8, inside_4]
+
+    multipliers = engine.multipliers(cells, [2] * 4, [1] * 4)
+    assert multipliers.tolist() == [1.3, 1.1, 1.8, 1.1]
+    assert engine.multipliers([INSIDE], [2], [1], resolution=9).tolist() == [1.3]
+
+
+def test_align_counts_fills_missing_cells_with_zero():
+    engine = SurgeEngine(tier_tables={}, cities={})
+    cell_ids, orders, drivers = engine.align_counts(
+        {INSIDE: 3, OUTSIDE: 1}, {INSIDE: 2}
+    )
+    assert cell_ids == [INSIDE, OUTSIDE]
+    assert orders.tolist() == [3, 1]
+    assert drivers.tolist() == [2, 0]
+
+    cell_ids, orders, drivers = engine.align_counts({}, {INSIDE: 2}, [INSIDE])
+    assert (orders.tolist(), drivers.tolist()) == ([0], [2])
@@ -0,0 +1,82 @@
+import asyncio
+
+import fakeredis
+import h3
+import pytest
+from fastapi import HTTPException
+
+from app.surge_pricing.endpoints import surge_price_for_cell, surge_prices
+from app.surge_pricing.materializer import SurgeMaterializer
+from app.surge_pricing.service import (COMPUTED_AT_FIELD, VERSION_FIELD,
+                                       SurgeTable, surge_key)
+
+CELL = h3.latlng_to_cell(-19.92, -43.94, 7)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def client(server):
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+@pytest.fixture
+def materializer(client):
+    materializer = SurgeMaterializer(client, resolutions=[7], ttl=60)
+    materializer.calculator.calculate_multipliers_for_all_cells = lambda res: {
+        CELL: 1.5
+    }
+    return materializer
+
+
+def test_unchanged_multipliers_only_refresh_the_table(client, materializer):
+    assert materializer.materialize(7) == 1
+    client.hset(surge_key(7), COMPUTED_AT_FIELD, 0)
+
+    assert materializer.materialize(7) is None
+    table = client.hgetall(surge_key(7))
+    assert table[VERSION_FIELD] == "1"
+    assert float(table[COMPUTED_AT_FIELD]) > 0
+    assert 0 < client.ttl(surge_key(7)) <= 60
+
+
+def test_expired_table_is_rebuilt_even_if_unchanged(client, materializer):
+    materializer.materialize(7)
+    client.delete(surge_key(7))
+
+    assert materializer.materialize(7) == 2
+    assert client.hgetall(surge_key(7)) == {
+        CELL: "1.5",
+        VERSION_FIELD: "2",
+        COMPUTED_AT_FIELD: client.hget(surge_key(7), COMPUTED_AT_FIELD),
+    }
+
+
+def test_endpoints_answer_503_without_a_table():
+    surge_table = SurgeTable(fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(surge_prices(cell_resolution=7, surge_table=surge_table))
+    assert error.value.status_code == 503
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(surge_price_for_cell(cell_id=CELL, surge_table=surge_table))
+    assert error.value.status_code == 503
+
+
+def test_endpoints_serve_the_materialized_table(server, materializer):
+    materializer.materialize(7)
+    surge_table = SurgeTable(
+        fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+        base_price=10,
+    )
+
+    prices = asyncio.run(surge_prices(cell_resolution=7, surge_table=surge_table))
+    assert prices.version == 1
+    assert prices.surge_prices == {CELL: 15.0}
+
+    price = asyncio.run(surge_price_for_cell(cell_id=CELL, surge_table=surge_table))
+    assert price.surge_price == 15.0
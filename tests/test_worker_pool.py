@@ -0,0 +1,92 @@
+import pytest
+
+from app import worker_pool
+from app.worker_pool import WorkerPool, build_consumer_name
+
+
+class FakeProcess:
+    started = []
+
+    def __init__(self, target, args, name):
+        self.target = target
+        self.args = args
+        self.name = name
+        self.pid = len(FakeProcess.started) + 1000
+        self.exitcode = None
+
+    def start(self):
+        FakeProcess.started.append(self)
+
+    def is_alive(self):
+        return self.exitcode is None
+
+
+@pytest.fixture(autouse=True)
+def fake_processes(monkeypatch):
+    FakeProcess.started = []
+    monkeypatch.setattr(worker_pool.multiprocessing, "Process", FakeProcess)
+
+
+def test_consumer_names_are_stable_per_role_host_and_index():
+    assert build_consumer_name("driver_aggregator", 2, "host-a") == (
+        "driver_aggregator-host-a-2"
+    )
+    pool = WorkerPool("order_aggregator", num_workers=2, consumer_name_prefix="h")
+    pool.start_worker(0)
+    pool.start_worker(1)
+    assert [process.name for process in FakeProcess.started] == [
+        "order_aggregator-h-0",
+        "order_aggregator-h-1",
+    ]
+
+
+def test_exited_workers_are_restarted_under_the_same_name():
+    pool = WorkerPool("driver_aggregator", num_workers=2, consumer_name_prefix="h")
+    for worker_index in range(2):
+        pool.start_worker(worker_index)
+    crashed = pool.workers[1]
+    crashed.exitcode = 1
+
+    pool.supervise()
+    assert len(FakeProcess.started) == 3
+    assert pool.workers[0] is FakeProcess.started[0]
+    restarted = pool.workers[1]
+    assert restarted is not crashed
+    assert (restarted.name, restarted.args) == (crashed.name, crashed.args)
+    assert restarted.target is worker_pool.run_worker
+
+    pool.supervise()
+    assert len(FakeProcess.started) == 3
+
+
+def test_unknown_roles_are_rejected():
+    with pytest.raises(ValueError):
+        WorkerPool("unknown")
+
+
+def test_partitions_are_split_round_robin_over_the_workers():
+    pool = WorkerPool(
+        "driver_aggregator", num_workers=3, consumer_name_prefix="h", num_partitions=8
+    )
+    for worker_index in range(3):
+        pool.start_worker(worker_index)
+    partitions = [process.args[2] for process in FakeProcess.started]
+    assert partitions == [[0, 3, 6], [1, 4, 7], [2, 5]]
+
+
+def test_pools_never_start_more_workers_than_partitions():
+    pool = WorkerPool("driver_aggregator", num_workers=4, num_partitions=2)
+    assert pool.num_workers == 2
+
+
+def test_main_reads_the_producer_partition_setting(monkeypatch):
+    pools = []
+    monkeypatch.setattr(WorkerPool, "run", lambda pool: pools.append(pool))
+    monkeypatch.setattr(worker_pool, "STREAM_PARTITIONS", 4)
+    monkeypatch.setattr("sys.argv", ["worker_pool", "order_aggregator"])
+    worker_pool.main()
+    monkeypatch.setattr(
+        "sys.argv", ["worker_pool", "order_aggregator", "--partitions", "2"]
+    )
+    worker_pool.main()
+    assert [pool.num_partitions for pool in pools] == [4, 2]